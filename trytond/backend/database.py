@@ -1,6 +1,10 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
+import time
+from threading import Lock
+
 from trytond.const import MODEL_CACHE_SIZE
+from trytond.stats import Stats
 
 DatabaseIntegrityError = None
 DatabaseOperationalError = None
@@ -41,6 +45,14 @@ class DatabaseInterface(object):
         '''
         raise NotImplementedError
 
+    def has_channel(self):
+        '''
+        Return True if database supports LISTEN/NOTIFY channels.
+
+        :return: a boolean
+        '''
+        return False
+
     @staticmethod
     def create(cursor, database_name):
         '''
@@ -100,12 +112,52 @@ class DatabaseInterface(object):
         raise NotImplementedError
 
 
+class ReplicaSelector(object):
+    '''
+    Select the connection pool of a replica
+
+    The available methods are:
+        - round-robin: each pool in turn
+        - least-busy: the pool with the fewest connections in use
+    '''
+
+    def __init__(self, pools, method='round-robin', busy=None):
+        assert method in ('round-robin', 'least-busy')
+        self.pools = list(pools)
+        self.method = method
+        if busy is None:
+            busy = lambda pool: 0
+        self.busy = busy
+        self._index = 0
+        self._lock = Lock()
+
+    def __nonzero__(self):
+        return bool(self.pools)
+
+    def select(self):
+        '''
+        Return the selected pool or None if there is no pool
+        '''
+        if not self.pools:
+            return None
+        with self._lock:
+            if self.method == 'least-busy':
+                # Start from the next pool to share between equally busy
+                pools = self.pools[self._index:] + self.pools[:self._index]
+                self._index = (self._index + 1) % len(self.pools)
+                return min(pools, key=self.busy)
+            pool = self.pools[self._index]
+            self._index = (self._index + 1) % len(self.pools)
+            return pool
+
+
 class CursorInterface(object):
     '''
     Define generic interface for database cursor
     '''
     IN_MAX = 1000
     cache_keys = {'language', 'fuzzy_translation', '_datetime'}
+    replica = False  # True if connected to a replica which may lag behind
 
     def __init__(self):
         self.cache = {}
@@ -128,6 +180,94 @@ class CursorInterface(object):
         '''
         raise NotImplementedError
 
+    def executemany(self, sql, params_list):
+        '''
+        Execute a query for each parameters
+
+        :param sql: a sql query string
+        :param params_list: a list of tuple or list of parameters
+        '''
+        with Stats.query(sql):
+            return self.cursor.executemany(sql, params_list)
+
+    def iterate(self, sql, params=None, size=None):
+        '''
+        Execute a query and yield its rows as dictionaries fetched by chunks
+        The query is run on a separate cursor so other queries can be executed
+        while iterating.
+
+        :param sql: a sql query string
+        :param params: a tuple or list of parameters
+        :param size: the number of rows fetched at once (default: IN_MAX)
+        '''
+        size = size or self.IN_MAX
+        cursor = self._iterate_cursor()
+        duration = 0
+        try:
+            start = time.time()
+            with Stats.query(sql):
+                if params:
+                    cursor.execute(sql, params)
+                else:
+                    cursor.execute(sql)
+            while True:
+                rows = cursor.dictfetchmany(size)
+                duration += time.time() - start
+                Stats.fetched(len(rows))
+                for row in rows:
+                    yield row
+                if len(rows) < size:
+                    break
+                start = time.time()
+        finally:
+            cursor.close()
+        # The rows are computed at fetch time
+        self._check_slow_query(sql, params, duration)
+
+    def _iterate_cursor(self):
+        '''
+        Return a new cursor of the connection for iterate
+        '''
+        raise NotImplementedError
+
+    def _check_slow_query(self, sql, params, duration):
+        '''
+        Called with the duration in seconds of the queries executed
+        '''
+        pass
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            Stats.fetched(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        Stats.fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        Stats.fetched(len(rows))
+        return rows
+
+    def dictfetchone(self):
+        row = self.cursor.dictfetchone()
+        if row is not None:
+            Stats.fetched(1)
+        return row
+
+    def dictfetchmany(self, size):
+        rows = self.cursor.dictfetchmany(size)
+        Stats.fetched(len(rows))
+        return rows
+
+    def dictfetchall(self):
+        rows = self.cursor.dictfetchall()
+        Stats.fetched(len(rows))
+        return rows
+
     def close(self, close=False):
         '''
         Close the cursor
@@ -218,3 +358,46 @@ class CursorInterface(object):
 
         :return: a boolean
         '''
+
+    def has_multirow_insert(self):
+        '''
+        Return True if database implements INSERT of many rows in one
+        statement with consecutive ids.
+
+        :return: a boolean
+        '''
+        return False
+
+    def has_update_from_values(self):
+        '''
+        Return True if database implements UPDATE with a VALUES list in the
+        FROM clause.
+
+        :return: a boolean
+        '''
+        return False
+
+    def has_with_recursive(self):
+        '''
+        Return True if database implements WITH RECURSIVE in sub-queries.
+
+        :return: a boolean
+        '''
+        return False
+
+    def has_nulls_last(self):
+        '''
+        Return True if database orders NULL values after the others in
+        ascending order.
+
+        :return: a boolean
+        '''
+        return False
+
+    def has_row_value(self):
+        '''
+        Return True if database implements comparison of row values.
+
+        :return: a boolean
+        '''
+        return False
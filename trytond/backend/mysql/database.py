@@ -2,6 +2,7 @@
 #this repository contains the full copyright notices and license terms.
 from trytond.backend.database import DatabaseInterface, CursorInterface
 from trytond.config import config, parse_uri
+from trytond.stats import Stats
 import MySQLdb
 import MySQLdb.cursors
 import MySQLdb.converters
@@ -283,10 +284,14 @@ class Cursor(CursorInterface):
         return getattr(self.cursor, name)
 
     def execute(self, sql, params=None):
-        if params:
-            return self.cursor.execute(sql, params)
-        else:
-            return self.cursor.execute(sql)
+        with Stats.query(sql):
+            if params:
+                return self.cursor.execute(sql, params)
+            else:
+                return self.cursor.execute(sql)
+
+    def _iterate_cursor(self):
+        return self._conn.cursor(_Cursor)
 
     def close(self, close=False):
         self.cursor.close()
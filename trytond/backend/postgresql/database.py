@@ -1,8 +1,10 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
-from trytond.backend.database import DatabaseInterface, CursorInterface
+from trytond.backend.database import DatabaseInterface, CursorInterface, \
+    ReplicaSelector
 from trytond.config import config, parse_uri
-from psycopg2.pool import ThreadedConnectionPool
+from trytond.stats import Stats
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from psycopg2.extensions import cursor as PsycopgCursor
 from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
@@ -18,6 +20,9 @@ import time
 import logging
 import re
 import os
+import sys
+from collections import deque
+from itertools import count
 if os.name == 'posix':
     import pwd
 from decimal import Decimal
@@ -29,16 +34,21 @@ __all__ = ['Database', 'DatabaseIntegrityError', 'DatabaseOperationalError',
 RE_VERSION = re.compile(r'\S+ (\d+)\.(\d+)')
 
 os.environ['PGTZ'] = os.environ.get('TZ', '')
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+_iterate_ids = count()
 
 
 class Database(DatabaseInterface):
 
     _databases = {}
     _connpool = None
+    _replicas = ReplicaSelector([])
     _list_cache = None
     _list_cache_timestamp = None
     _version_cache = {}
     flavor = Flavor(ilike=True)
+    slow_queries = deque(maxlen=100)
+    slow_query = 0
 
     def __new__(cls, database_name='template1'):
         if database_name in cls._databases:
@@ -49,6 +59,15 @@ class Database(DatabaseInterface):
         super(Database, self).__init__(database_name=database_name)
         self._databases.setdefault(database_name, self)
 
+    @staticmethod
+    def _dsn(uri, database_name):
+        host = uri.hostname and "host=%s" % uri.hostname or ''
+        port = uri.port and "port=%s" % uri.port or ''
+        name = "dbname=%s" % database_name
+        user = uri.username and "user=%s" % uri.username or ''
+        password = uri.password and "password=%s" % uri.password or ''
+        return '%s %s %s %s %s' % (host, port, name, user, password)
+
     def connect(self):
         if self._connpool is not None:
             return self
@@ -56,26 +75,64 @@ class Database(DatabaseInterface):
         logger.info('connect to "%s"' % self.database_name)
         uri = parse_uri(config.get('database', 'uri'))
         assert uri.scheme == 'postgresql'
-        host = uri.hostname and "host=%s" % uri.hostname or ''
-        port = uri.port and "port=%s" % uri.port or ''
-        name = "dbname=%s" % self.database_name
-        user = uri.username and "user=%s" % uri.username or ''
-        password = uri.password and "password=%s" % uri.password or ''
         minconn = config.getint('database', 'minconn', 1)
         maxconn = config.getint('database', 'maxconn', 64)
-        dsn = '%s %s %s %s %s' % (host, port, name, user, password)
-        self._connpool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        self.slow_query = config.getfloat('database', 'slow_query', 0)
+        self._connpool = ThreadedConnectionPool(minconn, maxconn,
+            self._dsn(uri, self.database_name))
+        replicas = []
+        for replica in (config.get('database', 'replicas') or '').split(','):
+            replica = replica.strip()
+            if not replica:
+                continue
+            uri = parse_uri(replica)
+            assert uri.scheme == 'postgresql'
+            logger.info('connect to "%s" on replica %s:%s'
+                % (self.database_name, uri.hostname or '', uri.port or ''))
+            try:
+                replicas.append(ThreadedConnectionPool(minconn, maxconn,
+                        self._dsn(uri, self.database_name)))
+            except DatabaseOperationalError:
+                logger.warning('replica %s:%s unavailable for "%s"'
+                    % (uri.hostname or '', uri.port or '',
+                        self.database_name), exc_info=True)
+        self._replicas = ReplicaSelector(replicas,
+            config.get('database', 'replica_selection', 'round-robin'),
+            lambda pool: len(pool._used))
         return self
 
-    def cursor(self, autocommit=False, readonly=False):
+    def get_connection(self, autocommit=False, connpool=None):
         if self._connpool is None:
             self.connect()
-        conn = self._connpool.getconn()
+        if connpool is None:
+            connpool = self._connpool
+        conn = connpool.getconn()
         if autocommit:
             conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         else:
             conn.set_isolation_level(ISOLATION_LEVEL_REPEATABLE_READ)
-        cursor = Cursor(self._connpool, conn, self)
+        return conn
+
+    def put_connection(self, conn, close=False):
+        self._connpool.putconn(conn, close=close)
+
+    def cursor(self, autocommit=False, readonly=False):
+        if self._connpool is None:
+            self.connect()
+        connpool, conn = self._connpool, None
+        if readonly and not autocommit and self._replicas:
+            replica = self._replicas.select()
+            try:
+                conn = self.get_connection(connpool=replica)
+            except (PoolError, DatabaseOperationalError):
+                logger = logging.getLogger('database')
+                logger.warning('replica unavailable for "%s", use primary'
+                    % self.database_name, exc_info=True)
+            else:
+                connpool = replica
+        if conn is None:
+            conn = self.get_connection(autocommit=autocommit)
+        cursor = Cursor(connpool, conn, self)
         if readonly:
             cursor.execute('SET TRANSACTION READ ONLY')
         return cursor
@@ -85,6 +142,12 @@ class Database(DatabaseInterface):
             return
         self._connpool.closeall()
         self._connpool = None
+        for replica in self._replicas.pools:
+            replica.closeall()
+        self._replicas = ReplicaSelector([])
+
+    def has_channel(self):
+        return True
 
     @classmethod
     def create(cls, cursor, database_name):
@@ -257,6 +320,22 @@ class Database(DatabaseInterface):
                     (0, module_id, dependency))
 
 
+def _caller():
+    "Return the name of the model method executing the query"
+    from trytond.model import Model
+    frame = sys._getframe(2)
+    while frame:
+        code = frame.f_code
+        if code.co_argcount:
+            first = frame.f_locals.get(code.co_varnames[0])
+            if isinstance(first, Model) or (isinstance(first, type)
+                    and issubclass(first, Model)):
+                return '%s.%s' % (first.__name__, code.co_name)
+        frame = frame.f_back
+    call = Stats.current()
+    return call.name if call else None
+
+
 class _Cursor(PsycopgCursor):
 
     def __build_dict(self, row):
@@ -299,6 +378,10 @@ class Cursor(CursorInterface):
     def database_name(self):
         return self._database.database_name
 
+    @property
+    def replica(self):
+        return self._connpool is not self._database._connpool
+
     # TODO to remove
     @property
     def dbname(self):
@@ -308,10 +391,67 @@ class Cursor(CursorInterface):
         return getattr(self.cursor, name)
 
     def execute(self, sql, params=None):
-        if params:
-            return self.cursor.execute(sql, params)
-        else:
-            return self.cursor.execute(sql)
+        start = time.time()
+        with Stats.query(sql):
+            if params:
+                result = self.cursor.execute(sql, params)
+            else:
+                result = self.cursor.execute(sql)
+        self._check_slow_query(sql, params, time.time() - start)
+        return result
+
+    def _iterate_cursor(self):
+        # Use a server-side cursor to not fetch all the rows at once,
+        # the query is executed only once and its rows are streamed by chunks
+        return self._conn.cursor('iterate_%s' % next(_iterate_ids),
+            cursor_factory=_Cursor, withhold=self._conn.autocommit)
+
+    def _check_slow_query(self, sql, params, duration):
+        threshold = self._database.slow_query
+        if threshold and duration >= threshold:
+            self._log_slow_query(sql, params, duration)
+
+    def _log_slow_query(self, sql, params, duration):
+        logger = logging.getLogger('database')
+        caller = _caller()
+        logger.warning('slow query (%.6fs) from %s: %s %r',
+            duration, caller, sql, params)
+        plan = None
+        if logger.isEnabledFor(logging.DEBUG):
+            plan = self._explain(sql, params)
+            if plan:
+                logger.debug('plan of query from %s:\n%s', caller, plan)
+        Database.slow_queries.append({
+                'database': self.database_name,
+                'sql': sql,
+                'params': params,
+                'duration': duration,
+                'caller': caller,
+                'plan': plan,
+                })
+
+    def _explain(self, sql, params):
+        "Return the plan of the query without running it"
+        if sql.lstrip().split(None, 1)[0].upper() not in EXPLAINABLE:
+            return
+        # A failing EXPLAIN must not abort the current transaction
+        autocommit = self._conn.isolation_level == ISOLATION_LEVEL_AUTOCOMMIT
+        cursor = self._conn.cursor()
+        try:
+            if not autocommit:
+                cursor.execute('SAVEPOINT explain')
+            try:
+                cursor.execute('EXPLAIN (ANALYZE off) ' + sql, params or None)
+                plan = '\n'.join(line for line, in cursor.fetchall())
+            except Exception:
+                if not autocommit:
+                    cursor.execute('ROLLBACK TO SAVEPOINT explain')
+                plan = None
+            if not autocommit:
+                cursor.execute('RELEASE SAVEPOINT explain')
+        finally:
+            cursor.close()
+        return plan
 
     def close(self, close=False):
         self.cursor.close()
@@ -372,6 +512,21 @@ class Cursor(CursorInterface):
         # RETURNING clause is available since PostgreSQL 8.2
         return self._database.get_version(self) >= (8, 2)
 
+    def has_multirow_insert(self):
+        return True
+
+    def has_update_from_values(self):
+        return True
+
+    def has_with_recursive(self):
+        return True
+
+    def has_nulls_last(self):
+        return True
+
+    def has_row_value(self):
+        return True
+
 register_type(UNICODE)
 if PYDATE:
     register_type(PYDATE)
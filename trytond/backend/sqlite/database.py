@@ -2,6 +2,7 @@
 #this repository contains the full copyright notices and license terms.
 from trytond.backend.database import DatabaseInterface, CursorInterface
 from trytond.config import config
+from trytond.stats import Stats
 import os
 from decimal import Decimal
 import datetime
@@ -77,9 +78,13 @@ class SQLiteExtract(Function):
 def date_trunc(_type, date):
     if _type == 'second':
         return date
-    try:
-        tm_tuple = time.strptime(date, '%Y-%m-%d %H:%M:%S')
-    except Exception:
+    for format_ in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'):
+        try:
+            tm_tuple = datetime.datetime.strptime(date, format_).timetuple()
+            break
+        except Exception:
+            continue
+    else:
         return None
     if _type == 'year':
         return "%i-01-01 00:00:00" % tm_tuple.tm_year
@@ -352,10 +357,14 @@ class Cursor(CursorInterface):
         return getattr(self.cursor, name)
 
     def execute(self, sql, params=None):
-        if params:
-            return self.cursor.execute(sql, params)
-        else:
-            return self.cursor.execute(sql)
+        with Stats.query(sql):
+            if params:
+                return self.cursor.execute(sql, params)
+            else:
+                return self.cursor.execute(sql)
+
+    def _iterate_cursor(self):
+        return self._conn.cursor(_Cursor)
 
     def close(self, close=False):
         self.cursor.close()
@@ -401,6 +410,16 @@ class Cursor(CursorInterface):
     def has_constraint(self):
         return False
 
+    def has_multirow_insert(self):
+        # The write lock of the database makes the rowid consecutive
+        return sqlite.sqlite_version_info >= (3, 7, 11)
+
+    def has_with_recursive(self):
+        return sqlite.sqlite_version_info >= (3, 8, 3)
+
+    def has_row_value(self):
+        return sqlite.sqlite_version_info >= (3, 15, 0)
+
 sqlite.register_converter('NUMERIC', lambda val: Decimal(val))
 if sys.version_info[0] == 2:
     sqlite.register_adapter(Decimal, lambda val: buffer(str(val)))
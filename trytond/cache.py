@@ -1,15 +1,23 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
+import logging
+import select
+import threading
+import time
 from threading import Lock
 from collections import OrderedDict
 
 from sql import Table
 from sql.functions import Now
 
+from trytond.config import config
+from trytond.stats import Stats
 from trytond.transaction import Transaction
 
 __all__ = ['Cache', 'LRUDict']
 
+logger = logging.getLogger(__name__)
+
 
 def freeze(o):
     if isinstance(o, (set, tuple, list)):
@@ -23,10 +31,22 @@ def freeze(o):
 class Cache(object):
     """
     A key value LRU cache with size limit.
+
+    Each instance keeps for each database the generation of its name it was
+    filled with. The cache is dropped on access when the generation has been
+    increased by an invalidation, which is received from the database channel
+    if the backend supports it or polled from the ir_cache table otherwise.
     """
     _cache_instance = []
     _resets = {}
     _resets_lock = Lock()
+    _generations = {}
+    _timestamps = {}
+    _generations_lock = Lock()
+    _clean_last = {}
+    _listener = {}
+    _listener_lock = Lock()
+    _channel = 'ir_cache'
 
     def __init__(self, name, size_limit=1024, context=True):
         self.size_limit = size_limit
@@ -34,7 +54,7 @@ class Cache(object):
         self._cache = {}
         self._cache_instance.append(self)
         self._name = name
-        self._timestamp = None
+        self._generation = {}
         self._lock = Lock()
 
     def _key(self, key):
@@ -42,38 +62,95 @@ class Cache(object):
             return (key, Transaction().user, freeze(Transaction().context))
         return key
 
+    def _get_cache(self, dbname):
+        "Return the LRUDict for dbname dropping it if it is outdated"
+        generation = Cache._generations.get(dbname, {}).get(self._name, 0)
+        if self._generation.get(dbname) != generation:
+            self._generation[dbname] = generation
+            self._cache[dbname] = LRUDict(self.size_limit)
+        return self._cache.setdefault(dbname, LRUDict(self.size_limit))
+
     def get(self, key, default=None):
         cursor = Transaction().cursor
         key = self._key(key)
         with self._lock:
-            cache = self._cache.setdefault(cursor.dbname,
-                LRUDict(self.size_limit))
+            cache = self._get_cache(cursor.dbname)
             try:
                 result = cache[key] = cache.pop(key)
-                return result
             except (KeyError, TypeError):
+                Stats.cache(False)
                 return default
+        Stats.cache(True)
+        return result
 
     def set(self, key, value):
         cursor = Transaction().cursor
         key = self._key(key)
         with self._lock:
-            cache = self._cache.setdefault(cursor.dbname,
-                LRUDict(self.size_limit))
+            cache = self._get_cache(cursor.dbname)
             try:
                 cache[key] = value
             except TypeError:
                 pass
         return value
 
+    def get_many(self, keys):
+        "Return a dictionary with the value of each key found"
+        cursor = Transaction().cursor
+        result = {}
+        with self._lock:
+            cache = self._get_cache(cursor.dbname)
+            for key in keys:
+                cache_key = self._key(key)
+                try:
+                    result[key] = cache[cache_key] = cache.pop(cache_key)
+                except (KeyError, TypeError):
+                    Stats.cache(False)
+                else:
+                    Stats.cache(True)
+        return result
+
+    def set_many(self, items):
+        "Set the values of the (key, value) items"
+        cursor = Transaction().cursor
+        with self._lock:
+            cache = self._get_cache(cursor.dbname)
+            for key, value in items:
+                try:
+                    cache[self._key(key)] = value
+                except TypeError:
+                    pass
+
     def clear(self):
         cursor = Transaction().cursor
         Cache.reset(cursor.dbname, self._name)
         with self._lock:
             self._cache[cursor.dbname] = LRUDict(self.size_limit)
 
+    @staticmethod
+    def _invalidate(dbname, names=None):
+        "Increase the generation of names or of all names if None"
+        with Cache._generations_lock:
+            generations = Cache._generations.setdefault(dbname, {})
+            if names is None:
+                names = set(generations) | set(
+                    inst._name for inst in Cache._cache_instance)
+            for name in names:
+                generations[name] = generations.get(name, 0) + 1
+
     @staticmethod
     def clean(dbname):
+        database = Transaction().database
+        if database.has_channel():
+            Cache._listen(dbname)
+            return
+        timeout = config.getint('cache', 'clean_timeout', 0)
+        now = time.time()
+        with Cache._generations_lock:
+            last = Cache._clean_last.get(dbname)
+            if last is not None and 0 <= now - last < timeout:
+                return
+            Cache._clean_last[dbname] = now
         with Transaction().new_cursor():
             cursor = Transaction().cursor
             table = Table('ir_cache')
@@ -81,13 +158,69 @@ class Cache(object):
             timestamps = {}
             for timestamp, name in cursor.fetchall():
                 timestamps[name] = timestamp
-        for inst in Cache._cache_instance:
-            if inst._name in timestamps:
-                with inst._lock:
-                    if (not inst._timestamp
-                            or timestamps[inst._name] > inst._timestamp):
-                        inst._timestamp = timestamps[inst._name]
-                        inst._cache[dbname] = LRUDict(inst.size_limit)
+        with Cache._generations_lock:
+            known = Cache._timestamps.setdefault(dbname, {})
+            names = [n for n, t in timestamps.iteritems()
+                if n not in known or t > known[n]]
+            known.update(timestamps)
+        if names:
+            Cache._invalidate(dbname, names)
+
+    @staticmethod
+    def _listen(dbname):
+        "Start the thread listening for invalidation of dbname"
+        with Cache._listener_lock:
+            thread = Cache._listener.get(dbname)
+            if thread is not None and thread.is_alive():
+                return
+            database = Transaction().database
+            # LISTEN before returning to not miss any notification
+            conn = database.get_connection(autocommit=True)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('LISTEN "%s"' % Cache._channel)
+                cursor.close()
+            except Exception:
+                database.put_connection(conn, close=True)
+                raise
+            thread = threading.Thread(target=Cache._listener_run,
+                args=(dbname, database, conn),
+                name='%s listener %s' % (Cache._channel, dbname))
+            thread.daemon = True
+            Cache._listener[dbname] = thread
+            # Notifications may have been lost since the previous listener
+            if Cache._generations.get(dbname):
+                Cache._invalidate(dbname)
+            # Start under the lock to be alive for the concurrent callers
+            thread.start()
+
+    @staticmethod
+    def _listener_run(dbname, database, conn):
+        current = threading.current_thread()
+        try:
+            while Cache._listener.get(dbname) is current:
+                readables, _, _ = select.select([conn], [], [], 60)
+                if not readables:
+                    continue
+                conn.poll()
+                names = set()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    if notification.payload:
+                        names.add(notification.payload)
+                if names:
+                    Cache._invalidate(dbname, names)
+        except Exception:
+            logger.error('cache listener on "%s" failed', dbname,
+                exc_info=True)
+        finally:
+            try:
+                database.put_connection(conn, close=True)
+            except Exception:
+                pass
+            with Cache._listener_lock:
+                if Cache._listener.get(dbname) is current:
+                    del Cache._listener[dbname]
 
     @staticmethod
     def reset(dbname, name):
@@ -97,24 +230,35 @@ class Cache(object):
 
     @staticmethod
     def resets(dbname):
+        with Cache._resets_lock:
+            names = Cache._resets.get(dbname)
+            if not names:
+                return
+            names = list(names)
         with Transaction().new_cursor():
             cursor = Transaction().cursor
             table = Table('ir_cache')
             with Cache._resets_lock:
-                Cache._resets.setdefault(dbname, set())
-                for name in Cache._resets[dbname]:
-                    cursor.execute(*table.select(table.name,
-                            where=table.name == name))
-                    if cursor.fetchone():
-                        # It would be better to insert only
-                        cursor.execute(*table.update([table.timestamp],
-                                [Now()], where=table.name == name))
-                    else:
-                        cursor.execute(*table.insert(
-                                [table.timestamp, table.name],
-                                [[Now(), name]]))
-                Cache._resets[dbname].clear()
+                cursor.execute(*table.select(table.name,
+                        where=table.name.in_(names)))
+                existing = set(n for n, in cursor.fetchall())
+                if existing:
+                    cursor.execute(*table.update([table.timestamp],
+                            [Now()], where=table.name.in_(list(existing))))
+                missing = [n for n in names if n not in existing]
+                if missing:
+                    cursor.execute(*table.insert(
+                            [table.timestamp, table.name],
+                            [[Now(), n] for n in missing]))
+                if Transaction().database.has_channel():
+                    for name in names:
+                        cursor.execute('NOTIFY "%s", %%s' % Cache._channel,
+                            (name,))
+                Cache._resets[dbname].difference_update(names)
             cursor.commit()
+        if Transaction().database.has_channel():
+            # Do not wait for the notification to invalidate this process
+            Cache._invalidate(dbname, names)
 
 
 class LRUDict(OrderedDict):
@@ -50,12 +50,22 @@ class TrytonConfigParser(ConfigParser.RawConfigParser):
         self.set('database', 'path', '/var/lib/trytond')
         self.set('database', 'list', 'True')
         self.set('database', 'retry', 5)
+        self.set('database', 'slow_query', 0)
         self.set('database', 'language', 'en_US')
         self.add_section('ssl')
         self.add_section('email')
         self.set('email', 'uri', 'smtp://localhost:25')
+        self.add_section('cache')
+        self.set('cache', 'clean_timeout', 0)
+        self.set('cache', 'translation_preload', 'False')
         self.add_section('session')
         self.set('session', 'timeout', 600)
+        self.set('session', 'flush_interval', 60)
+        self.add_section('stats')
+        self.set('stats', 'enabled', 'False')
+        self.set('stats', 'slow_threshold', 0)
+        self.set('stats', 'top_queries', 5)
+        self.set('stats', 'metrics', 'False')
         self.add_section('report')
         self.set('report', 'unoconv',
             'pipe,name=trytond;urp;StarOffice.ComponentContext')
@@ -2,8 +2,6 @@
 #this repository contains the full copyright notices and license terms.
 import re
 import heapq
-from sql.aggregate import Max
-from sql.conditionals import Case
 from collections import defaultdict
 try:
     import simplejson as json
@@ -19,7 +17,7 @@ from ..pool import Pool
 from ..pyson import Bool, Eval
 from ..rpc import RPC
 from .. import backend
-from ..protocols.jsonrpc import JSONDecoder, JSONEncoder
+from ..tools.json_ import JSONDecoder, JSONEncoder
 try:
     from ..tools.StringMatcher import StringMatcher
 except ImportError:
@@ -480,45 +478,58 @@ class ModelAccess(ModelSQL, ModelView):
         if Transaction().user == 0:
             return defaultdict(lambda: defaultdict(lambda: True))
 
+        User = Pool().get('res.user')
+        access = cls._get_access_groups(tuple(sorted(User.get_groups())))
+        default = {'read': True, 'write': True, 'create': True, 'delete': True}
+        return dict((m, access.get(m, default)) for m in models)
+
+    @classmethod
+    def _get_access_groups(cls, groups):
+        '''
+        Return the access of all the models for the groups
+        The result is shared by all the users with the same groups.
+        '''
+        access = cls._get_access_cache.get(groups)
+        if access is not None:
+            return access
+        key, groups = groups, set(groups)
+        access = {}
+        for model, group, modes in cls._get_access_matrix():
+            if group is None or group in groups:
+                maccess = access.setdefault(model,
+                    dict.fromkeys(modes, False))
+                for mode, value in modes.iteritems():
+                    maccess[mode] |= value
+        cls._get_access_cache.set(key, access)
+        return access
+
+    @classmethod
+    def _get_access_matrix(cls):
+        '''
+        Return the list of (model, group, access by mode) of all the rows
+        '''
+        matrix = cls._get_access_cache.get(None)
+        if matrix is not None:
+            return matrix
         pool = Pool()
         Model = pool.get('ir.model')
-        UserGroup = pool.get('res.user-res.group')
         cursor = Transaction().cursor
-        user = Transaction().user
         model_access = cls.__table__()
         ir_model = Model.__table__()
-        user_group = UserGroup.__table__()
-
-        access = {}
-        for model in models:
-            maccess = cls._get_access_cache.get((user, model), default=-1)
-            if maccess == -1:
-                break
-            access[model] = maccess
-        else:
-            return access
-
-        default = {'read': True, 'write': True, 'create': True, 'delete': True}
-        access = dict((m, default) for m in models)
-        cursor.execute(*model_access.join(ir_model, 'LEFT',
+        cursor.execute(*model_access.join(ir_model,
                 condition=model_access.model == ir_model.id
-                ).join(user_group, 'LEFT',
-                condition=user_group.group == model_access.group
-                ).select(
-                ir_model.model,
-                Max(Case((model_access.perm_read, 1), else_=0)),
-                Max(Case((model_access.perm_write, 1), else_=0)),
-                Max(Case((model_access.perm_create, 1), else_=0)),
-                Max(Case((model_access.perm_delete, 1), else_=0)),
-                where=ir_model.model.in_(models)
-                & ((user_group.user == user) | (model_access.group == None)),
-                group_by=ir_model.model))
-        access.update(dict(
-                (m, {'read': r, 'write': w, 'create': c, 'delete': d})
-                for m, r, w, c, d in cursor.fetchall()))
-        for model, maccess in access.iteritems():
-            cls._get_access_cache.set((user, model), maccess)
-        return access
+                ).select(ir_model.model, model_access.group,
+                model_access.perm_read, model_access.perm_write,
+                model_access.perm_create, model_access.perm_delete))
+        matrix = [(m, g, {
+                    'read': bool(r),
+                    'write': bool(w),
+                    'create': bool(c),
+                    'delete': bool(d),
+                    })
+            for m, g, r, w, c, d in cursor.fetchall()]
+        cls._get_access_cache.set(None, matrix)
+        return matrix
 
     @classmethod
     def check(cls, model_name, mode='read', raise_exception=True):
@@ -655,49 +666,62 @@ class ModelFieldAccess(ModelSQL, ModelView):
             return defaultdict(lambda: defaultdict(
                     lambda: defaultdict(lambda: True)))
 
+        User = Pool().get('res.user')
+        accesses = cls._get_access_groups(tuple(sorted(User.get_groups())))
+        return dict((m, accesses.get(m, {})) for m in models)
+
+    @classmethod
+    def _get_access_groups(cls, groups):
+        '''
+        Return the access of the fields of all the models for the groups
+        The result is shared by all the users with the same groups.
+        '''
+        accesses = cls._get_access_cache.get(groups)
+        if accesses is not None:
+            return accesses
+        key, groups = groups, set(groups)
+        accesses = {}
+        for model, field, group, modes in cls._get_access_matrix():
+            if group is None or group in groups:
+                faccess = accesses.setdefault(model, {}).setdefault(field,
+                    dict.fromkeys(modes, False))
+                for mode, value in modes.iteritems():
+                    faccess[mode] |= value
+        cls._get_access_cache.set(key, accesses)
+        return accesses
+
+    @classmethod
+    def _get_access_matrix(cls):
+        '''
+        Return the list of (model, field, group, access by mode) of all the
+        rows
+        '''
+        matrix = cls._get_access_cache.get(None)
+        if matrix is not None:
+            return matrix
         pool = Pool()
         Model = pool.get('ir.model')
         ModelField = pool.get('ir.model.field')
-        UserGroup = pool.get('res.user-res.group')
         cursor = Transaction().cursor
-        user = Transaction().user
         field_access = cls.__table__()
         ir_model = Model.__table__()
         model_field = ModelField.__table__()
-        user_group = UserGroup.__table__()
-
-        accesses = {}
-        for model in models:
-            maccesses = cls._get_access_cache.get((user, model))
-            if maccesses is None:
-                break
-            accesses[model] = maccesses
-        else:
-            return accesses
-
-        default = {}
-        accesses = dict((m, default) for m in models)
         cursor.execute(*field_access.join(model_field,
                 condition=field_access.field == model_field.id
                 ).join(ir_model,
                 condition=model_field.model == ir_model.id
-                ).join(user_group, 'LEFT',
-                condition=user_group.group == field_access.group
-                ).select(
-                ir_model.model,
-                model_field.name,
-                Max(Case((field_access.perm_read, 1), else_=0)),
-                Max(Case((field_access.perm_write, 1), else_=0)),
-                Max(Case((field_access.perm_create, 1), else_=0)),
-                Max(Case((field_access.perm_delete, 1), else_=0)),
-                where=ir_model.model.in_(models)
-                & ((user_group.user == user) | (field_access.group == None)),
-                group_by=[ir_model.model, model_field.name]))
-        for m, f, r, w, c, d in cursor.fetchall():
-            accesses[m][f] = {'read': r, 'write': w, 'create': c, 'delete': d}
-        for model, maccesses in accesses.iteritems():
-            cls._get_access_cache.set((user, model), maccesses)
-        return accesses
+                ).select(ir_model.model, model_field.name, field_access.group,
+                field_access.perm_read, field_access.perm_write,
+                field_access.perm_create, field_access.perm_delete))
+        matrix = [(m, f, g, {
+                    'read': bool(r),
+                    'write': bool(w),
+                    'create': bool(c),
+                    'delete': bool(d),
+                    })
+            for m, f, g, r, w, c, d in cursor.fetchall()]
+        cls._get_access_cache.set(None, matrix)
+        return matrix
 
     @classmethod
     def check(cls, model_name, fields, mode='read', raise_exception=True,
@@ -1,7 +1,10 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
+import time
+from threading import Lock
+
 from ..model import ModelView, ModelSQL, fields, dualmethod
-from ..tools import safe_eval
+from ..tools import safe_eval, safe_compile, reduce_ids, grouped_slice
 from ..transaction import Transaction
 from ..cache import Cache
 from ..pool import Pool
@@ -71,22 +74,29 @@ class RuleGroup(ModelSQL, ModelView):
 
     @classmethod
     def delete(cls, groups):
+        Rule = Pool().get('ir.rule')
+        models = set(g.model.model for g in groups)
         super(RuleGroup, cls).delete(groups)
         # Restart the cache on the domain_get method of ir.rule
-        Pool().get('ir.rule')._domain_get_cache.clear()
+        Rule._domain_get_clear(models)
 
     @classmethod
     def create(cls, vlist):
+        Rule = Pool().get('ir.rule')
         res = super(RuleGroup, cls).create(vlist)
         # Restart the cache on the domain_get method of ir.rule
-        Pool().get('ir.rule')._domain_get_cache.clear()
+        Rule._domain_get_clear(set(g.model.model for g in res))
         return res
 
     @classmethod
     def write(cls, groups, vals, *args):
+        Rule = Pool().get('ir.rule')
+        all_groups = sum(((groups, vals) + args)[0:None:2], [])
+        models = set(g.model.model for g in all_groups)
         super(RuleGroup, cls).write(groups, vals, *args)
+        models.update(g.model.model for g in cls.browse(all_groups))
         # Restart the cache on the domain_get method of ir.rule
-        Pool().get('ir.rule')._domain_get_cache.clear()
+        Rule._domain_get_clear(models)
 
 
 class Rule(ModelSQL, ModelView):
@@ -98,6 +108,8 @@ class Rule(ModelSQL, ModelView):
     domain = fields.Char('Domain', required=True,
         help='Domain is evaluated with "user" as the current user')
     _domain_get_cache = Cache('ir_rule.domain_get', context=False)
+    _domain_get_model_caches = {}
+    _domain_get_model_caches_lock = Lock()
 
     @classmethod
     def __setup__(cls):
@@ -153,96 +165,149 @@ class Rule(ModelSQL, ModelView):
         return (Transaction().user,)
 
     @classmethod
-    def domain_get(cls, model_name, mode='read'):
-        assert mode in ['read', 'write', 'create', 'delete'], \
-            'Invalid domain mode for security'
-
-        # root user above constraint
-        if Transaction().user == 0:
-            if not Transaction().context.get('user'):
-                return
-            with Transaction().set_user(Transaction().context['user']):
-                return cls.domain_get(model_name, mode=mode)
+    def _domain_get_model_cache(cls, model_name):
+        "Return the cache of domain_get for the model"
+        cache = cls._domain_get_model_caches.get(model_name)
+        if cache is None:
+            with cls._domain_get_model_caches_lock:
+                cache = cls._domain_get_model_caches.get(model_name)
+                if cache is None:
+                    cache = Cache('ir_rule.domain_get.%s' % model_name,
+                        context=False)
+                    cls._domain_get_model_caches[model_name] = cache
+        return cache
 
-        key = (model_name, mode) + cls._get_cache_key()
-        domain = cls._domain_get_cache.get(key, False)
-        if domain is not False:
-            return domain
+    @classmethod
+    def _domain_get_clear(cls, model_names):
+        "Clear the cache of domain_get for the models"
+        for model_name in model_names:
+            cls._domain_get_model_cache(model_name).clear()
 
+    @classmethod
+    def _get_rule_groups(cls, model_name, mode):
+        """
+        Return the list of rule groups of the model for the mode as tuples:
+        (id, global_p, default_p, group ids, user ids, rules)
+        where rules is a list of (id, domain, user dependent)
+        """
         pool = Pool()
         RuleGroup = pool.get('ir.rule.group')
         Model = pool.get('ir.model')
         RuleGroup_User = pool.get('ir.rule.group-res.user')
         RuleGroup_Group = pool.get('ir.rule.group-res.group')
-        User_Group = pool.get('res.user-res.group')
-
         cursor = Transaction().cursor
         rule_table = cls.__table__()
         rule_group = RuleGroup.__table__()
         rule_group_user = RuleGroup_User.__table__()
         rule_group_group = RuleGroup_Group.__table__()
-        user_group = User_Group.__table__()
         model = Model.__table__()
-        user_id = Transaction().user
-        cursor.execute(*rule_table.join(rule_group,
-                condition=rule_group.id == rule_table.rule_group
-                ).join(model,
+
+        cursor.execute(*rule_group.join(model,
                 condition=rule_group.model == model.id
-                ).select(rule_table.id,
+                ).select(rule_group.id, rule_group.global_p,
+                rule_group.default_p,
                 where=(model.model == model_name)
-                & getattr(rule_group, 'perm_%s' % mode)
-                & (rule_group.id.in_(
-                        rule_group_user.select(rule_group_user.rule_group,
-                            where=rule_group_user.user == user_id)
-                        | rule_group_group.join(
-                            user_group,
-                            condition=(rule_group_group.group
-                                == user_group.group)
-                            ).select(rule_group_group.rule_group,
-                            where=user_group.user == user_id)
-                        )
-                    | rule_group.default_p
-                    | rule_group.global_p
-                    )))
-        ids = [x[0] for x in cursor.fetchall()]
-        if not ids:
-            cls._domain_get_cache.set(key, None)
+                & getattr(rule_group, 'perm_%s' % mode)))
+        rule_groups = cursor.fetchall()
+        # A rule using the evaluation context depends on the user
+        context_names = set(cls._get_context())
+        groups, users, rules = {}, {}, {}
+        for sub_ids in grouped_slice([r[0] for r in rule_groups]):
+            sub_ids = list(sub_ids)
+            cursor.execute(*rule_group_group.select(
+                    rule_group_group.rule_group, rule_group_group.group,
+                    where=reduce_ids(rule_group_group.rule_group, sub_ids)))
+            for rule_group_id, group_id in cursor.fetchall():
+                groups.setdefault(rule_group_id, set()).add(group_id)
+            cursor.execute(*rule_group_user.select(
+                    rule_group_user.rule_group, rule_group_user.user,
+                    where=reduce_ids(rule_group_user.rule_group, sub_ids)))
+            for rule_group_id, user_id in cursor.fetchall():
+                users.setdefault(rule_group_id, set()).add(user_id)
+            cursor.execute(*rule_table.select(
+                    rule_table.id, rule_table.rule_group, rule_table.domain,
+                    where=reduce_ids(rule_table.rule_group, sub_ids),
+                    order_by=rule_table.id))
+            for rule_id, rule_group_id, domain in cursor.fetchall():
+                assert domain, ('Rule domain empty,'
+                    'check if migration was done')
+                names = set(safe_compile(domain).co_names)
+                rules.setdefault(rule_group_id, []).append(
+                    (rule_id, domain, bool(names & context_names)))
+        return [(id_, global_p, default_p, frozenset(groups.get(id_, [])),
+                frozenset(users.get(id_, [])), rules.get(id_, []))
+            for id_, global_p, default_p in rule_groups]
+
+    @classmethod
+    def domain_get(cls, model_name, mode='read'):
+        assert mode in ['read', 'write', 'create', 'delete'], \
+            'Invalid domain mode for security'
+
+        # root user above constraint
+        if Transaction().user == 0:
+            if not Transaction().context.get('user'):
+                return
+            with Transaction().set_user(Transaction().context['user']):
+                return cls.domain_get(model_name, mode=mode)
+
+        # The cache of the model is dropped when its rules change and the
+        # epoch changes when _domain_get_cache is cleared
+        cache = cls._domain_get_model_cache(model_name)
+        epoch = cls._domain_get_cache.get(None)
+        if epoch is None:
+            epoch = cls._domain_get_cache.set(None, time.time())
+
+        rule_groups = cache.get((epoch, mode))
+        if rule_groups is None:
+            rule_groups = cls._get_rule_groups(model_name, mode)
+            cache.set((epoch, mode), rule_groups)
+        if not any(rules for _, _, _, _, _, rules in rule_groups):
             return
-        obj = pool.get(model_name)
+
+        user_id = Transaction().user
+        groups = set(Pool().get('res.user').get_groups())
+        applied = []
+        user_dependent = False
+        for rule_group in rule_groups:
+            id_, global_p, default_p, group_ids, user_ids, rules = rule_group
+            if (global_p or default_p or user_id in user_ids
+                    or groups & group_ids):
+                applied.append(rule_group)
+                user_dependent |= any(d for _, _, d in rules)
+
+        # The clause is shared by the users with the same rule groups
+        # unless a rule depends on the user
+        key = (epoch, mode, tuple(r[0] for r in applied))
+        if user_dependent:
+            key += cls._get_cache_key()
+        domain = cache.get(key, False)
+        if domain is not False:
+            return domain
+
+        if not any(rules for _, _, _, _, _, rules in applied):
+            cache.set(key, None)
+            return
+
         clause = {}
         clause_global = {}
         ctx = cls._get_context()
         # Use root user without context to prevent recursion
         with Transaction().set_user(0), \
                 Transaction().set_context(user=0):
-            for rule in cls.browse(ids):
-                assert rule.domain, ('Rule domain empty,'
-                    'check if migration was done')
-                dom = safe_eval(rule.domain, ctx)
-                if rule.rule_group.global_p:
-                    clause_global.setdefault(rule.rule_group.id, ['OR'])
-                    clause_global[rule.rule_group.id].append(dom)
-                else:
-                    clause.setdefault(rule.rule_group.id, ['OR'])
-                    clause[rule.rule_group.id].append(dom)
-
-        # Test if there is no rule_group that have no rule
-        cursor.execute(*rule_group.join(model,
-                condition=rule_group.model == model.id
-                ).select(rule_group.id,
-                where=(model.model == model_name)
-                & ~rule_group.id.in_(rule_table.select(rule_table.rule_group))
-                & rule_group.id.in_(rule_group_user.select(
-                        rule_group_user.rule_group,
-                        where=rule_group_user.user == user_id)
-                    | rule_group_group.join(user_group,
-                        condition=rule_group_group.group == user_group.group
-                        ).select(rule_group_group.rule_group,
-                        where=user_group.user == user_id))))
-        fetchone = cursor.fetchone()
-        if fetchone:
-            group_id = fetchone[0]
-            clause[group_id] = []
+            for id_, global_p, _, _, _, rules in applied:
+                for _, domain, _ in rules:
+                    dom = safe_eval(domain, ctx)
+                    if global_p:
+                        clause_global.setdefault(id_, ['OR']).append(dom)
+                    else:
+                        clause.setdefault(id_, ['OR']).append(dom)
+
+        # A rule group of the user without rule allows everything
+        for id_, global_p, default_p, group_ids, user_ids, rules in applied:
+            if (not rules and not global_p
+                    and (user_id in user_ids or groups & group_ids)):
+                clause[id_] = []
+                break
         clause = clause.values()
         clause.insert(0, 'OR')
 
@@ -255,26 +320,35 @@ class Rule(ModelSQL, ModelView):
         # Use root to prevent infinite recursion
         with Transaction().set_user(0), \
                 Transaction().set_context(active_test=False, user=0):
-            query = obj.search(clause, order=[], query=True)
+            query = Pool().get(model_name).search(clause, order=[],
+                query=True)
 
-        cls._domain_get_cache.set(key, query)
+        cache.set(key, query)
         return query
 
+    @classmethod
+    def _rules_models(cls, rules):
+        return set(r.rule_group.model.model for r in rules)
+
     @classmethod
     def delete(cls, rules):
+        models = cls._rules_models(rules)
         super(Rule, cls).delete(rules)
         # Restart the cache on the domain_get method of ir.rule
-        cls._domain_get_cache.clear()
+        cls._domain_get_clear(models)
 
     @classmethod
     def create(cls, vlist):
         res = super(Rule, cls).create(vlist)
         # Restart the cache on the domain_get method of ir.rule
-        cls._domain_get_cache.clear()
+        cls._domain_get_clear(cls._rules_models(res))
         return res
 
     @classmethod
     def write(cls, rules, vals, *args):
+        all_rules = sum(((rules, vals) + args)[0:None:2], [])
+        models = cls._rules_models(all_rules)
         super(Rule, cls).write(rules, vals, *args)
+        models |= cls._rules_models(cls.browse(all_rules))
         # Restart the cache on the domain_get method
-        cls._domain_get_cache.clear()
+        cls._domain_get_clear(models)
@@ -4,18 +4,25 @@ try:
     import simplejson as json
 except ImportError:
     import json
+import logging
 import uuid
 import datetime
+import time
+from threading import Lock
 
 from trytond.model import ModelSQL, fields
 from trytond.config import config
 from .. import backend
 from ..transaction import Transaction
+from ..cache import Cache
+from ..session import get_store
 
 __all__ = [
     'Session', 'SessionWizard',
     ]
 
+logger = logging.getLogger(__name__)
+
 
 class Session(ModelSQL):
     "Session"
@@ -23,6 +30,9 @@ class Session(ModelSQL):
     _rec_name = 'key'
 
     key = fields.Char('Key', required=True, select=True)
+    _check_cache = Cache('ir_session.check', context=False)
+    _flush_last = {}
+    _flush_lock = Lock()
 
     @classmethod
     def __setup__(cls):
@@ -42,31 +52,121 @@ class Session(ModelSQL):
         return uuid.uuid4().hex
 
     @classmethod
-    def check(cls, user, key):
-        "Check user key and delete old one"
+    def create(cls, vlist):
+        sessions = super(Session, cls).create(vlist)
+        dbname = Transaction().cursor.database_name
+        store = get_store()
         now = datetime.datetime.now()
-        timeout = datetime.timedelta(
-            seconds=config.getint('session', 'timeout'))
-        sessions = cls.search([
-                ('create_uid', '=', user),
-                ])
-        find = False
         for session in sessions:
-            timestamp = session.write_date or session.create_date
-            if abs(timestamp - now) < timeout:
-                if session.key == key:
-                    find = True
-            else:
-                cls.delete([session])
-        return find
+            store.set(dbname, session.key, Transaction().user, now)
+        return sessions
+
+    @classmethod
+    def delete(cls, sessions):
+        dbname = Transaction().cursor.database_name
+        get_store().delete(dbname, [s.key for s in sessions])
+        super(Session, cls).delete(sessions)
+        if sessions:
+            cls._check_cache.clear()
+
+    @staticmethod
+    def _timeout():
+        return datetime.timedelta(seconds=config.getint('session', 'timeout'))
+
+    @classmethod
+    def check(cls, user, key):
+        """Check user key
+
+        The key is checked against the session store, ir_session is only
+        queried for keys unknown to the store or after an other process
+        deleted sessions."""
+        dbname = Transaction().cursor.database_name
+        store = get_store()
+        now = datetime.datetime.now()
+        timeout = cls._timeout()
+        entry = store.get(dbname, key)
+        if entry:
+            entry_user, timestamp = entry
+            if entry_user != user:
+                return False
+            if abs(timestamp - now) < timeout and cls._check_cache.get(key):
+                return True
+        domain = [
+            ('key', '=', key),
+            ('create_uid', '=', user),
+            ]
+        timestamps = [s.write_date or s.create_date
+            for s in cls.search(domain)]
+        if not timestamps and Transaction().cursor.replica:
+            # The session may not be yet replicated
+            with Transaction().new_cursor():
+                timestamps = [s.write_date or s.create_date
+                    for s in cls.search(domain)]
+        if not timestamps:
+            store.delete(dbname, [key])
+            return False
+        timestamp, = timestamps
+        if entry:
+            timestamp = max(timestamp, entry[1])
+        if abs(timestamp - now) >= timeout:
+            return False
+        store.set(dbname, key, user, timestamp)
+        cls._check_cache.set(key, True)
+        return True
 
     @classmethod
     def reset(cls, session):
-        "Reset session timestamp"
-        sessions = cls.search([
-                ('key', '=', session),
-                ])
-        cls.write(sessions, {})
+        """Reset session timestamp
+
+        The timestamp is updated in the session store and written to
+        ir_session by flush."""
+        dbname = Transaction().cursor.database_name
+        get_store().touch(dbname, session, datetime.datetime.now())
+
+    @classmethod
+    def flush_due(cls, database_name):
+        "Test if the pending timestamps of the database must be written"
+        interval = config.getint('session', 'flush_interval', 60)
+        last = cls._flush_last.get(database_name)
+        return last is None or not 0 <= time.time() - last < interval
+
+    @classmethod
+    def flush(cls):
+        "Write pending timestamps and delete expired sessions"
+        dbname = Transaction().cursor.database_name
+        store = get_store()
+        with cls._flush_lock:
+            cls._flush_last[dbname] = time.time()
+        touched = store.pop_touched(dbname)
+        try:
+            if touched:
+                cls.write(cls.search([
+                            ('key', 'in', touched.keys()),
+                            ]), {})
+            limit = datetime.datetime.now() - cls._timeout()
+            store.expire(dbname, limit)
+            cls.delete(cls.search(['OR', [
+                            ('write_date', '<', limit),
+                            ], [
+                            ('write_date', '=', None),
+                            ('create_date', '<', limit),
+                            ]]))
+        except Exception:
+            store.restore_touched(dbname, touched)
+            raise
+
+    @classmethod
+    def sweep(cls, database_name):
+        "Flush the sessions of the database in a new transaction"
+        with Transaction().start(database_name, 0) as transaction:
+            try:
+                cls.flush()
+            except Exception:
+                transaction.cursor.rollback()
+                logger.error('sweeping sessions of "%s" failed',
+                    database_name, exc_info=True)
+            else:
+                transaction.cursor.commit()
 
 
 class SessionWizard(ModelSQL):
@@ -27,6 +27,7 @@ from ..pyson import PYSONEncoder
 from ..transaction import Transaction
 from ..pool import Pool
 from ..cache import Cache
+from ..config import config
 from ..const import RECORD_CACHE_SIZE
 
 __all__ = ['Translation',
@@ -75,6 +76,7 @@ class Translation(ModelSQL, ModelView):
     _translation_cache = Cache('ir.translation', size_limit=10240,
         context=False)
     _get_language_cache = Cache('ir.translation')
+    _sources_cache = Cache('ir.translation', context=False)
 
     @classmethod
     def __setup__(cls):
@@ -456,6 +458,61 @@ class Translation(ModelSQL, ModelView):
                 translations[res_id] = False
         return translations
 
+    @classmethod
+    def get_ids_multi(cls, model, field_names, lang, ids):
+        "Return translation for each id of each field of model"
+        if model in ('ir.model.field', 'ir.model'):
+            return dict((f, cls.get_ids(model + ',' + f, 'model', lang, ids))
+                for f in field_names)
+
+        ttype = u'model'
+        lang = unicode(lang)
+        names = dict((unicode(model + ',' + f), f) for f in field_names)
+        translations = dict((f, {}) for f in field_names)
+        fuzzy = Transaction().context.get('fuzzy_translation', False)
+        keys = [(lang, ttype, n, i) for n in names for i in ids]
+        # Don't use cache for fuzzy translation
+        if not fuzzy:
+            cached = cls._translation_cache.get_many(keys)
+            for (_, _, name, res_id), value in cached.iteritems():
+                translations[names[name]][res_id] = value
+            to_fetch = set(res_id for _, _, name, res_id in keys
+                if res_id not in translations[names[name]])
+        else:
+            to_fetch = set(ids)
+        if to_fetch:
+            cursor = Transaction().cursor
+            table = cls.__table__()
+            fetched = []
+            in_max = cursor.IN_MAX / 7
+            for sub_to_fetch in grouped_slice(to_fetch, in_max):
+                where = And(((table.lang == lang),
+                        (table.type == ttype),
+                        table.name.in_(names.keys()),
+                        (table.value != ''),
+                        (table.value != None),
+                        reduce_ids(table.res_id, sub_to_fetch),
+                        ))
+                if not fuzzy:
+                    where &= table.fuzzy == False
+                cursor.execute(*table.select(table.name, table.res_id,
+                        table.value, where=where))
+                for name, res_id, value in cursor.fetchall():
+                    translations[names[name]][res_id] = value
+                    fetched.append(((lang, ttype, name, res_id), value))
+            # Don't store fuzzy translation in cache
+            if not fuzzy:
+                cls._translation_cache.set_many(fetched)
+        missing = []
+        for name, field_name in names.iteritems():
+            field_translations = translations[field_name]
+            for res_id in ids:
+                if res_id not in field_translations:
+                    missing.append(((lang, ttype, name, res_id), False))
+                    field_translations[res_id] = False
+        cls._translation_cache.set_many(missing)
+        return translations
+
     @classmethod
     def set_ids(cls, name, ttype, lang, ids, values):
         "Set translation for each id"
@@ -601,6 +658,9 @@ class Translation(ModelSQL, ModelView):
         lang = unicode(lang)
         if source is not None:
             source = unicode(source)
+        sources = cls._get_sources_preloaded(lang)
+        if sources is not None:
+            return sources.get((ttype, name, source))
         trans = cls._translation_cache.get((lang, ttype, name, source), -1)
         if trans != -1:
             return trans
@@ -636,6 +696,11 @@ class Translation(ModelSQL, ModelView):
         clause = []
         cursor = Transaction().cursor
         table = cls.__table__()
+        if config.getboolean('cache', 'translation_preload', False):
+            for name, ttype, lang, source in args:
+                res[(name, ttype, lang, source)] = cls.get_source(
+                    name, ttype, lang, source)
+            return res
         if len(args) > cursor.IN_MAX:
             for sub_args in grouped_slice(args):
                 res.update(cls.get_sources(list(sub_args)))
@@ -678,15 +743,45 @@ class Translation(ModelSQL, ModelView):
                         value)
         return res
 
+    @classmethod
+    def _get_sources_preloaded(cls, lang):
+        '''
+        Return the translations of lang keyed by (type, name, source)
+        or None if the preload is not activated.
+        All the translations of the language are loaded on first use.
+        '''
+        if not config.getboolean('cache', 'translation_preload', False):
+            return None
+        sources = cls._sources_cache.get(lang)
+        if sources is not None:
+            return sources
+        cursor = Transaction().cursor
+        table = cls.__table__()
+        cursor.execute(*table.select(table.type, table.name, table.src,
+                table.value,
+                where=(table.lang == lang)
+                & (table.value != '')
+                & (table.value != None)
+                & (table.fuzzy == False)
+                & (table.res_id == -1)))
+        sources = {}
+        for ttype, name, source, value in cursor.fetchall():
+            sources[(ttype, name, source)] = value
+            sources.setdefault((ttype, name, None), value)
+        cls._sources_cache.set(lang, sources)
+        return sources
+
     @classmethod
     def delete(cls, translations):
         cls._translation_cache.clear()
+        cls._sources_cache.clear()
         ModelView._fields_view_get_cache.clear()
         return super(Translation, cls).delete(translations)
 
     @classmethod
     def create(cls, vlist):
         cls._translation_cache.clear()
+        cls._sources_cache.clear()
         ModelView._fields_view_get_cache.clear()
         vlist = [x.copy() for x in vlist]
 
@@ -722,6 +817,7 @@ class Translation(ModelSQL, ModelView):
     @classmethod
     def write(cls, translations, values, *args):
         cls._translation_cache.clear()
+        cls._sources_cache.clear()
         ModelView._fields_view_get_cache.clear()
         actions = iter((translations, values) + args)
         args = []
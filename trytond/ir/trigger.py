@@ -2,12 +2,13 @@
 #this repository contains the full copyright notices and license terms.
 import datetime
 import time
+from itertools import izip
 from sql import Literal
 from sql.aggregate import Count, Max
 
 from ..model import ModelView, ModelSQL, fields
 from ..pyson import Eval
-from ..tools import safe_eval, grouped_slice
+from ..tools import safe_eval, safe_compile, grouped_slice
 from .. import backend
 from ..tools import reduce_ids
 from ..transaction import Transaction
@@ -138,17 +139,29 @@ class Trigger(ModelSQL, ModelView):
         cls._get_triggers_cache.set(key, map(int, triggers))
         return triggers
 
-    @staticmethod
-    def eval(trigger, record):
+    @classmethod
+    def eval(cls, trigger, record):
         """
         Evaluate the condition of trigger
         """
+        return cls.eval_records(trigger, [record])[0]
+
+    @staticmethod
+    def eval_records(trigger, records):
+        """
+        Evaluate the condition of trigger for each record
+        and return the list of results
+        """
+        condition = safe_compile(trigger.condition)
         env = {}
         env['current_date'] = datetime.datetime.today()
         env['time'] = time
         env['context'] = Transaction().context
-        env['self'] = record
-        return bool(safe_eval(trigger.condition, env))
+        results = []
+        for record in records:
+            env['self'] = record
+            results.append(bool(safe_eval(condition, env.copy())))
+        return results
 
     @classmethod
     def trigger_action(cls, records, trigger):
@@ -243,8 +256,9 @@ class Trigger(ModelSQL, ModelView):
             triggered = []
             # TODO add a domain
             records = Model.search([])
-            for record in records:
-                if cls.eval(trigger, record):
+            for record, result in izip(records,
+                    cls.eval_records(trigger, records)):
+                if result:
                     triggered.append(record)
             if triggered:
                 cls.trigger_action(triggered, trigger)
@@ -7,7 +7,7 @@ except ImportError:
 from sql import Query, Expression
 
 from .field import Field, SQLType
-from ...protocols.jsonrpc import JSONDecoder, JSONEncoder
+from ...tools.json_ import JSONDecoder, JSONEncoder
 
 
 class Dict(Field):
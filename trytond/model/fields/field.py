@@ -4,7 +4,8 @@ from collections import namedtuple
 import warnings
 from functools import wraps
 
-from sql import operators, Column, Literal, Select, CombiningQuery
+from sql import operators, Column, Literal, Select, CombiningQuery, \
+    Expression, Table, Union, AliasManager
 from sql.conditionals import Coalesce, NullIf
 from sql.operators import Concat
 
@@ -107,6 +108,49 @@ SQL_OPERATORS = {
     }
 
 
+class _WithRecursive(Expression):
+    "Sub-query WITH RECURSIVE table defined by query returning select"
+    __slots__ = ('table', 'columns', 'query', 'select')
+
+    def __init__(self, table, columns, query, select):
+        self.table = table
+        self.columns = columns
+        self.query = query
+        self.select = select
+
+    def __str__(self):
+        with AliasManager():
+            return '(WITH RECURSIVE %s (%s) AS (%s) %s)' % (self.table,
+                ', '.join('"%s"' % c for c in self.columns), self.query,
+                self.select)
+
+    @property
+    def params(self):
+        return self.query.params + self.select.params
+
+
+def recursive_query(Target, ids, step):
+    '''
+    Return the query of the ids and of the ids of Target found recursively
+    step is called with the table and expression of the readable records of
+    Target and the table of the ids found to return the query of the next ids
+    '''
+    Rule = Pool().get('ir.rule')
+    tree = Table('tree')
+    tables, expression = Target.search_domain([('id', 'in', ids)],
+        active_test=False)
+    anchor, _ = tables[None]
+    query = anchor.select(anchor.id, where=expression)
+    tables, expression = Target.search_domain([])
+    table, _ = tables[None]
+    domain = Rule.domain_get(Target.__name__, mode='read')
+    if domain:
+        expression &= table.id.in_(domain)
+    return _WithRecursive(tree, ['id'],
+        Union(query, step(table, expression, tree)),
+        tree.select(tree.id))
+
+
 class Field(object):
     _type = None
 
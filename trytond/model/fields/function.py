@@ -63,33 +63,66 @@ class Function(Field):
             Model.raise_user_error('search_function_missing', name)
         return getattr(Model, self.searcher)(name, domain)
 
-    def get(self, ids, Model, name, values=None):
+    def get(self, ids, Model, name, values=None, datetimes=None):
         '''
         Call the getter.
         If the function has ``names`` in the function definition then
         it will call it with a list of name.
+        If datetimes is a dictionary of datetime per id, the getter is called
+        with it if it has ``datetimes`` in the function definition otherwise
+        it is called for each datetime with ``_datetime`` in the context.
         '''
         with Transaction().set_context(_check_access=False):
             method = getattr(Model, self.getter)
+            args = inspect.getargspec(method)[0]
+
+            if datetimes is not None and 'datetimes' not in args:
+                return self._get_datetimes(ids, Model, name, values,
+                    datetimes)
 
             def call(name):
                 records = Model.browse(ids)
+                kwargs = {}
+                if datetimes is not None:
+                    kwargs['datetimes'] = datetimes
                 if not hasattr(method, 'im_self') or method.im_self:
-                    return method(records, name)
+                    return method(records, name, **kwargs)
                 else:
-                    return dict((r.id, method(r, name)) for r in records)
+                    return dict((r.id, method(r, name, **kwargs))
+                        for r in records)
             if isinstance(name, list):
                 names = name
                 # Test is the function works with a list of names
-                if 'names' in inspect.getargspec(method)[0]:
+                if 'names' in args:
                     return call(names)
                 return dict((name, call(name)) for name in names)
             else:
                 # Test is the function works with a list of names
-                if 'names' in inspect.getargspec(method)[0]:
+                if 'names' in args:
                     name = [name]
                 return call(name)
 
+    def _get_datetimes(self, ids, Model, name, values, datetimes):
+        "Call get once for the ids of each datetime"
+        datetime2ids = {}
+        for id_ in ids:
+            datetime2ids.setdefault(datetimes[id_], []).append(id_)
+        if values is not None:
+            id2values = dict((v['id'], v) for v in values)
+        result = {}
+        for datetime_, sub_ids in datetime2ids.iteritems():
+            sub_values = None
+            if values is not None:
+                sub_values = [id2values[i] for i in sub_ids]
+            with Transaction().set_context(_datetime=datetime_):
+                sub_result = self.get(sub_ids, Model, name, values=sub_values)
+            if isinstance(name, list):
+                for fname, fresult in sub_result.iteritems():
+                    result.setdefault(fname, {}).update(fresult)
+            else:
+                result.update(sub_result)
+        return result
+
     def set(self, Model, name, ids, value, *args):
         '''
         Call the setter.
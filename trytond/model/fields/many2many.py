@@ -4,9 +4,10 @@ from itertools import chain
 from sql import Cast, Literal
 from sql.functions import Substring, Position
 
-from .field import Field, size_validate
+from .field import Field, size_validate, recursive_query
 from ...pool import Pool
 from ...tools import grouped_slice
+from ...transaction import Transaction
 
 
 class Many2Many(Field):
@@ -238,6 +239,55 @@ class Many2Many(Field):
         value = [instance(x) for x in (value or [])]
         super(Many2Many, self).__set__(inst, value)
 
+    def convert_domain_tree(self, domain, tables):
+        pool = Pool()
+        Target = self.get_target()
+        Relation = pool.get(self.relation_name)
+        table, _ = tables[None]
+        name, operator, ids = domain
+
+        def child(table, expression, tree):
+            relation = Relation.__table__()
+            origin = getattr(Relation, self.origin).sql_column(relation)
+            target = getattr(Relation, self.target).sql_column(relation)
+            return table.join(relation, condition=origin == table.id
+                ).join(tree, condition=target == tree.id
+                ).select(table.id, where=expression)
+
+        def parent(table, expression, tree):
+            relation = Relation.__table__()
+            origin = getattr(Relation, self.origin).sql_column(relation)
+            target = getattr(Relation, self.target).sql_column(relation)
+            return table.join(relation, condition=target == table.id
+                ).join(tree, condition=origin == tree.id
+                ).select(table.id, where=expression)
+        expression = table.id.in_(recursive_query(Target, ids,
+                child if operator.endswith('child_of') else parent))
+        if operator.startswith('not'):
+            return ~expression
+        return expression
+
+    def convert_domain_parent(self, domain, tables):
+        Target = self.get_target()
+        table, _ = tables[None]
+        name, operator, ids = domain
+        ids = list(ids)  # Ensure it is a list for concatenation
+
+        def get_parent(ids):
+            if not ids:
+                return []
+            parents = Target.search([
+                    ('id', 'in', ids),
+                    ], order=[])
+            parent_ids = get_parent(list(set(
+                        t.id for p in parents for t in getattr(p, name))
+                    - set(ids)))
+            return ids + parent_ids
+        expression = table.id.in_(get_parent(ids))
+        if operator == 'not parent_of':
+            return ~expression
+        return expression
+
     def convert_domain_child(self, domain, tables):
         Target = self.get_target()
         table, _ = tables[None]
@@ -277,16 +327,18 @@ class Many2Many(Field):
 
         target = getattr(Relation, self.target).sql_column(relation)
         if '.' not in name:
-            if operator in ('child_of', 'not child_of'):
+            if operator in ('child_of', 'not child_of',
+                    'parent_of', 'not parent_of'):
                 if Target != Model:
-                    query = Target.search([(domain[3], 'child_of', value)],
+                    query = Target.search([(domain[3],
+                                operator.replace('not ', ''), value)],
                         order=[], query=True)
                     where = (target.in_(query) & (origin != None))
                     if origin_where:
                         where &= origin_where
                     query = relation.select(origin, where=where)
                     expression = table.id.in_(query)
-                    if operator == 'not child_of':
+                    if operator.startswith('not'):
                         return ~expression
                     return expression
                 if isinstance(value, basestring):
@@ -299,12 +351,19 @@ class Many2Many(Field):
                     ids = value
                 if not ids:
                     expression = table.id.in_([None])
-                    if operator == 'not child_of':
+                    if operator.startswith('not'):
                         return ~expression
                     return expression
-                else:
+                elif (Transaction().cursor.has_with_recursive()
+                        and origin_field._type != 'reference'):
+                    return self.convert_domain_tree(
+                        (name, operator, ids), tables)
+                elif operator.endswith('child_of'):
                     return self.convert_domain_child(
                         (name, operator, ids), tables)
+                else:
+                    return self.convert_domain_parent(
+                        (name, operator, ids), tables)
 
             if value is None:
                 where = origin != value
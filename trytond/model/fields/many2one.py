@@ -1,10 +1,10 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
 from types import NoneType
-from sql import Query, Expression
+from sql import Query, Expression, Column
 from sql.operators import Or
 
-from .field import Field, SQLType
+from .field import Field, SQLType, recursive_query
 from ...pool import Pool
 from ... import backend
 from ...tools import reduce_ids
@@ -105,9 +105,54 @@ class Many2One(Field):
         cursor.execute(*table.select(left, right, where=red_sql))
         where = Or()
         for l, r in cursor.fetchall():
-            where.append((left >= l) & (right <= r))
+            if operator.endswith('child_of'):
+                where.append((left >= l) & (right <= r))
+            else:
+                where.append((left <= l) & (right >= r))
         expression = table.id.in_(table.select(table.id, where=where))
-        if operator == 'not child_of':
+        if operator.startswith('not'):
+            return ~expression
+        return expression
+
+    def convert_domain_tree(self, domain, tables):
+        Target = self.get_target()
+        table, _ = tables[None]
+        name, operator, ids = domain
+
+        def child(table, expression, tree):
+            return table.join(tree,
+                condition=Column(table, name) == tree.id
+                ).select(table.id, where=expression)
+
+        def parent(table, expression, tree):
+            return table.join(tree,
+                condition=table.id == tree.id
+                ).select(Column(table, name),
+                where=expression & (Column(table, name) != None))
+        expression = table.id.in_(recursive_query(Target, ids,
+                child if operator.endswith('child_of') else parent))
+        if operator.startswith('not'):
+            return ~expression
+        return expression
+
+    def convert_domain_parent(self, domain, tables):
+        Target = self.get_target()
+        table, _ = tables[None]
+        name, operator, ids = domain
+        ids = list(ids)  # Ensure it is a list for concatenation
+
+        def get_parent(ids):
+            if not ids:
+                return []
+            parents = Target.search([
+                    ('id', 'in', ids),
+                    (name, '!=', None),
+                    ], order=[])
+            parent_ids = get_parent(list(set(
+                        getattr(p, name).id for p in parents) - set(ids)))
+            return ids + parent_ids
+        expression = table.id.in_(get_parent(ids))
+        if operator == 'not parent_of':
             return ~expression
         return expression
 
@@ -137,12 +182,14 @@ class Many2One(Field):
         name, operator, value = domain[:3]
         column = self.sql_column(table)
         if '.' not in name:
-            if operator in ('child_of', 'not child_of'):
+            if operator in ('child_of', 'not child_of',
+                    'parent_of', 'not parent_of'):
                 if Target != Model:
-                    query = Target.search([(domain[3], 'child_of', value)],
+                    query = Target.search([(domain[3],
+                                operator.replace('not ', ''), value)],
                         order=[], query=True)
                     expression = column.in_(query)
-                    if operator == 'not child_of':
+                    if operator.startswith('not'):
                         return ~expression
                     return expression
 
@@ -156,15 +203,21 @@ class Many2One(Field):
                     ids = value
                 if not ids:
                     expression = column.in_([None])
-                    if operator == 'not child_of':
+                    if operator.startswith('not'):
                         return ~expression
                     return expression
                 elif self.left and self.right:
                     return self.convert_domain_child_mptt(
                         (name, operator, ids), tables)
-                else:
+                elif Transaction().cursor.has_with_recursive():
+                    return self.convert_domain_tree(
+                        (name, operator, ids), tables)
+                elif operator.endswith('child_of'):
                     return self.convert_domain_child(
                         (name, operator, ids), tables)
+                else:
+                    return self.convert_domain_parent(
+                        (name, operator, ids), tables)
 
             if not isinstance(value, basestring):
                 return super(Many2One, self).convert_domain(domain, tables,
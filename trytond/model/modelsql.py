@@ -3,13 +3,16 @@
 import re
 import datetime
 from functools import reduce
-from itertools import islice, izip, chain, ifilter
+from collections import OrderedDict
+from itertools import islice, izip, chain, groupby
+from operator import itemgetter
 
-from sql import Table, Column, Literal, Desc, Asc, Expression, Flavor
-from sql.functions import Now, Extract
+from sql import Table, Column, Literal, Desc, Asc, Expression, Flavor, \
+    Query, FromItem, Cast, Join
+from sql.functions import Function, Now, Extract
 from sql.conditionals import Coalesce
-from sql.operators import Or, And, Operator
-from sql.aggregate import Count, Max
+from sql.operators import Or, And, Operator, Greater, Less
+from sql.aggregate import Count, Max, Min, Sum, Avg
 
 from trytond.model import ModelStorage, ModelView
 from trytond.model import fields
@@ -25,6 +28,69 @@ _RE_UNIQUE = re.compile('UNIQUE\s*\((.*)\)', re.I)
 _RE_CHECK = re.compile('CHECK\s*\((.*)\)', re.I)
 
 
+def convert_from(table, tables):
+    "Return the joins of the tables of search_domain"
+    right, condition = tables[None]
+    if table:
+        table = table.join(right, 'LEFT', condition)
+    else:
+        table = right
+    for k, sub_tables in tables.iteritems():
+        if k is None:
+            continue
+        # Don't nested joins as SQLite doesn't support
+        table = convert_from(table, sub_tables)
+    return table
+
+
+class _DateTrunc(Function):
+    __slots__ = ()
+    _function = 'DATE_TRUNC'
+
+
+class _Row(Expression):
+    "Row value of expressions and values"
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        super(_Row, self).__init__()
+        self.values = values
+
+    def __str__(self):
+        param = Flavor.get().param
+        return '(%s)' % ', '.join(str(v) if isinstance(v, Expression)
+            else param for v in self.values)
+
+    @property
+    def params(self):
+        params = []
+        for value in self.values:
+            if isinstance(value, Expression):
+                params.extend(value.params)
+            else:
+                params.append(value)
+        return tuple(params)
+
+
+class _Values(FromItem):
+    "VALUES list of rows to use as FROM item"
+    __slots__ = ('rows', 'columns_definitions')
+
+    def __init__(self, rows, columns):
+        super(_Values, self).__init__()
+        self.rows = rows
+        self.columns_definitions = ', '.join('"%s"' % c for c in columns)
+
+    def __str__(self):
+        param = Flavor.get().param
+        return '(VALUES %s)' % ', '.join(
+            '(%s)' % ', '.join([param] * len(row)) for row in self.rows)
+
+    @property
+    def params(self):
+        return tuple(chain.from_iterable(self.rows))
+
+
 class ModelSQL(ModelStorage):
     """
     Define a model with storage in database.
@@ -43,6 +109,7 @@ class ModelSQL(ModelStorage):
         if issubclass(cls, ModelView):
             cls.__rpc__.update({
                     'history_revisions': RPC(),
+                    'read_group': RPC(),
                     })
 
         if not cls._table:
@@ -294,6 +361,37 @@ class ModelSQL(ModelStorage):
                 cursor.execute(*history.insert(hcolumns,
                         [[id_, Now(), user] for id_ in sub_ids]))
 
+    @classmethod
+    def _history_last(cls, table, datetime, ids=None):
+        '''
+        Return the condition to keep from the history table the last row of
+        each id at the datetime
+        ids restricts the grouped sub-query to these ids.
+        '''
+        history = cls.__table_history__()
+        column = Coalesce(history.write_date, history.create_date)
+        if backend.name() == 'postgresql':
+            # The grouped sub-queries are computed once for all the rows
+            last = cls.__table_history__()
+            last_column = Coalesce(last.write_date, last.create_date)
+            where = last_column <= datetime
+            if ids is not None:
+                where &= reduce_ids(last.id, ids)
+            stamps = last.select(last.id, Max(last_column).as_('stamp'),
+                where=where, group_by=last.id)
+            return Column(table, '__id').in_(
+                history.join(stamps,
+                    condition=(history.id == stamps.id)
+                    & (column == stamps.stamp)
+                    ).select(Max(Column(history, '__id')),
+                    group_by=history.id))
+        # Use a correlated query as portable alternative
+        return Column(table, '__id') == history.select(
+            Column(history, '__id'),
+            where=(history.id == table.id) & (column <= datetime),
+            order_by=(column.desc, Column(history, '__id').desc),
+            limit=1)
+
     @classmethod
     def _restore_history(cls, ids, datetime, _before=False):
         if not cls._history:
@@ -406,8 +504,8 @@ class ModelSQL(ModelStorage):
 
         table = cls.__table__()
         modified_fields = set()
-        new_ids = []
         vlist = [v.copy() for v in vlist]
+        rows = []
         for values in vlist:
             # Clean values
             for key in ('create_uid', 'create_date',
@@ -428,38 +526,36 @@ class ModelSQL(ModelStorage):
                 defaults = cls.default_get(default, with_rec_name=False)
                 values.update(cls._clean_defaults(defaults))
 
-            insert_columns = [table.create_uid, table.create_date]
-            insert_values = [transaction.user, Now()]
-
-            # Insert record
-            for fname, value in values.iteritems():
-                field = cls._fields[fname]
-                if not hasattr(field, 'set'):
-                    insert_columns.append(Column(table, fname))
-                    insert_values.append(field.sql_format(value))
+            columns = tuple(sorted(fname for fname in values
+                    if not hasattr(cls._fields[fname], 'set')))
+            rows.append((columns, values))
 
-            try:
-                if cursor.has_returning():
-                    cursor.execute(*table.insert(insert_columns,
-                            [insert_values], [table.id]))
-                    id_new, = cursor.fetchone()
-                else:
-                    id_new = cursor.nextid(cls._table)
-                    if id_new:
-                        insert_columns.append(table.id)
-                        insert_values.append(id_new)
-                        cursor.execute(*table.insert(insert_columns,
-                                [insert_values]))
-                    else:
-                        cursor.execute(*table.insert(insert_columns,
-                                [insert_values]))
-                        id_new = cursor.lastid()
-                new_ids.append(id_new)
-            except DatabaseIntegrityError, exception:
-                with Transaction().new_cursor(), \
-                        Transaction().set_context(_check_access=False):
-                    cls.__raise_integrity_error(exception, values)
-                raise
+        # Insert records with the same columns by chunk of many rows
+        multirow = cursor.has_multirow_insert()
+        new_ids = []
+        for columns, group in groupby(rows, key=itemgetter(0)):
+            group = [values for _, values in group]
+            insert_columns = [table.create_uid, table.create_date]
+            insert_columns += [Column(table, fname) for fname in columns]
+            if multirow:
+                size = max(cursor.IN_MAX // len(insert_columns), 1)
+            else:
+                size = 1
+            for sub_vlist in grouped_slice(group, size):
+                sub_vlist = list(sub_vlist)
+                insert_values = [[transaction.user, Now()]
+                    + [cls._fields[fname].sql_format(values[fname])
+                        for fname in columns]
+                    for values in sub_vlist]
+                try:
+                    new_ids.extend(cls.__insert(table, insert_columns,
+                            insert_values))
+                except DatabaseIntegrityError, exception:
+                    with Transaction().new_cursor(), \
+                            Transaction().set_context(_check_access=False):
+                        for values in sub_vlist:
+                            cls.__raise_integrity_error(exception, values)
+                    raise
 
         domain = pool.get('ir.rule').domain_get(cls.__name__,
                 mode='create')
@@ -510,6 +606,26 @@ class ModelSQL(ModelStorage):
         cls.trigger_create(records)
         return records
 
+    @classmethod
+    def __insert(cls, table, columns, values):
+        "Insert the rows of values and return their ids"
+        cursor = Transaction().cursor
+        if cursor.has_returning():
+            cursor.execute(*table.insert(columns, values, [table.id]))
+            return [id_ for id_, in cursor.fetchall()]
+        elif len(values) > 1:
+            cursor.execute(*table.insert(columns, values))
+            last_id = cursor.lastid()
+            return range(last_id - len(values) + 1, last_id + 1)
+        id_new = cursor.nextid(cls._table)
+        if id_new:
+            cursor.execute(*table.insert(columns + [table.id],
+                    [values[0] + [id_new]]))
+        else:
+            cursor.execute(*table.insert(columns, values))
+            id_new = cursor.lastid()
+        return [id_new]
+
     @classmethod
     def read(cls, ids, fields_names=None):
         pool = Pool()
@@ -549,19 +665,11 @@ class ModelSQL(ModelStorage):
         table = cls.__table__()
         table_query = cls.table_query()
 
-        in_max = cursor.IN_MAX
-        history_order = None
-        history_clause = None
-        history_limit = None
-        if (cls._history
-                and Transaction().context.get('_datetime')
-                and not table_query):
-            in_max = 1
+        history = (cls._history
+            and Transaction().context.get('_datetime')
+            and not table_query)
+        if history:
             table = cls.__table_history__()
-            column = Coalesce(table.write_date, table.create_date)
-            history_clause = (column <= Transaction().context['_datetime'])
-            history_order = (column.desc, Column(table, '__id').desc)
-            history_limit = 1
 
         columns = []
         for f in fields_names + fields_related.keys() + datetime_fields:
@@ -577,25 +685,25 @@ class ModelSQL(ModelStorage):
             if 'id' not in fields_names:
                 columns.append(table.id.as_('id'))
 
-            for sub_ids in grouped_slice(ids, in_max):
+            for sub_ids in grouped_slice(ids):
                 sub_ids = list(sub_ids)
                 red_sql = reduce_ids(table.id, sub_ids)
                 where = red_sql
-                if history_clause:
+                if history:
+                    history_clause = cls._history_last(table,
+                        Transaction().context['_datetime'], sub_ids)
                     where &= history_clause
                 if domain:
                     where &= table.id.in_(domain)
-                cursor.execute(*table.select(*columns, where=where,
-                        order_by=history_order, limit=history_limit))
+                cursor.execute(*table.select(*columns, where=where))
                 dictfetchall = cursor.dictfetchall()
                 if not len(dictfetchall) == len({}.fromkeys(sub_ids)):
                     if domain:
                         where = red_sql
-                        if history_clause:
+                        if history:
                             where &= history_clause
                         where &= table.id.in_(domain)
-                        cursor.execute(*table.select(table.id, where=where,
-                                order_by=history_order, limit=history_limit))
+                        cursor.execute(*table.select(table.id, where=where))
                         rowcount = cursor.rowcount
                         if rowcount == -1 or rowcount is None:
                             rowcount = len(cursor.fetchall())
@@ -606,16 +714,17 @@ class ModelSQL(ModelStorage):
         else:
             result = [{'id': x} for x in ids]
 
-        for column in columns:
-            field = column.output_name
-            if field == '_timestamp':
-                continue
-            if (getattr(cls._fields[field], 'translate', False)
-                    and not hasattr(field, 'set')):
-                translations = Translation.get_ids(cls.__name__ + ',' + field,
-                    'model', Transaction().language, ids)
+        translated_fields = [c.output_name for c in columns
+            if c.output_name != '_timestamp'
+            and getattr(cls._fields[c.output_name], 'translate', False)]
+        if translated_fields:
+            translations = Translation.get_ids_multi(cls.__name__,
+                translated_fields, Transaction().language, ids)
+            for field in translated_fields:
+                field_translations = translations[field]
                 for row in result:
-                    row[field] = translations.get(row['id']) or row[field]
+                    row[field] = (field_translations.get(row['id'])
+                        or row[field])
 
         # all fields for which there is a get attribute
         getter_fields = [f for f in
@@ -629,12 +738,16 @@ class ModelSQL(ModelStorage):
                 func_fields.setdefault(key, [])
                 func_fields[key].append(fname)
             elif getattr(field, 'datetime_field', None):
+                datetime2rows = {}
                 for row in result:
-                    with Transaction().set_context(
-                            _datetime=row[field.datetime_field]):
-                        date_result = field.get([row['id']], cls, fname,
-                            values=[row])
-                    row[field] = date_result[row['id']]
+                    datetime2rows.setdefault(row[field.datetime_field],
+                        []).append(row)
+                for datetime_, rows in datetime2rows.iteritems():
+                    with Transaction().set_context(_datetime=datetime_):
+                        date_result = field.get([r['id'] for r in rows], cls,
+                            fname, values=rows)
+                    for row in rows:
+                        row[fname] = date_result[row['id']]
             else:
                 # get the value of that field for all records/ids
                 getter_result = field.get(ids, cls, fname, values=result)
@@ -646,19 +759,15 @@ class ModelSQL(ModelStorage):
             fname = field_list[0]
             field = cls._fields[fname]
             _, datetime_field = key
+            kwargs = {}
             if datetime_field:
+                kwargs['datetimes'] = dict((r['id'], r[datetime_field])
+                    for r in result)
+            getter_results = field.get(ids, cls, field_list, values=result,
+                **kwargs)
+            for fname, getter_result in getter_results.iteritems():
                 for row in result:
-                    with Transaction().set_context(
-                            _datetime=row[datetime_field]):
-                        date_results = field.get([row['id']], cls, field_list,
-                            values=[row])
-                    for fname, date_result in date_results.iteritems():
-                        row[fname] = date_result[row['id']]
-            else:
-                getter_results = field.get(ids, cls, field_list, values=result)
-                for fname, getter_result in getter_results.iteritems():
-                    for row in result:
-                        row[fname] = getter_result[row['id']]
+                    row[fname] = getter_result[row['id']]
 
         to_del = set()
         fields_related2values = {}
@@ -669,79 +778,68 @@ class ModelSQL(ModelStorage):
                 continue
             if fname not in fields_related:
                 continue
-            fields_related2values.setdefault(fname, {})
             field = cls._fields[fname]
-            if field._type in ('many2one', 'one2one'):
-                if hasattr(field, 'model_name'):
-                    Target = pool.get(field.model_name)
-                else:
-                    Target = field.get_target()
+            # Read the targets grouped by model and datetime
+            targets = {}
+            for row in result:
+                key = cls.__related_key(field, row)
+                if key is None:
+                    continue
+                model_name, datetime_, target_id = key
+                targets.setdefault((model_name, datetime_), set()).add(
+                    target_id)
+            values = fields_related2values[fname] = {}
+            for (model_name, datetime_), target_ids in targets.iteritems():
+                Target = pool.get(model_name)
+                context = {}
                 if getattr(field, 'datetime_field', None):
-                    for row in result:
-                        if row[fname] is None:
-                            continue
-                        with Transaction().set_context(
-                                _datetime=row[field.datetime_field]):
-                            date_target, = Target.read([row[fname]],
-                                fields_related[fname])
-                        target_id = date_target.pop('id')
-                        fields_related2values[fname].setdefault(target_id, {})
-                        fields_related2values[
-                            fname][target_id][row['id']] = date_target
-                else:
-                    for target in Target.read(
-                            [r[fname] for r in result if r[fname]],
+                    context['_datetime'] = datetime_
+                with Transaction().set_context(context):
+                    for target in Target.read(list(target_ids),
                             fields_related[fname]):
-                        target_id = target.pop('id')
-                        fields_related2values[fname].setdefault(target_id, {})
-                        for row in result:
-                            fields_related2values[
-                                fname][target_id][row['id']] = target
-            elif field._type == 'reference':
-                for row in result:
-                    if not row[fname]:
-                        continue
-                    model_name, record_id = row[fname].split(',', 1)
-                    if not model_name:
-                        continue
-                    record_id = int(record_id)
-                    if record_id < 0:
-                        continue
-                    Target = pool.get(model_name)
-                    target, = Target.read([record_id], fields_related[fname])
-                    del target['id']
-                    fields_related2values[fname][row[fname]] = target
+                        values[(model_name, datetime_, target['id'])] = target
 
         if to_del or fields_related or datetime_fields:
             for row in result:
                 for fname in fields_related:
                     if fname not in cls._fields:
                         continue
-                    field = cls._fields[fname]
+                    key = cls.__related_key(cls._fields[fname], row)
+                    target = fields_related2values[fname].get(key, {})
                     for related in fields_related[fname]:
-                        related_name = '%s.%s' % (fname, related)
-                        value = None
-                        if row[fname]:
-                            if field._type in ('many2one', 'one2one'):
-                                value = fields_related2values[fname][
-                                    row[fname]][row['id']][related]
-                            elif field._type == 'reference':
-                                model_name, record_id = row[fname
-                                    ].split(',', 1)
-                                if model_name:
-                                    record_id = int(record_id)
-                                    if record_id >= 0:
-                                        value = fields_related2values[fname][
-                                            row[fname]][related]
-                        row[related_name] = value
+                        row['%s.%s' % (fname, related)] = target.get(related)
                 for field in to_del:
                     del row[field]
 
         return result
 
+    @classmethod
+    def __related_key(cls, field, row):
+        "Return the (model, datetime, id) of the target of field in row"
+        value = row[field.name]
+        if not value:
+            return None
+        if field._type in ('many2one', 'one2one'):
+            if hasattr(field, 'model_name'):
+                model_name = field.model_name
+            else:
+                model_name = field.get_target().__name__
+            datetime_ = None
+            if getattr(field, 'datetime_field', None):
+                datetime_ = row[field.datetime_field]
+            return model_name, datetime_, value
+        elif field._type == 'reference':
+            model_name, record_id = value.split(',', 1)
+            if not model_name:
+                return None
+            record_id = int(record_id)
+            if record_id < 0:
+                return None
+            return model_name, None, record_id
+        return None
+
     @classmethod
     def write(cls, records, values, *args):
-        DatabaseIntegrityError = backend.get('DatabaseIntegrityError')
         transaction = Transaction()
         cursor = transaction.cursor
         pool = Pool()
@@ -764,6 +862,39 @@ class ModelSQL(ModelStorage):
 
         cls.__check_timestamp(all_ids)
 
+        domain = pool.get('ir.rule').domain_get(cls.__name__, mode='write')
+        for sub_ids in grouped_slice(list(set(all_ids))):
+            sub_ids = list(sub_ids)
+            red_sql = reduce_ids(table.id, sub_ids)
+            where = red_sql
+            if domain:
+                where &= table.id.in_(domain)
+            cursor.execute(*table.select(table.id, where=where))
+            rowcount = cursor.rowcount
+            if rowcount == -1 or rowcount is None:
+                rowcount = len(cursor.fetchall())
+            if not rowcount == len(sub_ids):
+                if domain:
+                    cursor.execute(*table.select(table.id, where=red_sql))
+                    rowcount = cursor.rowcount
+                    if rowcount == -1 or rowcount is None:
+                        rowcount = len(cursor.fetchall())
+                    if rowcount == len(sub_ids):
+                        cls.raise_user_error('access_error', cls.__name__)
+                cls.raise_user_error('write_error', cls.__name__)
+
+        # The updates on the same columns are grouped and they are flushed
+        # before updating twice the same record
+        pending = OrderedDict()
+        pending_ids = set()
+
+        def flush():
+            for columns, updates in pending.iteritems():
+                cls.__update(table, columns, updates)
+            pending.clear()
+            pending_ids.clear()
+
+        store_translation = Transaction().language == Config.get_language()
         fields_to_set = {}
         actions = iter((records, values) + args)
         for records, values in zip(actions, actions):
@@ -776,46 +907,31 @@ class ModelSQL(ModelStorage):
                 if key in values:
                     del values[key]
 
-            columns = [table.write_uid, table.write_date]
-            update_values = [transaction.user, Now()]
-            store_translation = Transaction().language == Config.get_language()
-            for fname, value in values.iteritems():
+            columns = []
+            update_values = []
+            tree = False
+            for fname in sorted(values):
                 field = cls._fields[fname]
                 if not hasattr(field, 'set'):
                     if (not getattr(field, 'translate', False)
                             or store_translation):
-                        columns.append(Column(table, fname))
-                        update_values.append(field.sql_format(value))
-
-            domain = pool.get('ir.rule').domain_get(cls.__name__, mode='write')
-            for sub_ids in grouped_slice(ids):
-                sub_ids = list(sub_ids)
-                red_sql = reduce_ids(table.id, sub_ids)
-                where = red_sql
-                if domain:
-                    where &= table.id.in_(domain)
-                cursor.execute(*table.select(table.id, where=where))
-                rowcount = cursor.rowcount
-                if rowcount == -1 or rowcount is None:
-                    rowcount = len(cursor.fetchall())
-                if not rowcount == len({}.fromkeys(sub_ids)):
-                    if domain:
-                        cursor.execute(*table.select(table.id, where=red_sql))
-                        rowcount = cursor.rowcount
-                        if rowcount == -1 or rowcount is None:
-                            rowcount = len(cursor.fetchall())
-                        if rowcount == len({}.fromkeys(sub_ids)):
-                            cls.raise_user_error('access_error', cls.__name__)
-                    cls.raise_user_error('write_error', cls.__name__)
-                try:
-                    cursor.execute(*table.update(columns, update_values,
-                            where=red_sql))
-                except DatabaseIntegrityError, exception:
-                    with Transaction().new_cursor(), \
-                            Transaction().set_context(_check_access=False):
-                        cls.__raise_integrity_error(exception, values,
-                            values.keys())
-                    raise
+                        columns.append(fname)
+                        update_values.append(field.sql_format(values[fname]))
+                if (isinstance(field, fields.Many2One)
+                        and field.model_name == cls.__name__
+                        and field.left and field.right):
+                    tree = True
+            columns = tuple(columns)
+            update = (ids, update_values, values)
+
+            if (tree or pending_ids.intersection(ids)
+                    or any(isinstance(v, (Expression, Query))
+                        for v in update_values)):
+                flush()
+                cls.__update(table, columns, [update])
+            else:
+                pending.setdefault(columns, []).append(update)
+                pending_ids.update(ids)
 
             for fname, value in values.iteritems():
                 field = cls._fields[fname]
@@ -828,8 +944,11 @@ class ModelSQL(ModelStorage):
                     fields_to_set.setdefault(fname, []).extend((ids, value))
 
             field_names = values.keys()
-            cls._update_mptt(field_names, [ids] * len(field_names), values)
+            if tree:
+                cls._update_mptt(field_names, [ids] * len(field_names),
+                    values)
             all_field_names |= set(field_names)
+        flush()
 
         for fname, fargs in fields_to_set.iteritems():
             field = cls._fields[fname]
@@ -840,6 +959,57 @@ class ModelSQL(ModelStorage):
             cls._validate(sub_records, field_names=all_field_names)
         cls.trigger_write(trigger_eligibles)
 
+    @classmethod
+    def __update(cls, table, columns, updates):
+        """Update the columns with the values of the updates
+
+        updates is a list of (ids, values, raw values) and when there are
+        many, they are updated by id with one query per chunk if the database
+        supports UPDATE FROM VALUES otherwise with executemany.
+        """
+        DatabaseIntegrityError = backend.get('DatabaseIntegrityError')
+        transaction = Transaction()
+        cursor = transaction.cursor
+        set_columns = [table.write_uid, table.write_date]
+        set_columns += [Column(table, fname) for fname in columns]
+        try:
+            if len(updates) == 1 or not columns:
+                update_values = updates[0][1]
+                ids = list(chain.from_iterable(u[0] for u in updates))
+                for sub_ids in grouped_slice(ids):
+                    cursor.execute(*table.update(set_columns,
+                            [transaction.user, Now()] + update_values,
+                            where=reduce_ids(table.id, sub_ids)))
+                return
+            rows = [[id_] + row_values
+                for row_ids, row_values, _ in updates
+                for id_ in row_ids]
+            if cursor.has_update_from_values():
+                size = max(cursor.IN_MAX // len(rows[0]), 1)
+                for sub_rows in grouped_slice(rows, size):
+                    values = _Values(list(sub_rows), ('id',) + columns)
+                    cursor.execute(*table.update(set_columns,
+                            [transaction.user, Now()]
+                            + [Cast(Column(values, fname),
+                                    cls._fields[fname].sql_type().base)
+                                for fname in columns],
+                            from_=[values],
+                            where=table.id == values.id))
+            else:
+                queries = [table.update(set_columns,
+                        [transaction.user, Now()] + row[1:],
+                        where=table.id == row[0])
+                    for row in rows]
+                cursor.executemany(str(queries[0]),
+                    [q.params for q in queries])
+        except DatabaseIntegrityError, exception:
+            with Transaction().new_cursor(), \
+                    Transaction().set_context(_check_access=False):
+                for _, _, values in updates:
+                    cls.__raise_integrity_error(exception, values,
+                        values.keys())
+            raise
+
     @classmethod
     def delete(cls, records):
         DatabaseIntegrityError = backend.get('DatabaseIntegrityError')
@@ -875,26 +1045,23 @@ class ModelSQL(ModelStorage):
                     cursor.execute(*table.select(table.id, where=where))
                     tree_ids[fname] += [x[0] for x in cursor.fetchall()]
 
-        foreign_keys_tocheck = []
-        foreign_keys_toupdate = []
-        foreign_keys_todelete = []
-        for _, model in pool.iterobject():
+        # Group the foreign keys by model to run one query per model
+        foreign_keys_tocheck = OrderedDict()
+        foreign_keys_toupdate = OrderedDict()
+        foreign_keys_todelete = OrderedDict()
+        for model, field_name in pool.references(cls.__name__):
             if hasattr(model, 'table_query') and model.table_query():
                 continue
             if not issubclass(model, ModelStorage):
                 continue
-            for field_name, field in model._fields.iteritems():
-                if (isinstance(field, fields.Many2One)
-                        and field.model_name == cls.__name__):
-                    if field.ondelete == 'CASCADE':
-                        foreign_keys_todelete.append((model, field_name))
-                    elif field.ondelete == 'SET NULL':
-                        if field.required:
-                            foreign_keys_tocheck.append((model, field_name))
-                        else:
-                            foreign_keys_toupdate.append((model, field_name))
-                    else:
-                        foreign_keys_tocheck.append((model, field_name))
+            field = model._fields[field_name]
+            if field.ondelete == 'CASCADE':
+                foreign_keys = foreign_keys_todelete
+            elif field.ondelete == 'SET NULL' and not field.required:
+                foreign_keys = foreign_keys_toupdate
+            else:
+                foreign_keys = foreign_keys_tocheck
+            foreign_keys.setdefault(model, []).append(field_name)
 
         transaction.delete.setdefault(cls.__name__, set()).update(ids)
 
@@ -917,44 +1084,60 @@ class ModelSQL(ModelStorage):
         for sub_ids, sub_records in izip(
                 grouped_slice(ids), grouped_slice(records)):
             sub_ids = list(sub_ids)
+            sub_ids_set = set(sub_ids)
             red_sql = reduce_ids(table.id, sub_ids)
 
             transaction.delete_records.setdefault(cls.__name__,
                 set()).update(sub_ids)
 
-            for Model, field_name in foreign_keys_toupdate:
+            for Model, field_names in foreign_keys_toupdate.iteritems():
                 if (not hasattr(Model, 'search')
                         or not hasattr(Model, 'write')):
                     continue
                 foreign_table = Model.__table__()
-                foreign_red_sql = reduce_ids(
-                    Column(foreign_table, field_name), sub_ids)
-                cursor.execute(*foreign_table.select(foreign_table.id,
-                        where=foreign_red_sql))
-                models = Model.browse([x[0] for x in cursor.fetchall()])
-                if models:
-                    Model.write(models, {
-                            field_name: None,
-                            })
-
-            for Model, field_name in foreign_keys_todelete:
+                foreign_columns = [Column(foreign_table, f)
+                    for f in field_names]
+                cursor.execute(*foreign_table.select(
+                        foreign_table.id, *foreign_columns,
+                        where=Or([reduce_ids(c, sub_ids)
+                                for c in foreign_columns])))
+                to_write = {}
+                for row in cursor.fetchall():
+                    for field_name, value in izip(field_names, row[1:]):
+                        if value in sub_ids_set:
+                            to_write.setdefault(field_name, []).append(
+                                row[0])
+                args = []
+                for field_name, model_ids in to_write.iteritems():
+                    args.extend((Model.browse(model_ids), {
+                                field_name: None,
+                                }))
+                if args:
+                    Model.write(*args)
+
+            for Model, field_names in foreign_keys_todelete.iteritems():
                 if (not hasattr(Model, 'search')
                         or not hasattr(Model, 'delete')):
                     continue
                 foreign_table = Model.__table__()
-                foreign_red_sql = reduce_ids(
-                    Column(foreign_table, field_name), sub_ids)
                 cursor.execute(*foreign_table.select(foreign_table.id,
-                        where=foreign_red_sql))
+                        where=Or([reduce_ids(Column(foreign_table, f),
+                                    sub_ids) for f in field_names])))
                 models = Model.browse([x[0] for x in cursor.fetchall()])
                 if models:
                     Model.delete(models)
 
-            for Model, field_name in foreign_keys_tocheck:
+            for Model, field_names in foreign_keys_tocheck.iteritems():
                 with Transaction().set_context(_check_access=False):
-                    if Model.search([
-                                (field_name, 'in', sub_ids),
-                                ], order=[]):
+                    models = Model.search(['OR'] + [
+                            (f, 'in', sub_ids) for f in field_names],
+                        order=[], limit=1)
+                    if models:
+                        model, = models
+                        field_name = next((f for f in field_names
+                                if getattr(model, f)
+                                and getattr(model, f).id in sub_ids),
+                            field_names[0])
                         error_args = Model._get_error_args(field_name)
                         cls.raise_user_error('foreign_model_exist',
                             error_args=error_args)
@@ -1000,19 +1183,6 @@ class ModelSQL(ModelStorage):
             order_by.extend((Order(o) for o in forder))
 
         main_table, _ = tables[None]
-
-        def convert_from(table, tables):
-            right, condition = tables[None]
-            if table:
-                table = table.join(right, 'LEFT', condition)
-            else:
-                table = right
-            for k, sub_tables in tables.iteritems():
-                if k is None:
-                    continue
-                table = convert_from(table, sub_tables)
-            return table
-        # Don't nested joins as SQLite doesn't support
         table = convert_from(None, tables)
 
         # construct a clause for the rules :
@@ -1026,12 +1196,6 @@ class ModelSQL(ModelStorage):
             return cursor.fetchone()[0]
         # execute the "main" query to fetch the ids we were searching for
         columns = [main_table.id.as_('id')]
-        if (cls._history and transaction.context.get('_datetime')
-                and not query):
-            columns.append(Coalesce(
-                    main_table.write_date,
-                    main_table.create_date).as_('_datetime'))
-            columns.append(Column(main_table, '__id'))
         if not query:
             columns += [Column(main_table, name).as_(name)
                 for name, field in cls._fields.iteritems()
@@ -1048,61 +1212,25 @@ class ModelSQL(ModelStorage):
             where=expression, order_by=order_by, limit=limit, offset=offset)
         if query:
             return select
-        cursor.execute(*select)
 
-        rows = cursor.dictfetchmany(cursor.IN_MAX)
+        rows = cursor.iterate(*select)
         cache = cursor.get_cache()
         if cls.__name__ not in cache:
             cache[cls.__name__] = LRUDict(RECORD_CACHE_SIZE)
         delete_records = transaction.delete_records.setdefault(cls.__name__,
             set())
 
-        def filter_history(rows):
-            if not (cls._history and transaction.context.get('_datetime')):
-                return rows
-
-            def history_key(row):
-                return row['_datetime'], row['__id']
-
-            ids_history = {}
-            for row in rows:
-                key = history_key(row)
-                if row['id'] in ids_history:
-                    if key < ids_history[row['id']]:
-                        continue
-                ids_history[row['id']] = key
-
-            to_delete = set()
-            history = cls.__table_history__()
-            for sub_ids in grouped_slice([r['id'] for r in rows]):
-                where = reduce_ids(history.id, sub_ids)
-                cursor.execute(*history.select(history.id, history.write_date,
-                        where=where
-                        & (history.write_date != None)
-                        & (history.create_date == None)
-                        & (history.write_date
-                            <= transaction.context['_datetime'])))
-                for deleted_id, delete_date in cursor.fetchall():
-                    history_date, _ = ids_history[deleted_id]
-                    if isinstance(history_date, basestring):
-                        strptime = datetime.datetime.strptime
-                        format_ = '%Y-%m-%d %H:%M:%S.%f'
-                        history_date = strptime(history_date, format_)
-                    if history_date <= delete_date:
-                        to_delete.add(deleted_id)
-
-            return ifilter(lambda r: history_key(r) == ids_history[r['id']]
-                and r['id'] not in to_delete, rows)
-
-        rows = list(filter_history(rows))
+        ids = []
         keys = None
-        for data in islice(rows, 0, cache.size_limit):
-            if data['id'] in delete_records:
+        for data in rows:
+            ids.append(data['id'])
+            if (len(ids) > cache.size_limit
+                    or data['id'] in delete_records):
                 continue
             if keys is None:
                 keys = data.keys()
                 for k in keys[:]:
-                    if k in ('_timestamp', '_datetime', '__id'):
+                    if k == '_timestamp':
                         keys.remove(k)
                         continue
                     field = cls._fields[k]
@@ -1113,19 +1241,173 @@ class ModelSQL(ModelStorage):
                 del data[k]
             cache[cls.__name__].setdefault(data['id'], {}).update(data)
 
-        if len(rows) >= cursor.IN_MAX:
-            if (cls._history
-                    and Transaction().context.get('_datetime')
-                    and not query):
-                columns = columns[:2]
+        return cls.browse(ids)
+
+    @classmethod
+    def search_iter(cls, domain, order=None, size=None):
+        transaction = Transaction()
+        cursor = transaction.cursor
+        if cls._history and transaction.context.get('_datetime'):
+            for record in super(ModelSQL, cls).search_iter(domain,
+                    order=order, size=size):
+                yield record
+            return
+        size = size or cursor.IN_MAX
+        ids = (r['id'] for r in cursor.iterate(
+                *cls.search(domain, order=order, query=True), size=size))
+        while True:
+            sub_ids = list(islice(ids, size))
+            if not sub_ids:
+                break
+            for record in cls.browse(sub_ids):
+                yield record
+
+    @classmethod
+    def search_seek(cls, domain, after=None, limit=None, order=None):
+        transaction = Transaction()
+        cursor = transaction.cursor
+        key_order = cls._seek_order(order)
+        after = cls._seek_after(key_order, after)
+        # A row value comparison can use an index on the order columns
+        # but it is only equivalent for one direction and no NULL
+        if (not after
+                or not cursor.has_row_value()
+                or len(set(o for _, o in key_order)) != 1
+                or any(v is None for v in after)
+                or not all(f == 'id' or (cls._fields[f].required
+                        and not getattr(cls._fields[f], 'translate', False))
+                    for f, _ in key_order)
+                or (cls._history and transaction.context.get('_datetime'))):
+            return super(ModelSQL, cls).search_seek(domain, after=after,
+                limit=limit, order=order)
+
+        query = cls.search(domain, limit=limit, order=key_order, query=True)
+        table = query.from_[0]
+        while isinstance(table, Join):
+            table = table.left
+        columns, values = [], []
+        for (fname, _), value in izip(key_order, after):
+            field = cls._fields[fname]
+            columns.append(field.sql_column(table))
+            values.append(field.sql_format(value))
+        Operator = Less if key_order[0][1] == 'DESC' else Greater
+        query.where &= Operator(_Row(columns), _Row(values))
+        cursor.execute(*query)
+        records = cls.browse([i for i, in cursor.fetchall()])
+        return records, cls._seek_key(key_order, records)
+
+    @classmethod
+    def read_group(cls, domain, group_by, aggregates, order=None,
+            limit=None):
+        '''
+        Return a list of dictionaries with the values of group_by and
+        aggregates for each group of the records that match the domain.
+        group_by is a list of field names which could be suffixed by
+        ":year", ":month" or ":day" to truncate dates.
+        aggregates is a list of "field:function" with function among sum,
+        count, min, max and avg.
+        order is a list of (name of group_by or aggregates, direction).
+        '''
+        pool = Pool()
+        Rule = pool.get('ir.rule')
+        ModelAccess = pool.get('ir.model.access')
+        ModelFieldAccess = pool.get('ir.model.field.access')
+        cursor = Transaction().cursor
+        functions = {
+            'sum': Sum,
+            'count': Count,
+            'min': Min,
+            'max': Max,
+            'avg': Avg,
+            }
+
+        def parse(name, options):
+            fname, _, option = name.partition(':')
+            field = cls._fields.get(fname)
+            if (field is None or hasattr(field, 'get')
+                    or getattr(field, 'translate', False)
+                    or option not in options):
+                raise ValueError('Can not group on "%s"' % name)
+            return fname, field, option
+
+        group_by, aggregates = list(group_by), list(aggregates)
+        parsed = dict((n, parse(n, ('', 'year', 'month', 'day')))
+            for n in group_by)
+        parsed.update((n, parse(n, functions)) for n in aggregates)
+        for fname, field, option in parsed.itervalues():
+            if option in ('year', 'month', 'day') and field._type not in (
+                    'date', 'datetime', 'timestamp'):
+                raise ValueError('Can not truncate "%s"' % fname)
+
+        ModelAccess.check(cls.__name__, 'read')
+        ModelFieldAccess.check(cls.__name__,
+            list(set(f for f, _, _ in parsed.itervalues())), 'read')
+
+        # Group on the current records
+        with Transaction().set_context(_datetime=None):
+            tables, expression = cls.search_domain(domain)
+        main_table, _ = tables[None]
+
+        expressions = {}
+        for name in group_by:
+            fname, _, unit = parsed[name]
+            column = Column(main_table, fname)
+            if unit:
+                column = _DateTrunc(unit, column)
+            expressions[name] = column
+        for name in aggregates:
+            fname, _, function = parsed[name]
+            expressions[name] = functions[function](Column(main_table, fname))
+        group_columns = [expressions[n] for n in group_by]
+
+        order_by = []
+        order_types = {
+            'DESC': Desc,
+            'ASC': Asc,
+            }
+        if order is None:
+            order = [(n, 'ASC') for n in group_by]
+        for name, otype in order:
+            if name not in expressions:
+                raise ValueError('Can not order on "%s"' % name)
+            Order = order_types[otype.upper()]
+            fname, field, option = parsed[name]
+            if name in aggregates or option:
+                order_by.append(Order(expressions[name]))
             else:
-                columns = columns[:1]
-            cursor.execute(*table.select(*columns,
-                    where=expression, order_by=order_by,
-                    limit=limit, offset=offset))
-            rows = filter_history(cursor.dictfetchall())
+                forder = field.convert_order(fname, tables, cls)
+                order_by.extend(Order(o) for o in forder)
+                # The order depends only on the group
+                group_columns.extend(forder)
+
+        table = convert_from(None, tables)
+        domain = Rule.domain_get(cls.__name__, mode='read')
+        if domain:
+            expression &= main_table.id.in_(domain)
 
-        return cls.browse([x['id'] for x in rows])
+        names = group_by + aggregates
+        cursor.execute(*table.select(*[expressions[n] for n in names],
+                where=expression, group_by=group_columns,
+                order_by=order_by, limit=limit))
+        result = []
+        for row in cursor.fetchall():
+            values = dict(izip(names, row))
+            for name in group_by:
+                _, field, unit = parsed[name]
+                value = values[name]
+                if value is None:
+                    continue
+                if field._type == 'boolean':
+                    values[name] = bool(value)
+                elif unit:
+                    if isinstance(value, basestring):
+                        value = datetime.datetime.strptime(value,
+                            '%Y-%m-%d %H:%M:%S')
+                    if field._type == 'date':
+                        value = value.date()
+                    values[name] = value
+            result.append(values)
+        return result
 
     @classmethod
     def search_domain(cls, domain, active_test=True):
@@ -1168,8 +1450,10 @@ class ModelSQL(ModelStorage):
 
         if cls._history and transaction.context.get('_datetime'):
             table, _ = tables[None]
-            expression &= (Coalesce(table.write_date, table.create_date)
-                <= transaction.context['_datetime'])
+            # The deleted records have no create_date
+            expression &= (cls._history_last(table,
+                    transaction.context['_datetime'])
+                & (table.create_date != None))
         return tables, expression
 
     @classmethod
@@ -1190,9 +1474,8 @@ class ModelSQL(ModelStorage):
                     cursor.execute(*cls.__table__().select(Count(Literal(1))))
                     count, = cursor.fetchone()
                 if len(ids) < count / 4:
-                    for id_ in ids:
-                        cls._update_tree(id_, field_name,
-                            field.left, field.right)
+                    cls._update_trees(ids, field_name,
+                        field.left, field.right)
                 else:
                     cls._rebuild_tree(field_name, None, 0)
 
@@ -1200,26 +1483,127 @@ class ModelSQL(ModelStorage):
     def _rebuild_tree(cls, parent, parent_id, left):
         '''
         Rebuild left, right value for the tree.
+        The tree is loaded once, numbered in memory and only the changed
+        values are written.
         '''
         cursor = Transaction().cursor
         table = cls.__table__()
+        field = cls._fields[parent]
+        left_column = Column(table, field.left)
+        right_column = Column(table, field.right)
+
+        cursor.execute(*table.select(table.id, Column(table, parent),
+                left_column, right_column, order_by=table.id.asc))
+        childs = {}
+        positions = {}
+        for id_, node_parent, node_left, node_right in cursor.fetchall():
+            childs.setdefault(node_parent, []).append(id_)
+            positions[id_] = (node_left, node_right)
+
+        rows = []
         right = left + 1
+        stack = [(parent_id, left, iter(childs.get(parent_id, [])))]
+        while stack:
+            node_id, node_left, node_childs = stack[-1]
+            child_id = next(node_childs, None)
+            if child_id is not None:
+                stack.append(
+                    (child_id, right, iter(childs.get(child_id, []))))
+                right += 1
+                continue
+            stack.pop()
+            if (node_id and node_id in positions
+                    and positions[node_id] != (node_left, right)):
+                rows.append([node_id, node_left, right])
+            right += 1
+
+        if rows and cursor.has_update_from_values():
+            for sub_rows in grouped_slice(rows, cursor.IN_MAX // 3):
+                values = _Values(list(sub_rows), ('id', 'left', 'right'))
+                cursor.execute(*table.update([left_column, right_column],
+                        [Column(values, 'left'), Column(values, 'right')],
+                        from_=[values],
+                        where=table.id == values.id))
+        elif rows:
+            queries = [table.update([left_column, right_column],
+                    [l, r], where=table.id == i)
+                for i, l, r in rows]
+            cursor.executemany(str(queries[0]), [q.params for q in queries])
+        return right
 
-        cursor.execute(*table.select(table.id,
-                where=Column(table, parent) == parent_id))
-        childs = cursor.fetchall()
-
-        for child_id, in childs:
-            right = cls._rebuild_tree(parent, child_id, right)
+    @classmethod
+    def _update_trees(cls, record_ids, field_name, left, right):
+        '''
+        Update left, right values for the tree of many records.
+        The records moved under the same parent share a single gap.
+        '''
+        cursor = Transaction().cursor
+        table = cls.__table__()
+        left = Column(table, left)
+        right = Column(table, right)
+        field = Column(table, field_name)
 
-        field = cls._fields[parent]
+        record_parents = {}
+        for sub_ids in grouped_slice(record_ids):
+            cursor.execute(*table.select(table.id, field,
+                    where=reduce_ids(table.id, sub_ids)))
+            record_parents.update(cursor.fetchall())
+        parents = OrderedDict()
+        for record_id in record_ids:
+            if record_id in record_parents:
+                ids = parents.setdefault(record_parents.pop(record_id), [])
+                ids.append(record_id)
+
+        for parent_id, ids in parents.iteritems():
+            positions = {}
+            for sub_ids in grouped_slice(ids):
+                cursor.execute(*table.select(table.id, left, right,
+                        where=reduce_ids(table.id, sub_ids)))
+                positions.update((i, (l, r)) for i, l, r in cursor.fetchall())
+            if parent_id:
+                cursor.execute(*table.select(left, right,
+                        where=table.id == parent_id))
+                parent_left, parent_right = cursor.fetchone()
+            else:
+                cursor.execute(*table.select(Max(right), where=field == None))
+                parent_left, = cursor.fetchone()
+                parent_right = (parent_left or 0) + 1
+
+            # Fallback for subtrees nested in an other or containing parent
+            moved = sorted(p for p in positions.itervalues() if p != (0, 0))
+            if (len(ids) == 1
+                    or any(l2 < r1
+                        for (_, r1), (l2, _) in izip(moved, moved[1:]))
+                    or (parent_id and any(l <= parent_left <= r
+                            for l, r in moved))):
+                for record_id in ids:
+                    cls._update_tree(record_id, field_name,
+                        left.name, right.name)
+                continue
 
-        if parent_id:
-            cursor.execute(*table.update(
-                    [Column(table, field.left), Column(table, field.right)],
-                    [left, right],
-                    where=table.id == parent_id))
-        return right + 1
+            size = sum(r - l + 1 if (l, r) != (0, 0) else 2
+                for l, r in positions.itervalues())
+            cursor.execute(*table.update([left], [left + size],
+                    where=left >= parent_right))
+            cursor.execute(*table.update([right], [right + size],
+                    where=right >= parent_right))
+            offset = parent_right
+            for record_id in ids:
+                old_left, old_right = positions[record_id]
+                if old_left == old_right == 0:
+                    cursor.execute(*table.update([left, right],
+                            [offset, offset + 1],
+                            where=table.id == record_id))
+                    offset += 2
+                    continue
+                if old_left >= parent_right:
+                    old_left += size
+                    old_right += size
+                delta = offset - old_left
+                cursor.execute(*table.update([left, right],
+                        [left + delta, right + delta],
+                        where=(left >= old_left) & (right <= old_right)))
+                offset += old_right - old_left + 1
 
     @classmethod
     def _update_tree(cls, record_id, field_name, left, right):
@@ -9,6 +9,10 @@ try:
     import cStringIO as StringIO
 except ImportError:
     import StringIO
+try:
+    import simplejson as json
+except ImportError:
+    import json
 
 from decimal import Decimal
 from itertools import islice, ifilter, chain, izip
@@ -18,7 +22,7 @@ from collections import defaultdict
 
 from trytond.model import Model
 from trytond.model import fields
-from trytond.tools import reduce_domain, memoize
+from trytond.tools import reduce_domain, memoize, grouped_slice
 from trytond.pyson import PYSONEncoder, PYSONDecoder, PYSON
 from trytond.const import OPERATORS, RECORD_CACHE_SIZE, BROWSE_FIELD_TRESHOLD
 from trytond.transaction import Transaction
@@ -26,6 +30,7 @@ from trytond.pool import Pool
 from trytond.cache import LRUDict, freeze
 from trytond import backend
 from trytond.rpc import RPC
+from trytond.tools.json_ import JSONDecoder, JSONEncoder
 from .modelview import ModelView
 from .descriptors import dualmethod
 
@@ -59,6 +64,8 @@ class ModelStorage(Model):
                         result=lambda r: map(int, r)),
                     'search': RPC(result=lambda r: map(int, r)),
                     'search_count': RPC(),
+                    'search_seek': RPC(
+                        result=lambda r: (map(int, r[0]), r[1])),
                     'search_read': RPC(),
                     'export_data': RPC(instantiate=0),
                     'import_data': RPC(readonly=False),
@@ -103,8 +110,9 @@ class ModelStorage(Model):
             return
         for trigger in triggers:
             triggers = []
-            for record in records:
-                if Trigger.eval(trigger, record):
+            for record, result in izip(records,
+                    Trigger.eval_records(trigger, records)):
+                if result:
                     triggers.append(record)
             if triggers:
                 Trigger.trigger_action(triggers, trigger)
@@ -181,8 +189,9 @@ class ModelStorage(Model):
         eligibles = {}
         for trigger in triggers:
             eligibles[trigger] = []
-            for record in records:
-                if not Trigger.eval(trigger, record):
+            for record, result in izip(records,
+                    Trigger.eval_records(trigger, records)):
+                if not result:
                     eligibles[trigger].append(record)
         return eligibles
 
@@ -195,8 +204,9 @@ class ModelStorage(Model):
         Trigger = Pool().get('ir.trigger')
         for trigger, records in eligibles.iteritems():
             triggered = []
-            for record in records:
-                if Trigger.eval(trigger, record):
+            for record, result in izip(records,
+                    Trigger.eval_records(trigger, records)):
+                if result:
                     triggered.append(record)
             if triggered:
                 Trigger.trigger_action(triggered, trigger)
@@ -235,8 +245,9 @@ class ModelStorage(Model):
             return
         for trigger in triggers:
             triggered = []
-            for record in records:
-                if Trigger.eval(trigger, record):
+            for record, result in izip(records,
+                    Trigger.eval_records(trigger, records)):
+                if result:
                     triggered.append(record)
             if triggered:
                 Trigger.trigger_action(triggered, trigger)
@@ -346,6 +357,94 @@ class ModelStorage(Model):
             return len(res)
         return res
 
+    @classmethod
+    def search_iter(cls, domain, order=None, size=None):
+        '''
+        Yield the records that match the domain.
+        The records are browsed by chunks of size to be prefetched together.
+        '''
+        ids = map(int, cls.search(domain, order=order))
+        for sub_ids in grouped_slice(ids, size):
+            for record in cls.browse(list(sub_ids)):
+                yield record
+
+    @classmethod
+    def search_seek(cls, domain, after=None, limit=None, order=None):
+        '''
+        Return the records that match the domain and follow the key after
+        in the order with the key of the last record.
+        The key is the list of the order values, id included, or the string
+        returned by the previous call.
+        '''
+        key_order = cls._seek_order(order)
+        after = cls._seek_after(key_order, after)
+        if after:
+            domain = [domain, cls._seek_domain(key_order, after)]
+        records = cls.search(domain, limit=limit, order=key_order)
+        return records, cls._seek_key(key_order, records)
+
+    @classmethod
+    def _seek_order(cls, order):
+        "Return the order of search_seek ending with id"
+        if order is None or order is False:
+            order = cls._order
+        key_order = []
+        for fname, otype in order:
+            field = cls._fields[fname]
+            if (isinstance(field, fields.Function)
+                    or field._type in ('many2one', 'one2many', 'many2many',
+                        'one2one', 'reference')):
+                raise ValueError('Can not seek on field "%s"' % fname)
+            key_order.append((fname, otype.upper()))
+            if fname == 'id':
+                break
+        else:
+            key_order.append(('id', 'ASC'))
+        return key_order
+
+    @staticmethod
+    def _seek_after(key_order, after):
+        "Return the values of the key after"
+        if isinstance(after, basestring):
+            after = json.loads(after, object_hook=JSONDecoder())
+        if after and len(after) != len(key_order):
+            raise ValueError('Key "%s" does not match order' % (after,))
+        return after
+
+    @staticmethod
+    def _seek_domain(key_order, after):
+        "Return the domain of the records following the values after"
+        nulls_last = Transaction().cursor.has_nulls_last()
+        seek = ['OR']
+        for i, (fname, otype) in enumerate(key_order):
+            clause = [(f, '=', v)
+                for (f, _), v in izip(key_order[:i], after)]
+            value = after[i]
+            nulls_after = nulls_last == (otype == 'ASC')
+            if value is None:
+                if nulls_after:
+                    # No value follows NULL
+                    continue
+                clause.append((fname, '!=', None))
+            elif nulls_after:
+                clause.append(['OR',
+                        (fname, '<' if otype == 'DESC' else '>', value),
+                        (fname, '=', None),
+                        ])
+            else:
+                clause.append(
+                    (fname, '<' if otype == 'DESC' else '>', value))
+            seek.append(clause)
+        return seek
+
+    @staticmethod
+    def _seek_key(key_order, records):
+        "Return the key of the last records"
+        if records:
+            return json.dumps(
+                [getattr(records[-1], f) for f, _ in key_order],
+                cls=JSONEncoder, separators=(',', ':'))
+
     @classmethod
     def search_read(cls, domain, offset=0, limit=None, order=None,
             fields_names=None):
@@ -50,6 +50,7 @@ class Pool(object):
     _pool = {}
     test = False
     _instances = {}
+    _references = {}
 
     def __new__(cls, database_name=None):
         if database_name is None:
@@ -109,6 +110,7 @@ class Pool(object):
         with lock:
             if database_name in cls._pool:
                 del cls._pool[database_name]
+            cls._references.pop(database_name, None)
 
     @classmethod
     def database_list(cls):
@@ -150,6 +152,7 @@ class Pool(object):
             #Clean the _pool before loading modules
             for type in self.classes.keys():
                 self._pool[self.database_name][type] = {}
+            self._references.pop(self.database_name, None)
             restart = not load_modules(self.database_name, self, update=update,
                     lang=lang)
             if restart:
@@ -185,6 +188,7 @@ class Pool(object):
         '''
         with self._locks[self.database_name]:
             self._pool[self.database_name][type][cls.__name__] = cls
+            self._references.pop(self.database_name, None)
 
     def object_name_list(self, type='model'):
         '''
@@ -209,6 +213,27 @@ class Pool(object):
         '''
         return self._pool[self.database_name][type].iteritems()
 
+    def references(self, name):
+        '''
+        Return the list of (model, field name) of the Many2One fields
+        referencing the model name
+
+        The index is built on first use and reset when a class is added.
+        '''
+        references = self._references.get(self.database_name)
+        if references is None:
+            from trytond.model import fields
+            with self._locks[self.database_name]:
+                references = {}
+                for _, model in self.iterobject():
+                    for field_name, field in getattr(model, '_fields',
+                            {}).iteritems():
+                        if isinstance(field, fields.Many2One):
+                            references.setdefault(field.model_name, []
+                                ).append((model, field_name))
+                self._references[self.database_name] = references
+        return references.get(name, [])
+
     def setup(self, module):
         '''
         Setup classes for module and return a list of classes for each type in
@@ -4,7 +4,11 @@ import errno
 import os
 import socket
 import threading
-from SocketServer import StreamRequestHandler
+import weakref
+import Queue
+from SocketServer import StreamRequestHandler, ThreadingMixIn
+
+from trytond.config import config
 
 
 def endsocket(sock):
@@ -18,6 +22,8 @@ def endsocket(sock):
 
 
 class daemon(threading.Thread):
+    instances = weakref.WeakSet()
+
     def __init__(self, interface, port, secure, name=None):
         threading.Thread.__init__(self, name=name)
         self.secure = secure
@@ -27,9 +33,11 @@ class daemon(threading.Thread):
             if family == socket.AF_INET6:
                 self.ipv6 = True
             break
+        daemon.instances.add(self)
 
     def stop(self):
         self.server.shutdown()
+        self.server.stop_workers()
         self.server.socket.shutdown(socket.SHUT_RDWR)
         self.server.server_close()
         return
@@ -38,6 +46,12 @@ class daemon(threading.Thread):
         self.server.serve_forever()
         return True
 
+    def stats(self):
+        "Return the counters of the worker pool of the server"
+        stats = self.server.stats()
+        stats['name'] = self.name
+        return stats
+
 
 class RegisterHandlerMixin:
 
@@ -51,3 +65,116 @@ class RegisterHandlerMixin:
             self.server.handlers.remove(self)
         except KeyError:
             pass
+
+
+class WorkerPoolMixIn(ThreadingMixIn):
+    """Mix-in class to handle each request in a fixed pool of threads.
+
+    The pool size and the number of requests waiting for a thread are defined
+    by the keys workers and queue of the protocol section in the configuration.
+    A request arriving when the queue is full is rejected with a 503 error.
+    Without workers, a new thread is created for each request.
+    """
+    protocol = None
+    _worker_pool = None
+    _worker_pool_lock = threading.Lock()
+
+    def _workers(self):
+        return config.getint(self.protocol, 'workers', 0)
+
+    def _get_worker_pool(self):
+        with self._worker_pool_lock:
+            if self._worker_pool is not None:
+                return self._worker_pool
+            workers = self._workers()
+            pool = {
+                'queue': Queue.Queue(
+                    max(config.getint(self.protocol, 'queue', workers), 1)),
+                'keepalive_timeout': config.getint(self.protocol,
+                    'keepalive_timeout', 5),
+                'threads': [],
+                'busy': 0,
+                'processed': 0,
+                'rejected': 0,
+                'lock': threading.Lock(),
+                }
+            for i in range(workers):
+                thread = threading.Thread(target=self._worker, args=(pool,),
+                    name='%s worker %s' % (self.protocol, i))
+                thread.daemon = True
+                thread.start()
+                pool['threads'].append(thread)
+            self._worker_pool = pool
+            return pool
+
+    def process_request(self, request, client_address):
+        if self._workers() <= 0:
+            return ThreadingMixIn.process_request(self, request,
+                client_address)
+        pool = self._get_worker_pool()
+        try:
+            pool['queue'].put_nowait((request, client_address))
+        except Queue.Full:
+            with pool['lock']:
+                pool['rejected'] += 1
+            self.reject_request(request, client_address)
+
+    def _worker(self, pool):
+        while True:
+            item = pool['queue'].get()
+            if item is None:
+                break
+            request, client_address = item
+            with pool['lock']:
+                pool['busy'] += 1
+            try:
+                # Release the worker from idle keep-alive connections
+                request.settimeout(pool['keepalive_timeout'] or None)
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with pool['lock']:
+                    pool['busy'] -= 1
+                    pool['processed'] += 1
+
+    def reject_request(self, request, client_address):
+        try:
+            request.sendall('HTTP/1.1 503 Service Unavailable\r\n'
+                'Retry-After: 1\r\n'
+                'Content-Length: 0\r\n'
+                'Connection: close\r\n\r\n')
+        except socket.error:
+            pass
+        self.shutdown_request(request)
+
+    def stop_workers(self):
+        with self._worker_pool_lock:
+            pool, self._worker_pool = self._worker_pool, None
+        if pool is None:
+            return
+        for thread in pool['threads']:
+            pool['queue'].put(None)
+
+    def stats(self):
+        "Return the counters of the worker pool"
+        pool = self._worker_pool
+        if pool is None:
+            return {
+                'workers': 0,
+                'busy': 0,
+                'queued': 0,
+                'queue_size': 0,
+                'processed': 0,
+                'rejected': 0,
+                }
+        with pool['lock']:
+            return {
+                'workers': len(pool['threads']),
+                'busy': pool['busy'],
+                'queued': pool['queue'].qsize(),
+                'queue_size': pool['queue'].maxsize,
+                'processed': pool['processed'],
+                'rejected': pool['rejected'],
+                }
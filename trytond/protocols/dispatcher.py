@@ -18,6 +18,7 @@ from trytond.cache import Cache
 from trytond.exceptions import UserError, UserWarning, NotLogged, \
     ConcurrencyException
 from trytond.rpc import RPC
+from trytond.stats import Stats
 
 logger = logging.getLogger(__name__)
 
@@ -93,8 +94,14 @@ def dispatch(host, port, protocol, database_name, user, session, object_type,
             return drop(*args, **kwargs)
         elif method == 'dump':
             return dump(*args, **kwargs)
+        elif method == 'batch':
+            return batch(host, port, protocol, database_name, user, session,
+                *args, **kwargs)
         return
     elif object_type == 'system':
+        if method == 'stats':
+            security.check_super(*args)
+            return Stats.aggregates()
         database = Database(database_name).connect()
         database_list = Pool.database_list()
         pool = Pool(database_name)
@@ -121,79 +128,187 @@ def dispatch(host, port, protocol, database_name, user, session, object_type,
             obj = pool.get(object_name, type=object_type)
             return pydoc.getdoc(getattr(obj, method))
 
+    pool = _get_pool(database_name, user)
+    try:
+        obj, rpc = _get_rpc(pool, object_type, object_name, method)
+    except KeyError:
+        # Raised after the session check to not disclose the objects
+        obj, rpc = None, None
+    readonly = rpc.readonly if rpc else True
+
+    exception_message = ('Exception calling %s.%s.%s from %s@%s:%d/%s' %
+        (object_type, object_name, method, user, host, port, database_name))
+
+    Session = pool.get('ir.session')
     for count in range(config.getint('database', 'retry'), -1, -1):
-        try:
-            user = security.check(database_name, user, session)
-        except DatabaseOperationalError:
-            if count:
-                continue
-            raise
-        break
+        with Transaction().start(database_name, user,
+                readonly=readonly) as transaction, \
+                Stats.call('%s.%s.%s' % (object_type, object_name, method)):
+            Cache.clean(database_name)
+            try:
+                security.check(database_name, user, session)
+                if obj is None:
+                    obj, rpc = _get_rpc(pool, object_type, object_name,
+                        method)
+                result = _call(obj, object_type, object_name, method, rpc,
+                    args, kwargs)
+                if not readonly:
+                    transaction.cursor.commit()
+            except DatabaseOperationalError:
+                transaction.cursor.rollback()
+                if count and not readonly:
+                    continue
+                raise
+            except (NotLogged, ConcurrencyException, UserError, UserWarning):
+                logger.debug(exception_message, exc_info=sys.exc_info())
+                transaction.cursor.rollback()
+                raise
+            except Exception:
+                logger.error(exception_message, exc_info=sys.exc_info())
+                transaction.cursor.rollback()
+                raise
+            Session.reset(session)
+            Cache.resets(database_name)
+        return result
+
+
+def _get_pool(database_name, user):
+    if user == 0:
+        raise Exception('AccessDenied')
+    if not user:
+        raise NotLogged()
 
     database_list = Pool.database_list()
     pool = Pool(database_name)
     if not database_name in database_list:
-        with Transaction().start(database_name, user,
-                readonly=True) as transaction:
+        with Transaction().start(database_name, user, readonly=True):
             pool.init()
-    obj = pool.get(object_name, type=object_type)
+    return pool
 
+
+def _get_rpc(pool, object_type, object_name, method):
+    "Return the object and its RPC for method or None if not allowed"
+    obj = pool.get(object_name, type=object_type)
     if method in obj.__rpc__:
         rpc = obj.__rpc__[method]
     elif method in getattr(obj, '_buttons', {}):
         rpc = RPC(readonly=False, instantiate=0)
     else:
+        rpc = None
+    return obj, rpc
+
+
+def _call(obj, object_type, object_name, method, rpc, args, kwargs):
+    "Call method of obj inside the current transaction"
+    transaction = Transaction()
+    if rpc is None:
         raise UserError('Calling method %s on %s %s is not allowed!'
             % (method, object_type, object_name))
+    c_args, c_kwargs, transaction.context, transaction.timestamp \
+        = rpc.convert(obj, *args, **kwargs)
+    meth = getattr(obj, method)
+    if not hasattr(meth, 'im_self') or meth.im_self:
+        return rpc.result(meth(*c_args, **c_kwargs))
+    else:
+        assert rpc.instantiate == 0
+        inst = c_args.pop(0)
+        if hasattr(inst, method):
+            return rpc.result(meth(inst, *c_args, **c_kwargs))
+        else:
+            return [rpc.result(meth(i, *c_args, **c_kwargs))
+                for i in inst]
 
-    exception_message = ('Exception calling %s.%s.%s from %s@%s:%d/%s' %
-        (object_type, object_name, method, user, host, port, database_name))
 
+def batch(host, port, protocol, database_name, user, session, calls):
+    '''
+    Call sequentially many methods in a single transaction
+
+    :param calls: a list of (object, method, args) where object is
+        the type and the name of the object joined by a dot, like
+        'model.res.user', and args the arguments of the method (the last one
+        being the context)
+    :return: a list of dictionaries with the key 'result' or 'error' for
+        each call
+
+    The transaction is readonly only if all the methods are readonly.
+    Otherwise the first error stops the batch, the transaction is rolled back,
+    the entries of the previous calls are replaced by {'rolled_back': True}
+    and the result list ends with this error.
+    In a readonly batch, the calls continue after a user error but an other
+    error stops the batch as the transaction may be aborted.
+    '''
+    DatabaseOperationalError = backend.get('DatabaseOperationalError')
+    pool = _get_pool(database_name, user)
+    entries = []
+    for object_, method, args in calls:
+        object_type, object_name = object_.split('.', 1)
+        try:
+            obj, rpc = _get_rpc(pool, object_type, object_name, method)
+        except KeyError:
+            # Raised after the session check to not disclose the objects
+            obj, rpc = None, None
+        entries.append((obj, object_type, object_name, method, rpc, args))
+    readonly = all(rpc.readonly if rpc else True
+        for _, _, _, _, rpc, _ in entries)
+
+    Session = pool.get('ir.session')
     for count in range(config.getint('database', 'retry'), -1, -1):
         with Transaction().start(database_name, user,
-                readonly=rpc.readonly) as transaction:
+                readonly=readonly) as transaction:
             Cache.clean(database_name)
+            results = []
             try:
-                c_args, c_kwargs, transaction.context, transaction.timestamp \
-                    = rpc.convert(obj, *args, **kwargs)
-                meth = getattr(obj, method)
-                if not hasattr(meth, 'im_self') or meth.im_self:
-                    result = rpc.result(meth(*c_args, **c_kwargs))
-                else:
-                    assert rpc.instantiate == 0
-                    inst = c_args.pop(0)
-                    if hasattr(inst, method):
-                        result = rpc.result(meth(inst, *c_args, **c_kwargs))
+                security.check(database_name, user, session)
+                for obj, object_type, object_name, method, rpc, args \
+                        in entries:
+                    exception_message = ('Exception calling %s.%s.%s '
+                        'from %s@%s:%d/%s' % (object_type, object_name,
+                            method, user, host, port, database_name))
+                    try:
+                        if obj is None:
+                            obj, rpc = _get_rpc(pool, object_type,
+                                object_name, method)
+                        with Stats.call('%s.%s.%s'
+                                % (object_type, object_name, method)):
+                            result = _call(obj, object_type, object_name,
+                                method, rpc, args, {})
+                    except DatabaseOperationalError:
+                        raise
+                    except (ConcurrencyException, UserError, UserWarning), \
+                            exception:
+                        logger.debug(exception_message,
+                            exc_info=sys.exc_info())
+                        error = exception.args
+                        stop = not readonly
+                    except Exception, exception:
+                        logger.error(exception_message,
+                            exc_info=sys.exc_info())
+                        error = (str(exception),)
+                        stop = True
                     else:
-                        result = [rpc.result(meth(i, *c_args, **c_kwargs))
-                            for i in inst]
-                if not rpc.readonly:
-                    transaction.cursor.commit()
+                        results.append({'result': result})
+                        continue
+                    if stop:
+                        transaction.cursor.rollback()
+                        if not readonly:
+                            results = [{'rolled_back': True}] * len(results)
+                        results.append({'error': error})
+                        break
+                    results.append({'error': error})
+                else:
+                    if not readonly:
+                        transaction.cursor.commit()
             except DatabaseOperationalError:
                 transaction.cursor.rollback()
-                if count and not rpc.readonly:
+                if count and not readonly:
                     continue
                 raise
-            except (NotLogged, ConcurrencyException, UserError, UserWarning):
-                logger.debug(exception_message, exc_info=sys.exc_info())
-                transaction.cursor.rollback()
-                raise
             except Exception:
-                logger.error(exception_message, exc_info=sys.exc_info())
                 transaction.cursor.rollback()
                 raise
+            Session.reset(session)
             Cache.resets(database_name)
-        with Transaction().start(database_name, 0) as transaction:
-            pool = Pool(database_name)
-            Session = pool.get('ir.session')
-            try:
-                Session.reset(session)
-            except DatabaseOperationalError:
-                # Silently fail when reseting session
-                transaction.cursor.rollback()
-            else:
-                transaction.cursor.commit()
-        return result
+        return results
 
 
 def create(database_name, password, lang, admin_password):
@@ -3,9 +3,12 @@
 from trytond.protocols.sslsocket import SSLSocket
 from trytond.protocols.dispatcher import dispatch
 from trytond.config import config
-from trytond.protocols.common import daemon, RegisterHandlerMixin
+from trytond.protocols.common import daemon, RegisterHandlerMixin, \
+    WorkerPoolMixIn
 from trytond.exceptions import UserError, UserWarning, NotLogged, \
     ConcurrencyException
+from trytond.stats import Stats
+from trytond.tools.json_ import JSONDecoder, JSONEncoder
 import SimpleXMLRPCServer
 import SimpleHTTPServer
 import SocketServer
@@ -19,13 +22,10 @@ except ImportError:
     fcntl = None
 import posixpath
 import urllib
-import datetime
-from decimal import Decimal
 try:
     import simplejson as json
 except ImportError:
     import json
-import base64
 import encodings
 try:
     from cStringIO import StringIO
@@ -33,90 +33,6 @@ except ImportError:
     from StringIO import StringIO
 
 
-class JSONDecoder(object):
-
-    decoders = {}
-
-    @classmethod
-    def register(cls, klass, decoder):
-        assert klass not in cls.decoders
-        cls.decoders[klass] = decoder
-
-    def __call__(self, dct):
-        if dct.get('__class__') in self.decoders:
-            return self.decoders[dct['__class__']](dct)
-        return dct
-
-JSONDecoder.register('datetime',
-    lambda dct: datetime.datetime(dct['year'], dct['month'], dct['day'],
-        dct['hour'], dct['minute'], dct['second'], dct['microsecond']))
-JSONDecoder.register('date',
-    lambda dct: datetime.date(dct['year'], dct['month'], dct['day']))
-JSONDecoder.register('time',
-    lambda dct: datetime.time(dct['hour'], dct['minute'], dct['second'],
-        dct['microsecond']))
-JSONDecoder.register('buffer', lambda dct:
-    buffer(base64.decodestring(dct['base64'])))
-JSONDecoder.register('Decimal', lambda dct: Decimal(dct['decimal']))
-
-
-class JSONEncoder(json.JSONEncoder):
-
-    serializers = {}
-
-    def __init__(self, *args, **kwargs):
-        super(JSONEncoder, self).__init__(*args, **kwargs)
-        # Force to use our custom decimal with simplejson
-        self.use_decimal = False
-
-    @classmethod
-    def register(cls, klass, encoder):
-        assert klass not in cls.serializers
-        cls.serializers[klass] = encoder
-
-    def default(self, obj):
-        marshaller = self.serializers.get(type(obj),
-            super(JSONEncoder, self).default)
-        return marshaller(obj)
-
-JSONEncoder.register(datetime.datetime,
-    lambda o: {
-        '__class__': 'datetime',
-        'year': o.year,
-        'month': o.month,
-        'day': o.day,
-        'hour': o.hour,
-        'minute': o.minute,
-        'second': o.second,
-        'microsecond': o.microsecond,
-        })
-JSONEncoder.register(datetime.date,
-    lambda o: {
-        '__class__': 'date',
-        'year': o.year,
-        'month': o.month,
-        'day': o.day,
-        })
-JSONEncoder.register(datetime.time,
-    lambda o: {
-        '__class__': 'time',
-        'hour': o.hour,
-        'minute': o.minute,
-        'second': o.second,
-        'microsecond': o.microsecond,
-        })
-JSONEncoder.register(buffer,
-    lambda o: {
-        '__class__': 'buffer',
-        'base64': base64.encodestring(o),
-        })
-JSONEncoder.register(Decimal,
-    lambda o: {
-        '__class__': 'Decimal',
-        'decimal': str(o),
-        })
-
-
 class SimpleJSONRPCDispatcher(SimpleXMLRPCServer.SimpleXMLRPCDispatcher):
     """Mix-in class that dispatches JSON-RPC requests.
 
@@ -203,6 +119,9 @@ class SimpleJSONRPCRequestHandler(RegisterHandlerMixin,
         if self.is_tryton_url(self.path):
             self.send_tryton_url(self.path)
             return
+        if self.is_metrics_url(self.path):
+            self.send_metrics()
+            return
         SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
 
     def do_HEAD(self):
@@ -241,6 +160,19 @@ class SimpleJSONRPCRequestHandler(RegisterHandlerMixin,
         except IndexError:
             return False
 
+    def is_metrics_url(self, path):
+        return (config.getboolean('stats', 'enabled', False)
+            and config.getboolean('stats', 'metrics', False)
+            and path.split('?', 1)[0] == '/metrics')
+
+    def send_metrics(self):
+        content = Stats.metrics(daemon.instances)
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
     def send_tryton_url(self, path):
         self.send_response(300)
         hostname = (config.get('jsonrpc', 'hostname')
@@ -332,8 +264,9 @@ class SimpleJSONRPCServer(SocketServer.TCPServer,
             self.shutdown_request(handler.request)
 
 
-class SimpleThreadedJSONRPCServer(SocketServer.ThreadingMixIn,
+class SimpleThreadedJSONRPCServer(WorkerPoolMixIn,
         SimpleJSONRPCServer):
+    protocol = 'jsonrpc'
     timeout = 1
     daemon_threads = True
     disable_nagle_algorithm = True
@@ -1,6 +1,5 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
-import SocketServer
 import socket
 import BaseHTTPServer
 import urlparse
@@ -19,7 +18,7 @@ from pywebdav.lib.utils import get_urifilename, quote_uri
 from pywebdav.lib.davcmd import copyone, copytree, moveone, movetree, \
     delone, deltree
 from trytond.protocols.sslsocket import SSLSocket
-from trytond.protocols.common import daemon
+from trytond.protocols.common import daemon, WorkerPoolMixIn
 from trytond.security import login
 from trytond.version import PACKAGE, VERSION, WEBSITE
 from trytond.tools.misc import LocalDict
@@ -69,8 +68,9 @@ def setupConfig():
     return Config()
 
 
-class BaseThreadedHTTPServer(SocketServer.ThreadingMixIn,
+class BaseThreadedHTTPServer(WorkerPoolMixIn,
         BaseHTTPServer.HTTPServer):
+    protocol = 'webdav'
     timeout = 1
 
     def server_bind(self):
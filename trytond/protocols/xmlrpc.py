@@ -2,12 +2,12 @@
 #this repository contains the full copyright notices and license terms.
 from trytond.protocols.sslsocket import SSLSocket
 from trytond.protocols.dispatcher import dispatch
-from trytond.protocols.common import daemon, RegisterHandlerMixin
+from trytond.protocols.common import daemon, RegisterHandlerMixin, \
+    WorkerPoolMixIn
 from trytond.exceptions import UserError, UserWarning, NotLogged, \
     ConcurrencyException
 from trytond import security
 import SimpleXMLRPCServer
-import SocketServer
 import xmlrpclib
 import socket
 import sys
@@ -202,8 +202,9 @@ class SecureXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
         SimpleXMLRPCRequestHandler.setup(self)
 
 
-class SimpleThreadedXMLRPCServer(SocketServer.ThreadingMixIn,
+class SimpleThreadedXMLRPCServer(WorkerPoolMixIn,
         SimpleXMLRPCServer.SimpleXMLRPCServer):
+    protocol = 'xmlrpc'
     timeout = 1
     daemon_threads = True
 
@@ -194,6 +194,25 @@ class RuleGroupGroup(ModelSQL):
         table.column_rename('group_id', 'group')
         super(RuleGroupGroup, cls).__register__(module_name)
 
+    @classmethod
+    def create(cls, vlist):
+        res = super(RuleGroupGroup, cls).create(vlist)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+        return res
+
+    @classmethod
+    def write(cls, records, values, *args):
+        super(RuleGroupGroup, cls).write(records, values, *args)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+
+    @classmethod
+    def delete(cls, records):
+        super(RuleGroupGroup, cls).delete(records)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+
 
 class RuleGroupUser(ModelSQL):
     "Rule Group - User"
@@ -218,6 +237,25 @@ class RuleGroupUser(ModelSQL):
         table.column_rename('user_id', 'user')
         super(RuleGroupUser, cls).__register__(module_name)
 
+    @classmethod
+    def create(cls, vlist):
+        res = super(RuleGroupUser, cls).create(vlist)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+        return res
+
+    @classmethod
+    def write(cls, records, values, *args):
+        super(RuleGroupUser, cls).write(records, values, *args)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+
+    @classmethod
+    def delete(cls, records):
+        super(RuleGroupUser, cls).delete(records)
+        # Restart the cache on the domain_get method
+        Pool().get('ir.rule')._domain_get_cache.clear()
+
 
 class Lang:
     __name__ = 'ir.lang'
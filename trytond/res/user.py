@@ -443,7 +443,14 @@ class User(ModelSQL, ModelView):
         groups = cls._get_groups_cache.get(user)
         if groups is not None:
             return groups
-        groups = cls.read([Transaction().user], ['groups'])[0]['groups']
+        # Query the relation directly as read checks the access which depends
+        # on the groups
+        UserGroup = Pool().get('res.user-res.group')
+        cursor = Transaction().cursor
+        user_group = UserGroup.__table__()
+        cursor.execute(*user_group.select(user_group.group,
+                where=user_group.user == user))
+        groups = [g for g, in cursor.fetchall()]
         cls._get_groups_cache.set(user, groups)
         return groups
 
@@ -9,6 +9,7 @@ except ImportError:
 from trytond.pool import Pool
 from trytond.config import config
 from trytond.transaction import Transaction
+from trytond.cache import Cache
 from trytond.exceptions import NotLogged
 
 
@@ -50,6 +51,8 @@ def logout(dbname, user, session):
         name = session.create_uid.login
         Session.delete(sessions)
         transaction.cursor.commit()
+        # Invalidate the session in the other processes
+        Cache.resets(dbname)
     return name
 
 
@@ -65,13 +68,18 @@ def check(dbname, user, session):
         raise Exception('AccessDenied')
     if not user:
         raise NotLogged()
+    if Transaction().cursor:
+        return _check(dbname, user, session)
     with Transaction().start(dbname, user) as transaction:
-        pool = _get_pool(dbname)
-        Session = pool.get('ir.session')
         try:
-            if not Session.check(user, session):
-                raise NotLogged()
-            else:
-                return user
+            return _check(dbname, user, session)
         finally:
             transaction.cursor.commit()
+
+
+def _check(dbname, user, session):
+    pool = _get_pool(dbname)
+    Session = pool.get('ir.session')
+    if not Session.check(user, session):
+        raise NotLogged()
+    return user
@@ -10,6 +10,7 @@ import sys
 import os
 import signal
 import time
+import errno
 from getpass import getpass
 import threading
 
@@ -21,6 +22,11 @@ from .transaction import Transaction
 
 
 class TrytonServer(object):
+    # Time in second given to the worker to finish its requests
+    graceful_timeout = 10
+    # A worker exiting before startup_timeout seconds failed at startup
+    startup_timeout = 5
+    max_startup_failures = 5
 
     def __init__(self, options):
 
@@ -67,6 +73,11 @@ class TrytonServer(object):
             with open(self.options.pidfile, 'w') as fd_pid:
                 fd_pid.write("%d" % (os.getpid()))
 
+        if getattr(self.options, 'workers', 0) and not self.options.update:
+            self.check_databases()
+            self.create_servers()
+            self.run_master()
+
         if not self.options.update:
             self.start_servers()
 
@@ -143,9 +154,34 @@ class TrytonServer(object):
             logging.shutdown()
             sys.exit(0)
 
+        self.loop(cron=self.options.cron, dev=self.options.dev)
+
+    def loop(self, cron=False, dev=False):
+        "Run the periodic tasks and never return"
         threads = {}
+        sweepers = {}
         while True:
-            if self.options.cron:
+            for dbname in Pool.database_list():
+                thread = sweepers.get(dbname)
+                if thread and thread.is_alive():
+                    continue
+                pool = Pool(dbname)
+                if not pool.lock.acquire(0):
+                    continue
+                try:
+                    if 'ir.session' not in pool.object_name_list():
+                        continue
+                    Session = pool.get('ir.session')
+                finally:
+                    pool.lock.release()
+                if not Session.flush_due(dbname):
+                    continue
+                thread = threading.Thread(
+                        target=Session.sweep,
+                        args=(dbname,), kwargs={})
+                thread.start()
+                sweepers[dbname] = thread
+            if cron:
                 for dbname in Pool.database_list():
                     thread = threads.get(dbname)
                     if thread and thread.is_alive():
@@ -164,7 +200,7 @@ class TrytonServer(object):
                             args=(dbname,), kwargs={})
                     thread.start()
                     threads[dbname] = thread
-            if self.options.dev:
+            if dev:
                 for _ in range(60):
                     if monitor([self.options.configfile]
                             if self.options.configfile else []):
@@ -174,8 +210,14 @@ class TrytonServer(object):
                 time.sleep(60)
 
     def start_servers(self):
+        self.create_servers()
+        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
+            for server in servers:
+                server.start()
+
+    def create_servers(self):
+        "Create the servers listening on the sockets without starting them"
         ssl = config.get('ssl', 'privatekey')
-        # Launch Server
         if config.get('jsonrpc', 'listen'):
             from trytond.protocols.jsonrpc import JSONRPCDaemon
             for hostname, port in parse_listen(
@@ -200,10 +242,6 @@ class TrytonServer(object):
                 self.logger.info("starting WebDAV%s protocol on %s:%d" %
                     (ssl and ' SSL' or '', hostname or '*', port))
 
-        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
-            for server in servers:
-                server.start()
-
     def stop(self, exit=True):
         for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
             for server in servers:
@@ -223,3 +261,167 @@ class TrytonServer(object):
         if sys.platform == "win32":
             args = ['"%s"' % arg for arg in args]
         os.execv(sys.executable, args)
+
+    def check_databases(self):
+        "Test once the databases can be opened by the workers"
+        for db_name in self.options.database_names:
+            with Transaction().start(db_name, 0) as transaction:
+                database = transaction.database
+                if not transaction.cursor.test():
+                    raise Exception("'%s' is not a Tryton database!"
+                        % db_name)
+            # The connections must not be shared with the workers
+            database.close()
+
+    def run_master(self):
+        "Fork the workers, supervise them and never return"
+        self.workers = {}
+        self.started = {}
+        self.retired = set()
+        failures = {}
+        self.stopping = False
+        self.reloading = False
+
+        def stop(*args):
+            self.stopping = True
+
+        def reload(*args):
+            self.reloading = True
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        if hasattr(signal, 'SIGQUIT'):
+            signal.signal(signal.SIGQUIT, stop)
+        for name in ('SIGUSR1', 'SIGHUP'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), reload)
+
+        for index in range(self.options.workers):
+            self.fork_worker(index)
+        while True:
+            if self.stopping:
+                self.stop_master()
+            if self.reloading:
+                self.reloading = False
+                self.reload_workers()
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except OSError, e:
+                if e.errno in (errno.EINTR, errno.ECHILD):
+                    if e.errno == errno.ECHILD:
+                        time.sleep(1)
+                    continue
+                raise
+            if pid in self.retired:
+                self.retired.discard(pid)
+                continue
+            index = self.workers.pop(pid, None)
+            started = self.started.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            if (started is not None
+                    and time.time() - started < self.startup_timeout):
+                failures[index] = failures.get(index, 0) + 1
+            else:
+                failures[index] = 0
+            if failures[index] >= self.max_startup_failures:
+                self.logger.critical('worker %s (pid %s) failed %s times '
+                    'at startup, stopping' % (index, pid, failures[index]))
+                self.stop_master(1)
+            self.logger.warning('worker %s (pid %s) exited with status %s, '
+                'restarting' % (index, pid, status))
+            # Prevent fork loop if the worker fails at startup
+            time.sleep(1)
+            self.fork_worker(index)
+
+    def fork_worker(self, index):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = index
+            self.started[pid] = time.time()
+            self.logger.info('started worker %s (pid %s)' % (index, pid))
+            return pid
+        try:
+            self.run_worker(index)
+        except SystemExit, e:
+            os._exit(e.code or 0)
+        except Exception:
+            self.logger.critical('worker %s failed' % index, exc_info=True)
+            logging.shutdown()
+            os._exit(1)
+        os._exit(0)
+
+    def reload_workers(self):
+        "Replace each worker by a new one using the current configuration"
+        self.logger.info('reloading workers')
+        config.update_etc(self.options.configfile)
+        for pid, index in self.workers.items():
+            del self.workers[pid]
+            self.started.pop(pid, None)
+            self.retired.add(pid)
+            self.fork_worker(index)
+            self._kill(pid, signal.SIGTERM)
+
+    def stop_master(self, status=0):
+        for pid in self.workers.keys() + list(self.retired):
+            self._kill(pid, signal.SIGTERM)
+        for pid in self.workers.keys() + list(self.retired):
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
+            for server in servers:
+                server.server.server_close()
+        if self.options.pidfile:
+            os.unlink(self.options.pidfile)
+        self.logger.info('stopped')
+        logging.shutdown()
+        sys.exit(status)
+
+    @staticmethod
+    def _kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+    def run_worker(self, index):
+        "Serve the requests of the sockets created by the master"
+        for name in ('SIGUSR1', 'SIGHUP'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), signal.SIG_IGN)
+        for name in ('SIGINT', 'SIGTERM', 'SIGQUIT'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name),
+                    lambda *a: self.stop_worker())
+        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
+            for server in servers:
+                server.start()
+
+        for db_name in self.options.database_names:
+            with Transaction().start(db_name, 0) as transaction:
+                if not transaction.cursor.test():
+                    raise Exception("'%s' is not a Tryton database!"
+                        % db_name)
+            Pool(db_name).init()
+
+        # Only the first worker runs the cron
+        self.loop(cron=self.options.cron and index == 0)
+
+    def stop_worker(self):
+        # The listening sockets are shared with the other workers so they
+        # must not be shut down
+        timeout = time.time() + self.graceful_timeout
+        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
+            for server in servers:
+                server.server.shutdown()
+                server.server.stop_workers()
+        for servers in (self.xmlrpcd, self.jsonrpcd, self.webdavd):
+            for server in servers:
+                handlers = getattr(server.server, 'handlers', ())
+                while handlers and time.time() < timeout:
+                    time.sleep(0.1)
+                server.server.server_close()
+        logging.shutdown()
+        os._exit(0)
+
@@ -0,0 +1,207 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+import os
+import errno
+import datetime
+import time
+import urllib
+from threading import Lock
+
+from trytond.config import config
+
+__all__ = ['SessionStore', 'MemorySessionStore', 'FileSessionStore',
+    'get_store']
+
+
+class SessionStore(object):
+    """
+    Store the session keys with their user and last activity timestamp.
+
+    The keys touched since the last call of pop_touched are tracked in memory
+    to be written to ir_session by the checkpoint.
+    """
+
+    def __init__(self):
+        self._touched = {}
+        self._touched_lock = Lock()
+
+    def get(self, dbname, key):
+        '''
+        Return the couple (user, timestamp) of the key or None
+        '''
+        raise NotImplementedError
+
+    def set(self, dbname, key, user, timestamp):
+        '''
+        Store the key for the user with timestamp
+        '''
+        raise NotImplementedError
+
+    def delete(self, dbname, keys):
+        '''
+        Remove the keys
+        '''
+        raise NotImplementedError
+
+    def expire(self, dbname, limit):
+        '''
+        Remove the keys with a timestamp older than limit
+        '''
+        raise NotImplementedError
+
+    def touch(self, dbname, key, timestamp):
+        '''
+        Update the timestamp of the key if it is stored
+        '''
+        entry = self.get(dbname, key)
+        if entry:
+            user, _ = entry
+            self.set(dbname, key, user, timestamp)
+            with self._touched_lock:
+                self._touched.setdefault(dbname, {})[key] = timestamp
+
+    def pop_touched(self, dbname):
+        '''
+        Return and forget the timestamps touched since the last call
+        '''
+        with self._touched_lock:
+            return self._touched.pop(dbname, {})
+
+    def restore_touched(self, dbname, touched):
+        '''
+        Put back the timestamps returned by pop_touched
+        '''
+        with self._touched_lock:
+            pending = self._touched.setdefault(dbname, {})
+            for key, timestamp in touched.iteritems():
+                pending[key] = max(timestamp, pending.get(key, timestamp))
+
+
+class MemorySessionStore(SessionStore):
+    "Store sessions in a dictionary of the process"
+
+    def __init__(self):
+        super(MemorySessionStore, self).__init__()
+        self._sessions = {}
+        self._lock = Lock()
+
+    def get(self, dbname, key):
+        with self._lock:
+            return self._sessions.get(dbname, {}).get(key)
+
+    def set(self, dbname, key, user, timestamp):
+        with self._lock:
+            self._sessions.setdefault(dbname, {})[key] = (user, timestamp)
+
+    def delete(self, dbname, keys):
+        with self._lock:
+            sessions = self._sessions.get(dbname, {})
+            for key in keys:
+                sessions.pop(key, None)
+
+    def expire(self, dbname, limit):
+        with self._lock:
+            sessions = self._sessions.get(dbname, {})
+            keys = [k for k, (_, t) in sessions.iteritems() if t < limit]
+            for key in keys:
+                del sessions[key]
+        return keys
+
+
+class FileSessionStore(SessionStore):
+    """
+    Store sessions as files shared by the processes
+
+    Each session is a file named by its key and containing the user id, the
+    modification time of the file is the timestamp.
+    """
+
+    def __init__(self, path):
+        super(FileSessionStore, self).__init__()
+        self.path = path
+
+    def _directory(self, dbname):
+        directory = os.path.join(self.path, urllib.quote(dbname, safe=''))
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory, 0700)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+        return directory
+
+    def _filename(self, dbname, key):
+        if not key or not key.isalnum():
+            return None
+        return os.path.join(self._directory(dbname), key)
+
+    def get(self, dbname, key):
+        filename = self._filename(dbname, key)
+        if not filename:
+            return None
+        try:
+            with open(filename, 'rb') as fp:
+                user = int(fp.read())
+            mtime = os.stat(filename).st_mtime
+        except (IOError, OSError, ValueError):
+            return None
+        return user, datetime.datetime.fromtimestamp(mtime)
+
+    def set(self, dbname, key, user, timestamp):
+        filename = self._filename(dbname, key)
+        if not filename:
+            return
+        if not os.path.isfile(filename):
+            tmp = '%s.%s.tmp' % (filename, os.getpid())
+            with open(tmp, 'wb') as fp:
+                fp.write(str(user))
+            os.rename(tmp, filename)
+        mtime = time.mktime(timestamp.timetuple()) \
+            + timestamp.microsecond / 1e6
+        try:
+            os.utime(filename, (mtime, mtime))
+        except OSError:
+            pass
+
+    def delete(self, dbname, keys):
+        for key in keys:
+            filename = self._filename(dbname, key)
+            if not filename:
+                continue
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def expire(self, dbname, limit):
+        directory = self._directory(dbname)
+        limit = time.mktime(limit.timetuple())
+        keys = []
+        for key in os.listdir(directory):
+            if not key.isalnum():
+                continue
+            filename = os.path.join(directory, key)
+            try:
+                if os.stat(filename).st_mtime < limit:
+                    os.remove(filename)
+                    keys.append(key)
+            except OSError:
+                continue
+        return keys
+
+_store = None
+_store_lock = Lock()
+
+
+def get_store():
+    "Return the session store defined by the configuration"
+    global _store
+    with _store_lock:
+        if _store is None:
+            if config.get('session', 'store', 'memory') == 'file':
+                path = config.get('session', 'path') or os.path.join(
+                    config.get('database', 'path'), 'sessions')
+                _store = FileSessionStore(path)
+            else:
+                _store = MemorySessionStore()
+        return _store
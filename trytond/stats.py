@@ -0,0 +1,196 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+import heapq
+import logging
+import time
+from threading import local, Lock
+
+from trytond.config import config
+
+__all__ = ['Stats', 'CallStats']
+
+logger = logging.getLogger(__name__)
+
+
+class CallStats(object):
+    "Statistics of a call"
+    __slots__ = ('name', 'start', 'duration', 'queries', 'sql_time', 'rows',
+        'cache_hits', 'cache_misses', 'top_queries', 'top_size')
+
+    def __init__(self, name, top_size=5):
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.queries = 0
+        self.sql_time = 0.
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.top_queries = []
+        self.top_size = top_size
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.top_queries) < self.top_size:
+            heapq.heappush(self.top_queries, (duration, sql))
+        elif duration > self.top_queries[0][0]:
+            heapq.heapreplace(self.top_queries, (duration, sql))
+
+    def stop(self):
+        self.duration = time.time() - self.start
+
+
+class _NoCall(object):
+    "Context manager used when statistics are disabled"
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+_no_call = _NoCall()
+
+
+class _QueryManager(object):
+    "Context manager to record the duration of a query"
+
+    def __init__(self, call, sql):
+        self.call = call
+        self.sql = sql
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, type, value, traceback):
+        self.call.add_query(self.sql, time.time() - self.start)
+
+
+class _CallManager(object):
+    "Context manager to record the statistics of a call"
+
+    def __init__(self, call):
+        self.call = call
+
+    def __enter__(self):
+        Stats._local.call = self.call
+        return self.call
+
+    def __exit__(self, type, value, traceback):
+        Stats._local.call = None
+        Stats.record(self.call)
+
+
+class Stats(object):
+    """
+    Record the statistics of the calls
+
+    The statistics of the call running in the current thread are updated by
+    the cursors and the caches and aggregated by name when the call ends.
+    """
+    _local = local()
+    _aggregates = {}
+    _lock = Lock()
+    _fields = ('calls', 'time', 'queries', 'sql_time', 'rows', 'cache_hits',
+        'cache_misses')
+
+    @staticmethod
+    def enabled():
+        return bool(config.getboolean('stats', 'enabled', False)
+            or config.getfloat('stats', 'slow_threshold', 0))
+
+    @staticmethod
+    def current():
+        "Return the CallStats of the current thread or None"
+        return getattr(Stats._local, 'call', None)
+
+    @staticmethod
+    def call(name):
+        "Return a context manager recording the call of name"
+        if not Stats.enabled() or Stats.current() is not None:
+            return _no_call
+        return _CallManager(CallStats(name,
+                config.getint('stats', 'top_queries', 5)))
+
+    @staticmethod
+    def query(sql):
+        "Return a context manager recording the execution of sql"
+        call = Stats.current()
+        if call is None:
+            return _no_call
+        return _QueryManager(call, sql)
+
+    @staticmethod
+    def fetched(count):
+        "Add count to the rows fetched by the current call"
+        call = Stats.current()
+        if call is not None:
+            call.rows += count
+
+    @staticmethod
+    def cache(hit):
+        "Add a cache hit or miss to the current call"
+        call = Stats.current()
+        if call is not None:
+            if hit:
+                call.cache_hits += 1
+            else:
+                call.cache_misses += 1
+
+    @staticmethod
+    def record(call):
+        call.stop()
+        if config.getboolean('stats', 'enabled', False):
+            with Stats._lock:
+                aggregate = Stats._aggregates.setdefault(call.name,
+                    dict.fromkeys(Stats._fields, 0))
+                aggregate['calls'] += 1
+                aggregate['time'] += call.duration
+                aggregate['queries'] += call.queries
+                aggregate['sql_time'] += call.sql_time
+                aggregate['rows'] += call.rows
+                aggregate['cache_hits'] += call.cache_hits
+                aggregate['cache_misses'] += call.cache_misses
+        threshold = config.getfloat('stats', 'slow_threshold', 0)
+        if threshold and call.duration >= threshold:
+            top_queries = ''.join('\n%.6fs: %s' % (d, sql)
+                for d, sql in sorted(call.top_queries, reverse=True))
+            logger.warning('slow call %s: %.6fs, %s queries in %.6fs, '
+                '%s rows, cache %s hits %s misses%s', call.name,
+                call.duration, call.queries, call.sql_time, call.rows,
+                call.cache_hits, call.cache_misses, top_queries)
+
+    @staticmethod
+    def aggregates():
+        "Return the aggregated statistics by name"
+        with Stats._lock:
+            return dict((name, aggregate.copy())
+                for name, aggregate in Stats._aggregates.iteritems())
+
+    @staticmethod
+    def clear():
+        with Stats._lock:
+            Stats._aggregates.clear()
+
+    @staticmethod
+    def metrics(servers=None):
+        "Return the aggregated statistics in the text exposition format"
+        lines = []
+        aggregates = Stats.aggregates()
+        for field in Stats._fields:
+            metric = 'trytond_%s_total' % field
+            lines.append('# TYPE %s counter' % metric)
+            for name in sorted(aggregates):
+                object_, _, method = name.rpartition('.')
+                lines.append('%s{object="%s",method="%s"} %s' % (metric,
+                        object_, method, aggregates[name][field]))
+        for server in servers or []:
+            stats = server.stats()
+            for key in ('workers', 'busy', 'queued', 'queue_size',
+                    'processed', 'rejected'):
+                lines.append('trytond_server_%s{server="%s"} %s'
+                    % (key, stats['name'], stats[key]))
+        return '\n'.join(lines) + '\n'
@@ -111,6 +111,8 @@ def register():
         ModelViewChangedValues,
         ModelViewChangedValuesTarget,
         MPTT,
+        Tree,
+        TreeRelation,
         ImportDataBoolean,
         ImportDataInteger,
         ImportDataIntegerRequired,
@@ -155,6 +157,7 @@ def register():
         Many2OneDomainValidation,
         TestHistory,
         TestHistoryLine,
+        TestHistoryStamp,
         FieldContextChild,
         FieldContextParent,
         module='tests', type_='model')
@@ -1,8 +1,10 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
 from trytond.model import ModelSQL, fields
+from trytond.pool import Pool
+from trytond.transaction import Transaction
 
-__all__ = ['TestHistory', 'TestHistoryLine']
+__all__ = ['TestHistory', 'TestHistoryLine', 'TestHistoryStamp']
 
 
 class TestHistory(ModelSQL):
@@ -19,3 +21,40 @@ class TestHistoryLine(ModelSQL):
     _history = True
     history = fields.Many2One('test.history', 'History')
     name = fields.Char('Name')
+
+
+class TestHistoryStamp(ModelSQL):
+    'Test History Stamp'
+    __name__ = 'test.history.stamp'
+    history = fields.Many2One('test.history', 'History')
+    stamp = fields.Timestamp('Stamp')
+    history_at_stamp = fields.Function(fields.Many2One('test.history',
+            'History at Stamp', datetime_field='stamp'),
+        'get_history_at_stamp')
+    history_at_stamps = fields.Function(fields.Many2One('test.history',
+            'History at Stamps', datetime_field='stamp'),
+        'get_history_at_stamps')
+    getter_calls = []
+
+    @classmethod
+    def _get_existing(cls, records):
+        History = Pool().get('test.history')
+        histories = History.search([
+                ('id', 'in', [r.history.id for r in records]),
+                ])
+        return dict((r.id, r.history.id if r.history in histories else None)
+            for r in records)
+
+    @classmethod
+    def get_history_at_stamp(cls, records, name):
+        cls.getter_calls.append(Transaction().context.get('_datetime'))
+        return cls._get_existing(records)
+
+    @classmethod
+    def get_history_at_stamps(cls, records, name, datetimes):
+        cls.getter_calls.append(datetimes)
+        result = {}
+        for record in records:
+            with Transaction().set_context(_datetime=datetimes[record.id]):
+                result.update(cls._get_existing([record]))
+        return result
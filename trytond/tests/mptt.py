@@ -4,7 +4,7 @@
 from trytond.model import ModelView, ModelSQL, fields
 
 __all__ = [
-    'MPTT',
+    'MPTT', 'Tree', 'TreeRelation',
     ]
 
 
@@ -40,3 +40,25 @@ class MPTT(ModelSQL, ModelView):
     @staticmethod
     def default_right():
         return 0
+
+
+class Tree(ModelSQL):
+    'Tree'
+    __name__ = 'test.tree'
+    name = fields.Char('Name', required=True)
+    parent = fields.Many2One('test.tree', 'Parent')
+    childs = fields.One2Many('test.tree', 'parent', 'Children')
+    parents = fields.Many2Many('test.tree.relation', 'child', 'parent',
+        'Parents')
+    active = fields.Boolean('Active')
+
+    @staticmethod
+    def default_active():
+        return True
+
+
+class TreeRelation(ModelSQL):
+    'Tree Relation'
+    __name__ = 'test.tree.relation'
+    child = fields.Many2One('test.tree', 'Child', required=True)
+    parent = fields.Many2One('test.tree', 'Parent', required=True)
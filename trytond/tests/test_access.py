@@ -345,6 +345,38 @@ class ModelAccessTestCase(unittest.TestCase):
             transaction.cursor.rollback()
             self.model_access._get_access_cache.clear()
 
+    def test0050access_groups(self):
+        'Test Access shared by groups'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            group, = self.group.search([('users', '=', USER)])
+            other_group, = self.group.create([{'name': 'Test'}])
+            self.model_access.create([{
+                        'model': model.id,
+                        'group': group.id,
+                        'perm_read': True,
+                        }, {
+                        'model': model.id,
+                        'group': other_group.id,
+                        'perm_write': True,
+                        }])
+
+            access = self.model_access.get_access(['test.access'])
+            self.assertEqual(access['test.access'], {
+                    'read': True,
+                    'write': False,
+                    'create': False,
+                    'delete': False,
+                    })
+            groups = tuple(sorted(
+                        POOL.get('res.user').get_groups()))
+            self.assertIs(self.model_access._get_access_groups(groups),
+                self.model_access._get_access_groups(groups))
+
+            transaction.cursor.rollback()
+            self.model_access._get_access_cache.clear()
+
 
 class ModelFieldAccessTestCase(unittest.TestCase):
     'Test Model Field Access'
@@ -773,10 +805,61 @@ class ModelFieldAccessTestCase(unittest.TestCase):
             self.field_access._get_access_cache.clear()
 
 
+class ModelRuleTestCase(unittest.TestCase):
+    'Test Model Rule'
+
+    def setUp(self):
+        install_module('tests')
+        self.test_access = POOL.get('test.access')
+        self.model = POOL.get('ir.model')
+        self.rule_group = POOL.get('ir.rule.group')
+        self.rule = POOL.get('ir.rule')
+
+    def test0010global_rule(self):
+        'Test global rule'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            model, = self.model.search([('model', '=', 'test.access')])
+            foo, bar = self.test_access.create([
+                    {'field1': 'foo', 'field2': 'admin'},
+                    {'field1': 'bar'},
+                    ])
+            self.assertEqual(self.test_access.search([]), [foo, bar])
+
+            rule_group, = self.rule_group.create([{
+                        'model': model.id,
+                        'global_p': True,
+                        'rules': [('create', [{
+                                        'domain': "[('field1', '=', 'foo')]",
+                                        }])],
+                        }])
+            self.assertEqual(self.test_access.search([]), [foo])
+            self.assertTrue(self.rule.domain_get('test.access')
+                is self.rule.domain_get('test.access'))
+
+            self.rule.write(list(rule_group.rules), {
+                    'domain': "[('field1', '=', 'bar')]",
+                    })
+            self.assertEqual(self.test_access.search([]), [bar])
+
+            self.rule.write(list(rule_group.rules), {
+                    'domain': "[('field2', '=', user.login)]",
+                    })
+            self.assertEqual(self.test_access.search([]), [foo])
+
+            self.rule_group.delete([rule_group])
+            self.assertEqual(self.test_access.search([]), [foo, bar])
+
+            transaction.cursor.rollback()
+            self.rule._domain_get_cache.clear()
+
+
 def suite():
     suite_ = unittest.TestSuite()
     suite_.addTests(unittest.TestLoader(
         ).loadTestsFromTestCase(ModelAccessTestCase))
     suite_.addTests(unittest.TestLoader(
         ).loadTestsFromTestCase(ModelFieldAccessTestCase))
+    suite_.addTests(unittest.TestLoader(
+        ).loadTestsFromTestCase(ModelRuleTestCase))
     return suite_
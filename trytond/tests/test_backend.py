@@ -0,0 +1,177 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+import logging
+import unittest
+from mock import Mock, patch
+
+from trytond.backend.database import ReplicaSelector
+try:
+    from trytond.backend.postgresql import database as postgresql
+except ImportError:
+    postgresql = None
+
+
+class ReplicaSelectorTestCase(unittest.TestCase):
+    'Test ReplicaSelector'
+
+    def test0010empty(self):
+        'Test empty'
+        selector = ReplicaSelector([])
+        self.assertFalse(selector)
+        self.assertEqual(selector.select(), None)
+
+    def test0020round_robin(self):
+        'Test round-robin'
+        selector = ReplicaSelector(['a', 'b', 'c'])
+        self.assertTrue(selector)
+        self.assertEqual([selector.select() for _ in range(5)],
+            ['a', 'b', 'c', 'a', 'b'])
+
+    def test0030least_busy(self):
+        'Test least-busy'
+        used = {'a': 2, 'b': 1, 'c': 1}
+        selector = ReplicaSelector(['a', 'b', 'c'], 'least-busy',
+            lambda pool: used[pool])
+        self.assertEqual(selector.select(), 'b')
+        self.assertEqual(selector.select(), 'b')
+        self.assertEqual(selector.select(), 'c')
+        used['a'] = 0
+        self.assertEqual(selector.select(), 'a')
+
+
+@unittest.skipIf(postgresql is None, 'psycopg2 is not installed')
+class PostgreSQLSlowQueryTestCase(unittest.TestCase):
+    'Test PostgreSQL slow query'
+
+    def setUp(self):
+        self.cursor = postgresql.Cursor.__new__(postgresql.Cursor)
+        self.cursor.cursor = Mock()
+        self.cursor._conn = Mock()
+        self.cursor._database = Mock(slow_query=1, database_name='test')
+        postgresql.Database.slow_queries.clear()
+
+    def test0010execute(self):
+        'Test execute logs only slow queries'
+        with patch.object(self.cursor, '_log_slow_query') as log, \
+                patch.object(postgresql.time, 'time') as time_:
+            time_.side_effect = [0, 0.5]
+            self.cursor.execute('SELECT 1', (1,))
+            self.assertFalse(log.called)
+
+            time_.side_effect = [0, 2]
+            self.cursor.execute('SELECT 2', (2,))
+            log.assert_called_once_with('SELECT 2', (2,), 2)
+
+            log.reset_mock()
+            self.cursor._database.slow_query = 0
+            time_.side_effect = [0, 2]
+            self.cursor.execute('SELECT 3')
+            self.assertFalse(log.called)
+
+    def test0015iterate(self):
+        'Test iterate streams the query from a single server-side cursor'
+        with patch.object(self.cursor, '_iterate_cursor') as iterate_cursor, \
+                patch.object(self.cursor, '_check_slow_query') as check:
+            server = iterate_cursor.return_value
+            server.dictfetchmany.side_effect = [
+                [{'id': 1}, {'id': 2}], [{'id': 3}, {'id': 4}], [{'id': 5}]]
+            self.assertEqual(
+                [r['id'] for r in self.cursor.iterate('SELECT id', size=2)],
+                [1, 2, 3, 4, 5])
+            server.execute.assert_called_once_with('SELECT id')
+            self.assertEqual(server.dictfetchmany.call_count, 3)
+            self.assertTrue(server.close.called)
+            self.assertFalse(self.cursor.cursor.execute.called)
+            self.assertEqual(check.call_args[0][:2], ('SELECT id', None))
+
+    def test0020explain(self):
+        'Test explain'
+        explain = self.cursor._conn.cursor.return_value
+        explain.fetchall.return_value = [('Seq Scan',), ('Filter',)]
+        self.cursor._conn.isolation_level = \
+            postgresql.ISOLATION_LEVEL_REPEATABLE_READ
+
+        self.assertEqual(self.cursor._explain('SELECT 1', (1,)),
+            'Seq Scan\nFilter')
+        self.assertEqual([c[0][0] for c in explain.execute.call_args_list],
+            ['SAVEPOINT explain', 'EXPLAIN (ANALYZE off) SELECT 1',
+                'RELEASE SAVEPOINT explain'])
+        self.assertTrue(explain.close.called)
+
+        explain.reset_mock()
+        explain.execute.side_effect = [None, Exception, None, None]
+        self.assertEqual(self.cursor._explain('SELECT 1', None), None)
+        self.assertEqual([c[0][0] for c in explain.execute.call_args_list],
+            ['SAVEPOINT explain', 'EXPLAIN (ANALYZE off) SELECT 1',
+                'ROLLBACK TO SAVEPOINT explain', 'RELEASE SAVEPOINT explain'])
+
+        explain.reset_mock()
+        self.assertEqual(self.cursor._explain('VACUUM', None), None)
+        self.assertFalse(explain.execute.called)
+
+    def test0030log_slow_query(self):
+        'Test log slow query'
+        logger = logging.getLogger('database')
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            with patch.object(self.cursor, '_explain') as explain:
+                explain.return_value = 'Seq Scan'
+                self.cursor._log_slow_query('SELECT 1', (1,), 2)
+        finally:
+            logger.setLevel(level)
+        slow_query, = postgresql.Database.slow_queries
+        self.assertEqual(slow_query['database'], 'test')
+        self.assertEqual(slow_query['sql'], 'SELECT 1')
+        self.assertEqual(slow_query['params'], (1,))
+        self.assertEqual(slow_query['duration'], 2)
+        self.assertEqual(slow_query['plan'], 'Seq Scan')
+
+
+@unittest.skipIf(postgresql is None, 'psycopg2 is not installed')
+class PostgreSQLReplicaTestCase(unittest.TestCase):
+    'Test PostgreSQL replica'
+
+    def setUp(self):
+        self.database = postgresql.Database.__new__(postgresql.Database)
+        self.database.database_name = 'test'
+        self.primary = Mock()
+        self.replica = Mock()
+        self.database._connpool = self.primary
+        self.database._replicas = ReplicaSelector([self.replica])
+
+    def test0010readonly(self):
+        'Test readonly cursor uses a replica'
+        cursor = self.database.cursor(readonly=True)
+        self.assertTrue(cursor.replica)
+        self.assertTrue(cursor._connpool is self.replica)
+        self.assertTrue(cursor._conn is self.replica.getconn.return_value)
+        self.assertFalse(self.primary.getconn.called)
+        cursor.cursor.execute.assert_called_once_with(
+            'SET TRANSACTION READ ONLY')
+
+    def test0020write(self):
+        'Test write cursor uses the primary'
+        for kwargs in ({}, {'autocommit': True},
+                {'autocommit': True, 'readonly': True}):
+            cursor = self.database.cursor(**kwargs)
+            self.assertFalse(cursor.replica)
+            self.assertTrue(cursor._connpool is self.primary)
+            self.assertTrue(cursor._conn is self.primary.getconn.return_value)
+        self.assertFalse(self.replica.getconn.called)
+
+    def test0030unavailable(self):
+        'Test readonly cursor uses the primary if the replica is unavailable'
+        self.replica.getconn.side_effect = postgresql.PoolError
+        cursor = self.database.cursor(readonly=True)
+        self.assertFalse(cursor.replica)
+        self.assertTrue(cursor._connpool is self.primary)
+
+
+def suite():
+    func = unittest.TestLoader().loadTestsFromTestCase
+    suite = unittest.TestSuite()
+    for testcase in (ReplicaSelectorTestCase, PostgreSQLSlowQueryTestCase,
+            PostgreSQLReplicaTestCase):
+        suite.addTests(func(testcase))
+    return suite
@@ -1,9 +1,16 @@
 #This file is part of Tryton.  The COPYRIGHT file at the top level of
 #this repository contains the full copyright notices and license terms.
 
+import threading
+import time
 import unittest
+from mock import patch, Mock
 
-from trytond.cache import freeze
+from trytond.tests.test_tryton import DB_NAME, USER, CONTEXT, install_module
+from trytond.transaction import Transaction
+from trytond.cache import freeze, Cache
+
+cache = Cache('test.cache')
 
 
 class CacheTestCase(unittest.TestCase):
@@ -32,9 +39,90 @@ class CacheTestCase(unittest.TestCase):
                                             ]))]))]))
 
 
+class CacheInvalidationTestCase(unittest.TestCase):
+    "Test Cache invalidation"
+
+    def setUp(self):
+        install_module('tests')
+
+    def test0010get_set(self):
+        "Test get and set"
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.assertEqual(cache.get('foo'), None)
+            self.assertEqual(cache.get('foo', 'bar'), 'bar')
+            cache.set('foo', 'baz')
+            self.assertEqual(cache.get('foo'), 'baz')
+
+            Cache.clean(DB_NAME)
+            self.assertEqual(cache.get('foo'), 'baz')
+
+    def test0020resets(self):
+        "Test resets invalidate through clean"
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            cache.set('foo', 'baz')
+            Cache.reset(DB_NAME, 'test.cache')
+            Cache.resets(DB_NAME)
+            Cache.clean(DB_NAME)
+            self.assertEqual(cache.get('foo'), None)
+
+            cache.set('foo', 'baz')
+            Cache.clean(DB_NAME)
+            self.assertEqual(cache.get('foo'), 'baz')
+
+    def test0030shared_name(self):
+        "Test invalidation of instances sharing a name"
+        other = Cache('test.cache')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            cache.set('foo', 'baz')
+            other.set('foo', 'baz')
+            Cache.reset(DB_NAME, 'test.cache')
+            Cache.resets(DB_NAME)
+            Cache.clean(DB_NAME)
+            self.assertEqual(cache.get('foo'), None)
+            self.assertEqual(other.get('foo'), None)
+
+    def test0040listen(self):
+        "Test listener is started once"
+        stop = threading.Event()
+        database = Mock()
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction, \
+                patch.object(transaction, 'database', database), \
+                patch.object(Cache, '_listener_run',
+                    staticmethod(lambda *args: stop.wait())), \
+                patch.dict(Cache._listener, clear=True):
+            try:
+                Cache._listen('test_listen')
+                self.assertTrue(Cache._listener['test_listen'].is_alive())
+                Cache._listen('test_listen')
+                self.assertEqual(database.get_connection.call_count, 1)
+            finally:
+                stop.set()
+
+    def test0050notify(self):
+        "Test resets notify the listener"
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction:
+            if not transaction.database.has_channel():
+                self.skipTest('database has no channel')
+            Cache.clean(DB_NAME)
+            self.assertTrue(Cache._listener[DB_NAME].is_alive())
+            generation = Cache._generations.get(DB_NAME, {}).get(
+                'test.cache', 0)
+            Cache.reset(DB_NAME, 'test.cache')
+            Cache.resets(DB_NAME)
+            # Invalidated locally and once more by the listener
+            timeout = time.time() + 5
+            while (Cache._generations[DB_NAME]['test.cache']
+                    < generation + 2) and time.time() < timeout:
+                time.sleep(0.01)
+            self.assertTrue(Cache._generations[DB_NAME]['test.cache']
+                >= generation + 2)
+
+
 def suite():
     func = unittest.TestLoader().loadTestsFromTestCase
     suite = unittest.TestSuite()
-    for testcase in (CacheTestCase,):
+    for testcase in (CacheTestCase, CacheInvalidationTestCase):
         suite.addTests(func(testcase))
     return suite
@@ -0,0 +1,151 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+import unittest
+from mock import patch
+
+from trytond.tests.test_tryton import POOL, DB_NAME, USER, USER_PASSWORD, \
+    CONTEXT, install_module
+from trytond.transaction import Transaction
+from trytond.protocols.dispatcher import dispatch
+from trytond.exceptions import NotLogged
+from trytond.config import config
+from trytond.stats import Stats
+from trytond.cache import Cache
+from trytond import security
+
+
+class DispatcherTestCase(unittest.TestCase):
+    'Test Dispatcher'
+
+    def setUp(self):
+        install_module('tests')
+        self.user, self.session = security.login(DB_NAME, 'admin',
+            USER_PASSWORD)
+
+    def tearDown(self):
+        security.logout(DB_NAME, self.user, self.session)
+
+    def dispatch(self, object_type, object_name, method, *args, **kwargs):
+        return dispatch('localhost', 0, 'test', DB_NAME, self.user,
+            self.session, object_type, object_name, method, *args, **kwargs)
+
+    def test0010call(self):
+        'Test call'
+        self.assertEqual(self.dispatch('model', 'res.user', 'read',
+                [self.user], ['login'], {}),
+            [{'id': self.user, 'login': 'admin'}])
+
+    def test0020not_logged(self):
+        'Test not logged'
+        self.assertRaises(NotLogged, dispatch, 'localhost', 0, 'test',
+            DB_NAME, self.user, 'foo', 'model', 'res.user', 'read',
+            [self.user], ['login'], {})
+        # The objects are not disclosed before the session check
+        self.assertRaises(NotLogged, dispatch, 'localhost', 0, 'test',
+            DB_NAME, self.user, 'foo', 'model', 'foo.bar', 'read',
+            [self.user], ['login'], {})
+        self.assertRaises(NotLogged, dispatch, 'localhost', 0, 'test',
+            DB_NAME, self.user, 'foo', 'common', None, 'batch', [
+                ('model.foo.bar', 'read', [[self.user], ['login'], {}]),
+                ])
+
+        self.assertRaises(KeyError, self.dispatch, 'model', 'foo.bar',
+            'read', [self.user], ['login'], {})
+
+    def test0025logout(self):
+        'Test logout invalidates the session checks'
+        security.logout(DB_NAME, self.user, self.session)
+        self.assertFalse('ir_session.check' in Cache._resets.get(DB_NAME, ()))
+        self.assertRaises(NotLogged, self.dispatch, 'model', 'res.user',
+            'read', [self.user], ['login'], {})
+        self.user, self.session = security.login(DB_NAME, 'admin',
+            USER_PASSWORD)
+
+    def test0030batch_readonly(self):
+        'Test readonly batch'
+        results = self.dispatch('common', None, 'batch', [
+                ('model.res.user', 'read', [[self.user], ['login'], {}]),
+                ('model.res.user', 'foo', [{}]),
+                ('model.res.user', 'search_count', [[], {}]),
+                ])
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], {
+                'result': [{'id': self.user, 'login': 'admin'}],
+                })
+        self.assertTrue('error' in results[1])
+        self.assertTrue(results[2]['result'] >= 1)
+
+        results = self.dispatch('common', None, 'batch', [
+                ('model.res.user', 'search_count', [[], {}]),
+                ('model.res.user', 'search_count',
+                    [[('foo', '=', 'bar')], {}]),
+                ('model.res.user', 'search_count', [[], {}]),
+                ])
+        self.assertEqual(len(results), 2)
+        self.assertTrue(results[0]['result'] >= 1)
+        self.assertTrue('error' in results[1])
+
+    def test0040batch_write(self):
+        'Test write batch'
+        results = self.dispatch('common', None, 'batch', [
+                ('model.res.group', 'create',
+                    [[{'name': 'batch'}], {}]),
+                ('model.res.group', 'search_count',
+                    [[('name', '=', 'batch')], {}]),
+                ])
+        self.assertTrue('result' in results[0])
+        self.assertEqual(results[1], {'result': 1})
+
+        results = self.dispatch('common', None, 'batch', [
+                ('model.res.group', 'create',
+                    [[{'name': 'rollback'}], {}]),
+                ('model.res.group', 'foo', [{}]),
+                ('model.res.group', 'search_count', [[], {}]),
+                ])
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], {'rolled_back': True})
+        self.assertTrue('error' in results[1])
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            Group = POOL.get('res.group')
+            self.assertEqual(Group.search_count([('name', '=', 'rollback')]),
+                0)
+            Group.delete(Group.search([('name', '=', 'batch')]))
+            Transaction().cursor.commit()
+
+    def test0050stats(self):
+        'Test stats'
+        config.set('stats', 'enabled', 'True')
+        try:
+            Stats.clear()
+            for _ in range(2):
+                self.dispatch('model', 'res.user', 'read', [self.user],
+                    ['login'], {})
+            self.dispatch('common', None, 'batch', [
+                    ('model.res.group', 'search_count', [[], {}]),
+                    ])
+        finally:
+            config.set('stats', 'enabled', 'False')
+
+        with patch.object(security, 'check_super') as check_super:
+            stats = self.dispatch('system', None, 'stats', 'admin')
+            check_super.assert_called_once_with('admin')
+        read = stats['model.res.user.read']
+        self.assertEqual(read['calls'], 2)
+        self.assertTrue(read['queries'] > 0)
+        self.assertTrue(read['rows'] > 0)
+        self.assertTrue(read['time'] >= read['sql_time'])
+        self.assertEqual(stats['model.res.group.search_count']['calls'], 1)
+
+        metrics = Stats.metrics()
+        self.assertTrue('trytond_calls_total{object="model.res.user",'
+            'method="read"} 2' in metrics.splitlines())
+
+        self.dispatch('model', 'res.user', 'read', [self.user], ['login'],
+            {})
+        self.assertEqual(
+            Stats.aggregates()['model.res.user.read']['calls'], 2)
+        Stats.clear()
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(DispatcherTestCase)
@@ -2,6 +2,7 @@
 #this repository contains the full copyright notices and license terms.
 import unittest
 import datetime
+from mock import patch
 
 from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
         install_module
@@ -356,12 +357,17 @@ class HistoryTestCase(unittest.TestCase):
             ]
 
         with Transaction().start(DB_NAME, USER, context=CONTEXT):
-            for timestamp, instances, values in results:
-                with Transaction().set_context(_datetime=timestamp,
-                        last_test=True):
-                    records = History.search([], order=order)
-                    self.assertEqual(records, instances)
-                    self.assertEqual([x.value for x in records], values)
+            for grouped in [False, True]:
+                with patch.object(backend, 'name',
+                        return_value='postgresql' if grouped
+                        else backend.name()):
+                    for timestamp, instances, values in results:
+                        with Transaction().set_context(_datetime=timestamp,
+                                last_test=True):
+                            records = History.search([], order=order)
+                            self.assertEqual(records, instances)
+                            self.assertEqual([x.value for x in records],
+                                values)
 
     def test0070_browse(self):
         'Test browsing history'
@@ -416,6 +422,93 @@ class HistoryTestCase(unittest.TestCase):
             self.assertEqual(history.value, 2)
             self.assertEqual([l.name for l in history.lines], ['c'])
 
+    def test0080read_datetime_field(self):
+        'Test read Function fields with datetime_field'
+        History = POOL.get('test.history')
+        Stamp = POOL.get('test.history.stamp')
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            history = History(value=1)
+            history.save()
+            stamp = history.create_date
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            before = stamp - datetime.timedelta(days=1)
+            records = Stamp.create([{
+                        'history': history.id,
+                        'stamp': s,
+                        } for s in [before, stamp, before, None]])
+            ids = [r.id for r in records]
+            expected = [None, history.id, None, history.id]
+
+            del Stamp.getter_calls[:]
+            result = Stamp.read(ids, ['history_at_stamp'])
+            self.assertEqual(len(Stamp.getter_calls), 3)
+            self.assertEqual(set(Stamp.getter_calls), {None, before, stamp})
+            self.assertEqual(
+                [r['history_at_stamp'] for r in sorted(result,
+                        key=lambda r: ids.index(r['id']))], expected)
+
+            del Stamp.getter_calls[:]
+            result = Stamp.read(ids, ['history_at_stamps'])
+            self.assertEqual(Stamp.getter_calls, [
+                    dict(zip(ids, [before, stamp, before, None]))])
+            self.assertEqual(
+                [r['history_at_stamps'] for r in sorted(result,
+                        key=lambda r: ids.index(r['id']))], expected)
+            transaction.cursor.rollback()
+
+    def test0090search_history_domain(self):
+        'Test search on the values at the datetime'
+        History = POOL.get('test.history')
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            history = History(value=1)
+            history.save()
+            history_id = history.id
+            first_stamp = history.create_date
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            history = History(history_id)
+            history.value = 2
+            history.save()
+            second_stamp = history.write_date
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            History.delete([History(history_id)])
+            transaction.cursor.commit()
+
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            for stamp, value, result in [
+                    (first_stamp, 1, [history_id]),
+                    (first_stamp, 2, []),
+                    (second_stamp, 1, []),
+                    (second_stamp, 2, [history_id]),
+                    (datetime.datetime.max, 2, []),
+                    ]:
+                self.check_history_search(stamp, value, result)
+                # The grouped sub-query used on PostgreSQL
+                with patch.object(backend, 'name', return_value='postgresql'):
+                    self.check_history_search(stamp, value, result)
+
+    def check_history_search(self, stamp, value, result):
+        History = POOL.get('test.history')
+        with Transaction().set_context(_datetime=stamp):
+            self.assertEqual(map(int,
+                    History.search([('value', '=', value)])), result)
+            self.assertEqual(History.search_count([]),
+                0 if stamp == datetime.datetime.max else 1)
+            self.assertEqual([r.value for r in History.browse(result)],
+                [value] * len(result))
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(HistoryTestCase)
@@ -4,8 +4,11 @@
 
 import unittest
 import time
+import datetime
+from mock import patch
 
 from trytond import backend
+from trytond.config import config
 from trytond.exceptions import UserError, ConcurrencyException
 from trytond.transaction import Transaction
 from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
@@ -76,6 +79,280 @@ class ModelSQLTestCase(unittest.TestCase):
             self.modelsql_timestamp.delete([record])
             cursor.commit()
 
+    def test0030create_many(self):
+        'Test create many records'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            vlist = [{'char': str(i)} for i in range(500)]
+            vlist[100:110] = [{}] * 10
+            records = Char.create(vlist)
+            self.assertEqual(len(set(records)), len(vlist))
+            self.assertEqual([r.id for r in records],
+                sorted(r.id for r in records))
+            for record, values in zip(records, vlist):
+                self.assertEqual(Char(record.id).char, values.get('char'))
+
+    def test0040write_many(self):
+        'Test write many records with different values'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            records = Char.create([{'char': 'foo'} for _ in range(10)])
+            args = []
+            for i, record in enumerate(records):
+                args.extend(([record], {'char': 'bar %s' % i}))
+            args.extend((records[:2], {'char': 'baz'}))
+            args.extend(([records[0]], {'char': None}))
+            Char.write(*args)
+            self.assertEqual([Char(r.id).char for r in records],
+                [None, 'baz'] + ['bar %s' % i for i in range(2, 10)])
+
+    def test0045search_iter(self):
+        'Test search and search_iter on many records'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            Char.create([{'char': str(i)} for i in range(500)])
+            records = Char.search([], order=[('id', 'ASC')])
+            self.assertEqual(len(records), 500)
+            self.assertEqual(list(Char.search_iter([], order=[('id', 'ASC')],
+                        size=150)), records)
+            self.assertEqual([r.char for r in Char.search_iter(
+                        [('char', 'like', '4%')])],
+                [r.char for r in records if r.char.startswith('4')])
+
+    def test0046iterate(self):
+        'Test iterate checks the duration of the whole query'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction:
+            cursor = transaction.cursor
+            Char.create([{'char': str(i)} for i in range(10)])
+            table = Char.__table__()
+            query = table.select(table.id, order_by=table.id.asc)
+            with patch.object(cursor, '_check_slow_query') as check:
+                self.assertEqual(len(list(cursor.iterate(*query, size=3))),
+                    10)
+                self.assertTrue(any(c[0][0] == str(query)
+                        for c in check.call_args_list))
+
+    def test0047search_seek(self):
+        'Test search_seek pages'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            Char.create([{'char': str(i % 7)} for i in range(30)])
+            order = [('char', 'DESC'), ('id', 'ASC')]
+            records = Char.search([], order=order)
+
+            pages, key = [], None
+            while True:
+                page, key = Char.search_seek([], after=key, limit=4,
+                    order=[('char', 'DESC')])
+                if not page:
+                    break
+                pages.extend(page)
+            self.assertEqual(pages, records)
+
+            page, key = Char.search_seek([('char', '!=', '3')],
+                after=[records[9].char, records[9].id], limit=2, order=order)
+            self.assertEqual(page, [r for r in records[10:]
+                    if r.char != '3'][:2])
+            self.assertEqual(key, '["%s",%s]' % (page[-1].char, page[-1].id))
+            self.assertRaises(ValueError, Char.search_seek, [], after=[1],
+                order=order)
+
+    def seek_pages(self, Model, order, domain=None):
+        pages, key = [], None
+        while True:
+            page, key = Model.search_seek(domain or [], after=key, limit=2,
+                order=order)
+            if not page:
+                break
+            pages.extend(page)
+        return pages
+
+    def test0047search_seek_null(self):
+        'Test search_seek with NULL values in the order'
+        Char = POOL.get('test.import_data.char')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            Char.create([{'char': c}
+                    for c in [None, 'a', None, 'b', 'a', None, 'c', 'd']])
+            for otype in ['ASC', 'DESC']:
+                order = [('char', otype)]
+                records = Char.search([], order=order + [('id', 'ASC')])
+                self.assertEqual(len(records), 8)
+                self.assertEqual(self.seek_pages(Char, order), records)
+
+    def test0047search_seek_row_value(self):
+        'Test search_seek with row value'
+        IntegerRequired = POOL.get('test.integer_required')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction:
+            IntegerRequired.create([{'integer': i % 3} for i in range(7)])
+            with patch.object(IntegerRequired, '_seek_domain') as seek_domain:
+                for otype in ['ASC', 'DESC']:
+                    order = [('integer', otype), ('id', otype)]
+                    records = IntegerRequired.search([], order=order)
+                    self.assertEqual(
+                        self.seek_pages(IntegerRequired, order), records)
+                    self.assertEqual(self.seek_pages(IntegerRequired, order,
+                            [('integer', '!=', 1)]),
+                        [r for r in records if r.integer != 1])
+                self.assertEqual(seek_domain.called,
+                    not transaction.cursor.has_row_value())
+
+    def test0048read_group(self):
+        'Test read_group'
+        ExportData = POOL.get('test.export_data')
+        Target = POOL.get('test.export_data.target')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            target1, target2 = Target.create([
+                    {'name': 'Target 1'},
+                    {'name': 'Target 2'},
+                    ])
+            ExportData.create([{
+                        'integer': i,
+                        'boolean': bool(i % 2),
+                        'date': datetime.date(2014, 1 + i % 3, 1 + i),
+                        'many2one': target1.id if i < 5 else target2.id,
+                        } for i in range(10)])
+            domain = [('integer', '!=', None)]
+
+            self.assertEqual(ExportData.read_group(domain, ['many2one'],
+                    ['integer:sum', 'id:count']), [{
+                        'many2one': target1.id,
+                        'integer:sum': 10,
+                        'id:count': 5,
+                        }, {
+                        'many2one': target2.id,
+                        'integer:sum': 35,
+                        'id:count': 5,
+                        }])
+            self.assertEqual(ExportData.read_group(domain,
+                    ['date:month', 'boolean'], ['integer:max'],
+                    order=[('integer:max', 'DESC')], limit=2), [{
+                        'date:month': datetime.date(2014, 1, 1),
+                        'boolean': True,
+                        'integer:max': 9,
+                        }, {
+                        'date:month': datetime.date(2014, 3, 1),
+                        'boolean': False,
+                        'integer:max': 8,
+                        }])
+            self.assertEqual(ExportData.read_group(domain, [],
+                    ['integer:avg']), [{'integer:avg': 4.5}])
+            self.assertRaises(ValueError, ExportData.read_group, domain,
+                ['one2many'], [])
+            self.assertRaises(ValueError, ExportData.read_group, domain,
+                ['integer:month'], [])
+            self.assertRaises(ValueError, ExportData.read_group, domain,
+                [], ['integer:median'])
+
+    def test0049read_related(self):
+        'Test read related fields'
+        ExportData = POOL.get('test.export_data')
+        Target = POOL.get('test.export_data.target')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            targets = Target.create([{'name': 'Target %s' % i}
+                    for i in range(3)])
+            records = ExportData.create([{
+                        'many2one': targets[i % 3].id if i % 4 else None,
+                        'reference': str(targets[-i % 3]) if i % 5 else None,
+                        } for i in range(20)])
+            result = ExportData.read([r.id for r in records],
+                ['many2one.name', 'reference.name', 'reference.id'])
+            result = dict((r['id'], r) for r in result)
+            for i, record in enumerate(records):
+                row = result[record.id]
+                self.assertEqual(row['many2one.name'],
+                    'Target %s' % (i % 3) if i % 4 else None)
+                self.assertEqual(row['reference.name'],
+                    'Target %s' % (-i % 3) if i % 5 else None)
+                self.assertEqual(row['reference.id'],
+                    targets[-i % 3].id if i % 5 else None)
+                self.assertNotIn('many2one', row)
+
+    def test0050delete_references(self):
+        'Test delete set null on references'
+        ExportData = POOL.get('test.export_data')
+        Target = POOL.get('test.export_data.target')
+        Relation = POOL.get('test.export_data.relation')
+        self.assertTrue((ExportData, 'many2one')
+            in POOL.references('test.export_data.target'))
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            target, = Target.create([{'name': 'Target'}])
+            export, = ExportData.create([{'many2one': target.id}])
+            relation, = Relation.create([{
+                        'many2many': export.id,
+                        'target': target.id,
+                        }])
+            Target.delete([target])
+            self.assertEqual(ExportData(export.id).many2one, None)
+            relation = Relation(relation.id)
+            self.assertEqual(relation.target, None)
+            self.assertEqual(relation.many2many, export)
+
+    def test0060read_translations(self):
+        'Test read translated fields'
+        CharTranslate = POOL.get('test.char_translate')
+        Translation = POOL.get('ir.translation')
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            records = CharTranslate.create([{'char': 'foo %s' % i}
+                    for i in range(3)])
+            Translation.create([{
+                        'lang': 'fr_FR',
+                        'src': 'foo %s' % i,
+                        'name': 'test.char_translate,char',
+                        'res_id': r.id,
+                        'value': 'bar %s' % i,
+                        'type': 'model',
+                        } for i, r in enumerate(records[:2])])
+            ids = [r.id for r in records]
+            translations = Translation.get_ids_multi('test.char_translate',
+                ['char'], 'fr_FR', ids)
+            self.assertEqual(translations, {
+                    'char': dict(zip(ids, ['bar 0', 'bar 1', False])),
+                    })
+            self.assertEqual(Translation.get_ids_multi('test.char_translate',
+                    ['char'], 'fr_FR', ids), translations)
+            with Transaction().set_context(language='fr_FR'):
+                self.assertEqual([r['char']
+                        for r in CharTranslate.read(ids, ['char'])],
+                    ['bar 0', 'bar 1', 'foo 2'])
+
+    def test0070translation_preload(self):
+        'Test translation preload'
+        Translation = POOL.get('ir.translation')
+        config.set('cache', 'translation_preload', 'True')
+        try:
+            with Transaction().start(DB_NAME, USER, context=CONTEXT):
+                Translation.create([{
+                            'lang': 'fr_FR',
+                            'src': 'Char',
+                            'name': 'test.char_translate,char',
+                            'res_id': -1,
+                            'value': u'Caractère',
+                            'type': 'field',
+                            }])
+                self.assertEqual(Translation.get_source(
+                        'test.char_translate,char', 'field', 'fr_FR', 'Char'),
+                    u'Caractère')
+                self.assertEqual(Translation.get_source(
+                        'test.char_translate,char', 'field', 'fr_FR'),
+                    u'Caractère')
+                self.assertEqual(Translation.get_sources([
+                            ('test.char_translate,char', 'field', 'fr_FR',
+                                'Char'),
+                            ('test.char_translate,char', 'help', 'fr_FR',
+                                'Test char'),
+                            ]), {
+                        ('test.char_translate,char', 'field', 'fr_FR',
+                            'Char'): u'Caractère',
+                        ('test.char_translate,char', 'help', 'fr_FR',
+                            'Test char'): None,
+                        })
+                self.assertTrue(Translation._sources_cache.get(u'fr_FR'))
+        finally:
+            config.set('cache', 'translation_preload', 'False')
+
 
 def suite():
     return unittest.TestLoader().loadTestsFromTestCase(ModelSQLTestCase)
@@ -170,7 +170,7 @@ class MPTTTestCase(unittest.TestCase):
             records = self.mptt.search([
                     ('parent', '=', None),
                     ])
-            with patch.object(self.mptt, '_update_tree') as mock:
+            with patch.object(self.mptt, '_update_trees') as mock:
                 self.mptt.write(records, {'name': 'Parent Records'})
                 self.assertFalse(mock.called)
 
@@ -181,6 +181,162 @@ class MPTTTestCase(unittest.TestCase):
 
                 self.assertTrue(mock.called)
 
+    def test0070child_parent_of(self):
+        'Test child_of and parent_of on tree'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            root, = self.mptt.create([{
+                        'name': 'Root',
+                        }])
+            child, = self.mptt.create([{
+                        'name': 'Child',
+                        'parent': root.id,
+                        }])
+            grandchild, = self.mptt.create([{
+                        'name': 'Grandchild',
+                        'parent': child.id,
+                        }])
+            records = [root, child, grandchild]
+
+            self.assertEqual(self.mptt.search([
+                        ('id', 'in', [r.id for r in records]),
+                        ('parent', 'child_of', [child.id]),
+                        ], order=[('id', 'ASC')]), [child, grandchild])
+            self.assertEqual(self.mptt.search([
+                        ('id', 'in', [r.id for r in records]),
+                        ('parent', 'parent_of', [child.id]),
+                        ], order=[('id', 'ASC')]), [root, child])
+            self.assertEqual(self.mptt.search([
+                        ('id', 'in', [r.id for r in records]),
+                        ('parent', 'not parent_of', [child.id]),
+                        ]), [grandchild])
+
+    def test0080update_trees(self):
+        'Test move many records at once'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            roots = self.mptt.search([
+                    ('parent', '=', None),
+                    ])
+            first_root, second_root, third_root = roots[:3]
+            records = (list(first_root.childs)
+                + list(third_root.childs[0].childs))
+            with patch.object(self.mptt, '_update_tree') as mock:
+                self.mptt.write(records, {
+                        'parent': second_root.id,
+                        })
+                self.assertFalse(mock.called)
+            self.CheckTree()
+
+            self.mptt.write(list(second_root.childs[:2]), {
+                    'parent': None,
+                    })
+            self.CheckTree()
+
+            transaction.cursor.rollback()
+
+    def test0090rebuild_tree(self):
+        'Test rebuild tree'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            records = self.mptt.search([])
+            table = self.mptt.__table__()
+            transaction.cursor.execute(*table.update(
+                    [table.left, table.right], [0, 0],
+                    where=table.id.in_([r.id for r in records[::2]])))
+            self.mptt._rebuild_tree('parent', None, 0)
+            self.CheckTree()
+
+            transaction.cursor.execute(*table.update(
+                    [table.left, table.right], [0, 0]))
+            with patch.object(transaction.cursor, 'has_update_from_values',
+                    return_value=False):
+                self.mptt._rebuild_tree('parent', None, 0)
+            self.CheckTree()
+
+            transaction.cursor.rollback()
+
+
+class TreeTestCase(unittest.TestCase):
+    'Test child_of and parent_of on tree'
+
+    def setUp(self):
+        install_module('tests')
+        self.tree = POOL.get('test.tree')
+
+    def create_tree(self):
+        root, = self.tree.create([{
+                    'name': 'Root',
+                    }])
+        child1, child2 = self.tree.create([{
+                    'name': 'Child %s' % i,
+                    'parent': root.id,
+                    'parents': [('add', [root.id])],
+                    } for i in range(1, 3)])
+        grandchild, = self.tree.create([{
+                    'name': 'Grandchild',
+                    'parent': child1.id,
+                    'parents': [('add', [child1.id, child2.id])],
+                    }])
+        return root, child1, child2, grandchild
+
+    def check_operators(self, name):
+        root, child1, child2, grandchild = self.create_tree()
+        for operator, value, result in [
+                ('child_of', [root.id], [root, child1, child2, grandchild]),
+                ('child_of', [child1.id], [child1, grandchild]),
+                ('child_of', child2.id,
+                    [child2] + ([grandchild] if name == 'parents' else [])),
+                ('not child_of', [child1.id], [root, child2]),
+                ('parent_of', [grandchild.id],
+                    [root, child1, grandchild]
+                    + ([child2] if name == 'parents' else [])),
+                ('parent_of', [child2.id], [root, child2]),
+                ('not parent_of', [child1.id], [child2, grandchild]),
+                ('child_of', [], []),
+                ]:
+            self.assertEqual(set(self.tree.search([
+                            (name, operator, value),
+                            ])), set(result), (operator, value))
+
+        self.tree.write([child1], {
+                'active': False,
+                })
+        self.assertEqual(set(self.tree.search([
+                        (name, 'child_of', [root.id]),
+                        ])), set([root, child2]
+                + ([grandchild] if name == 'parents' else [])))
+
+    def test0010many2one(self):
+        'Test child_of and parent_of on Many2One'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.check_operators('parent')
+
+    def test0020many2one_without_recursive(self):
+        'Test child_of and parent_of on Many2One without recursive query'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction:
+            with patch.object(transaction.cursor, 'has_with_recursive',
+                    return_value=False):
+                self.check_operators('parent')
+
+    def test0030many2many(self):
+        'Test child_of and parent_of on Many2Many'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT):
+            self.check_operators('parents')
+
+    def test0040many2many_without_recursive(self):
+        'Test child_of and parent_of on Many2Many without recursive query'
+        with Transaction().start(DB_NAME, USER, context=CONTEXT) \
+                as transaction:
+            with patch.object(transaction.cursor, 'has_with_recursive',
+                    return_value=False):
+                self.check_operators('parents')
+
 
 def suite():
-    return unittest.TestLoader().loadTestsFromTestCase(MPTTTestCase)
+    suite_ = unittest.TestSuite()
+    suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(
+            MPTTTestCase))
+    suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(
+            TreeTestCase))
+    return suite_
@@ -4,8 +4,14 @@
 import unittest
 import json
 import datetime
+import socket
+import threading
+import time
+import SocketServer
 from decimal import Decimal
 
+from trytond.config import config
+from trytond.protocols.common import WorkerPoolMixIn
 from trytond.protocols.jsonrpc import JSONEncoder, JSONDecoder
 from trytond.protocols.xmlrpc import xmlrpclib
 
@@ -69,8 +75,73 @@ class XMLTestCase(unittest.TestCase):
         self.dumps_loads(None)
 
 
+class WorkerPoolTestCase(unittest.TestCase):
+    'Test WorkerPoolMixIn'
+
+    def setUp(self):
+        config.add_section('test_worker')
+        config.set('test_worker', 'workers', 1)
+        config.set('test_worker', 'queue', 1)
+        self.release = threading.Event()
+        release = self.release
+
+        class Handler(SocketServer.StreamRequestHandler):
+
+            def handle(self):
+                release.wait(5)
+                self.wfile.write('done')
+
+        class Server(WorkerPoolMixIn, SocketServer.TCPServer):
+            protocol = 'test_worker'
+            allow_reuse_address = True
+
+        self.server = Server(('localhost', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+            kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.stop_workers()
+        self.server.server_close()
+        self.thread.join()
+        config.remove_section('test_worker')
+
+    def connect(self):
+        return socket.create_connection(self.server.server_address)
+
+    def wait_for(self, key, value):
+        for _ in range(500):
+            if self.server.stats()[key] == value:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.server.stats()[key], value)
+
+    def test0010reject(self):
+        'Test reject when queue is full'
+        running = self.connect()
+        self.wait_for('busy', 1)
+        queued = self.connect()
+        self.wait_for('queued', 1)
+        rejected = self.connect()
+        self.assertTrue(rejected.recv(1024).startswith('HTTP/1.1 503'))
+        self.assertEqual(self.server.stats()['rejected'], 1)
+        self.assertEqual(self.server.stats()['workers'], 1)
+
+        self.release.set()
+        self.assertEqual(running.recv(1024), 'done')
+        self.assertEqual(queued.recv(1024), 'done')
+        self.wait_for('processed', 2)
+        self.assertEqual(self.server.stats()['busy'], 0)
+        for sock in (running, queued, rejected):
+            sock.close()
+
+
 def suite():
     suite_ = unittest.TestSuite()
     suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(JSONTestCase))
     suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(XMLTestCase))
+    suite_.addTests(unittest.TestLoader().loadTestsFromTestCase(
+            WorkerPoolTestCase))
     return suite_
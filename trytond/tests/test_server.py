@@ -0,0 +1,211 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+
+import errno
+import signal
+import logging
+import unittest
+from mock import patch, Mock, call
+
+from trytond.tests.test_tryton import DB_NAME, install_module
+from trytond.transaction import Transaction
+from trytond.server import TrytonServer
+
+
+class ServerTestCase(unittest.TestCase):
+    "Test the pre-fork master and workers"
+
+    def server(self, workers=2):
+        server = TrytonServer.__new__(TrytonServer)
+        server.logger = logging.getLogger('test.server')
+        server.options = Mock(workers=workers, configfile=None, pidfile=None,
+            cron=True, database_names=[])
+        server.xmlrpcd = []
+        server.jsonrpcd = []
+        server.webdavd = []
+        server.workers = {}
+        server.started = {}
+        server.retired = set()
+        return server
+
+    def test0010fork_worker(self):
+        'Test fork_worker in the master'
+        server = self.server()
+        with patch('os.fork', return_value=101) as fork, \
+                patch.object(server, 'run_worker') as run_worker:
+            self.assertEqual(server.fork_worker(3), 101)
+        fork.assert_called_once_with()
+        self.assertFalse(run_worker.called)
+        self.assertEqual(server.workers, {101: 3})
+        self.assertTrue(101 in server.started)
+
+    def test0020fork_worker_child(self):
+        'Test fork_worker in the worker'
+        server = self.server()
+        with patch('os.fork', return_value=0), \
+                patch('os._exit', side_effect=SystemExit) as exit_, \
+                patch.object(server, 'run_worker') as run_worker:
+            self.assertRaises(SystemExit, server.fork_worker, 1)
+        run_worker.assert_called_once_with(1)
+        exit_.assert_called_once_with(0)
+        self.assertEqual(server.workers, {})
+
+    def test0030respawn(self):
+        'Test the master respawns an exited worker'
+        server = self.server()
+
+        def waitpid(pid, options):
+            if not waitpid.calls:
+                waitpid.calls.append(pid)
+                return 101, 256
+            server.stopping = True
+            raise OSError(errno.EINTR, 'Interrupted system call')
+        waitpid.calls = []
+
+        with patch('os.fork', side_effect=[101, 102, 103]) as fork, \
+                patch('os.waitpid', side_effect=waitpid), \
+                patch('signal.signal'), \
+                patch('time.sleep'), \
+                patch.object(server, 'stop_master',
+                    side_effect=SystemExit) as stop_master:
+            self.assertRaises(SystemExit, server.run_master)
+        self.assertEqual(fork.call_count, 3)
+        self.assertEqual(server.workers, {102: 1, 103: 0})
+        stop_master.assert_called_once_with()
+
+    def test0035startup_failures(self):
+        'Test the master stops when a worker fails at startup'
+        server = self.server(workers=1)
+        pids = range(101, 101 + server.max_startup_failures)
+
+        with patch('os.fork', side_effect=pids) as fork, \
+                patch('os.waitpid', side_effect=[(p, 256) for p in pids]), \
+                patch('signal.signal'), \
+                patch('time.sleep'), \
+                patch.object(server, 'stop_master',
+                    side_effect=SystemExit) as stop_master:
+            self.assertRaises(SystemExit, server.run_master)
+        self.assertEqual(fork.call_count, server.max_startup_failures)
+        stop_master.assert_called_once_with(1)
+
+    def test0036late_failures(self):
+        'Test the master restarts the workers failing after startup'
+        server = self.server(workers=1)
+        count = server.max_startup_failures + 1
+        pids = range(101, 102 + count)
+
+        def waitpid(pid, options):
+            if len(waitpid.calls) < count:
+                pid = pids[len(waitpid.calls)]
+                waitpid.calls.append(pid)
+                # Pretend the worker has run for a while
+                server.started[pid] -= server.startup_timeout
+                return pid, 256
+            server.stopping = True
+            raise OSError(errno.EINTR, 'Interrupted system call')
+        waitpid.calls = []
+
+        with patch('os.fork', side_effect=pids) as fork, \
+                patch('os.waitpid', side_effect=waitpid), \
+                patch('signal.signal'), \
+                patch('time.sleep'), \
+                patch.object(server, 'stop_master',
+                    side_effect=SystemExit) as stop_master:
+            self.assertRaises(SystemExit, server.run_master)
+        self.assertEqual(fork.call_count, count + 1)
+        stop_master.assert_called_once_with()
+
+    def test0040retired(self):
+        'Test the master does not respawn a retired worker'
+        server = self.server(workers=1)
+
+        def waitpid(pid, options):
+            if not waitpid.calls:
+                waitpid.calls.append(pid)
+                server.retired.add(100)
+                return 100, 0
+            server.stopping = True
+            raise OSError(errno.EINTR, 'Interrupted system call')
+        waitpid.calls = []
+
+        with patch('os.fork', side_effect=[101]) as fork, \
+                patch('os.waitpid', side_effect=waitpid), \
+                patch('signal.signal'), \
+                patch('time.sleep'), \
+                patch.object(server, 'stop_master', side_effect=SystemExit):
+            self.assertRaises(SystemExit, server.run_master)
+        self.assertEqual(fork.call_count, 1)
+        self.assertEqual(server.retired, set())
+        self.assertEqual(server.workers, {101: 0})
+
+    def test0050reload_workers(self):
+        'Test reload_workers'
+        server = self.server()
+        server.workers = {101: 0, 102: 1}
+        with patch('trytond.server.config.update_etc') as update_etc, \
+                patch('os.fork', side_effect=[201, 202]), \
+                patch('os.kill') as kill:
+            server.reload_workers()
+        update_etc.assert_called_once_with(None)
+        self.assertEqual(server.retired, set([101, 102]))
+        self.assertEqual(sorted(server.workers.values()), [0, 1])
+        self.assertEqual(set(server.workers), set([201, 202]))
+        self.assertEqual(sorted(kill.call_args_list), [
+                call(101, signal.SIGTERM),
+                call(102, signal.SIGTERM),
+                ])
+
+    def test0060stop_master(self):
+        'Test stop_master'
+        server = self.server()
+        server.workers = {101: 0, 102: 1}
+        server.retired = set([100])
+        xmlrpcd = Mock()
+        server.xmlrpcd = [xmlrpcd]
+        with patch('os.kill', side_effect=[None, OSError, None]) as kill, \
+                patch('os.waitpid') as waitpid:
+            self.assertRaises(SystemExit, server.stop_master)
+        self.assertEqual(sorted(kill.call_args_list), [
+                call(100, signal.SIGTERM),
+                call(101, signal.SIGTERM),
+                call(102, signal.SIGTERM),
+                ])
+        self.assertEqual(sorted(waitpid.call_args_list),
+            [call(100, 0), call(101, 0), call(102, 0)])
+        xmlrpcd.server.server_close.assert_called_once_with()
+
+        with patch('os.kill'), patch('os.waitpid'):
+            try:
+                server.stop_master(1)
+            except SystemExit, exception:
+                self.assertEqual(exception.code, 1)
+            else:
+                self.fail('SystemExit not raised')
+
+    def test0065check_databases(self):
+        'Test check_databases'
+        install_module('tests')
+        server = self.server()
+        server.options.database_names = [DB_NAME]
+        server.check_databases()
+
+        with Transaction().start(DB_NAME, 0) as transaction:
+            Cursor = type(transaction.cursor)
+        with patch.object(Cursor, 'test', return_value=False):
+            self.assertRaises(Exception, server.check_databases)
+
+    def test0070run_worker(self):
+        'Test run_worker runs the cron only in the first worker'
+        server = self.server()
+        xmlrpcd = Mock()
+        server.xmlrpcd = [xmlrpcd]
+        for index, cron in ((0, True), (1, False)):
+            with patch('signal.signal'), \
+                    patch.object(server, 'loop') as loop:
+                server.run_worker(index)
+            loop.assert_called_once_with(cron=cron)
+        self.assertEqual(xmlrpcd.start.call_count, 2)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(ServerTestCase)
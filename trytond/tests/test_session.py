@@ -0,0 +1,151 @@
+#This file is part of Tryton.  The COPYRIGHT file at the top level of
+#this repository contains the full copyright notices and license terms.
+import unittest
+import datetime
+import tempfile
+import shutil
+from mock import patch, PropertyMock
+
+from trytond.tests.test_tryton import POOL, DB_NAME, USER, CONTEXT, \
+    install_module
+from trytond.transaction import Transaction
+from trytond.config import config
+from trytond.session import get_store, MemorySessionStore, FileSessionStore
+
+
+class SessionTestCase(unittest.TestCase):
+    'Test Session'
+
+    def setUp(self):
+        install_module('ir')
+        self.session = POOL.get('ir.session')
+
+    def test0010check(self):
+        'Test check'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            session, = self.session.create([{}])
+
+            self.assertTrue(self.session.check(USER, session.key))
+            self.assertFalse(self.session.check(USER, 'foo'))
+            self.assertFalse(self.session.check(USER + 1, session.key))
+
+            transaction.cursor.rollback()
+
+    def test0015check_replica(self):
+        'Test check on a lagging replica'
+        with Transaction().start(DB_NAME, USER) as transaction:
+            session, = self.session.create([{}])
+            session_id, key = session.id, session.key
+            self.session._check_cache.clear()
+            transaction.cursor.commit()
+        search = self.session.search
+        try:
+            with Transaction().start(DB_NAME, USER, readonly=True) \
+                    as transaction, \
+                    patch.object(type(transaction.cursor), 'replica',
+                        new_callable=PropertyMock, return_value=True), \
+                    patch.object(self.session, 'search') as mock:
+                # The first search does not find the session on the replica
+                results = [[]]
+                mock.side_effect = lambda domain: (results.pop() if results
+                    else search(domain))
+                get_store().delete(DB_NAME, [key])
+                self.assertTrue(self.session.check(USER, key))
+                self.assertEqual(mock.call_count, 2)
+                self.assertTrue(get_store().get(DB_NAME, key))
+        finally:
+            with Transaction().start(DB_NAME, USER) as transaction:
+                self.session.delete([self.session(session_id)])
+                transaction.cursor.commit()
+
+    def test0020reset_flush(self):
+        'Test reset and flush'
+        with Transaction().start(DB_NAME, USER,
+                context=CONTEXT) as transaction:
+            store = get_store()
+            timeout = datetime.timedelta(
+                seconds=config.getint('session', 'timeout'))
+            old = datetime.datetime.now() - 2 * timeout
+            session, expired = self.session.create([{}, {}])
+            table = self.session.__table__()
+            transaction.cursor.execute(*table.update(
+                    [table.create_date], [old],
+                    where=table.id.in_([session.id, expired.id])))
+            store.delete(DB_NAME, [expired.key])
+
+            self.assertTrue(self.session.check(USER, session.key))
+            self.assertFalse(self.session.check(USER, expired.key))
+
+            self.session.reset(session.key)
+            self.session.flush()
+            self.assertFalse(self.session.flush_due(DB_NAME))
+            self.assertEqual(self.session.search([
+                        ('id', 'in', [session.id, expired.id]),
+                        ]), [session])
+
+            key = session.key
+            self.session.delete([session])
+            self.assertEqual(store.get(DB_NAME, key), None)
+            self.assertFalse(self.session.check(USER, key))
+
+            transaction.cursor.rollback()
+
+
+class SessionStoreTestCase(unittest.TestCase):
+    'Test Session Store'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _test_store(self, store):
+        now = datetime.datetime.now()
+        old = now - datetime.timedelta(hours=1)
+        store.set('db', 'foo', 1, old)
+        store.set('db', 'bar', 2, now)
+
+        user, timestamp = store.get('db', 'foo')
+        self.assertEqual(user, 1)
+        self.assertTrue(abs(timestamp - old) < datetime.timedelta(seconds=1))
+        self.assertEqual(store.get('db', 'baz'), None)
+        self.assertEqual(store.get('other', 'foo'), None)
+
+        store.touch('db', 'baz', now)
+        self.assertEqual(store.get('db', 'baz'), None)
+        self.assertEqual(store.pop_touched('db'), {})
+
+        limit = now - datetime.timedelta(minutes=1)
+        self.assertEqual(store.expire('db', limit), ['foo'])
+        self.assertEqual(store.get('db', 'foo'), None)
+
+        store.touch('db', 'bar', now)
+        self.assertEqual(store.pop_touched('db'), {'bar': now})
+        self.assertEqual(store.pop_touched('db'), {})
+
+        store.delete('db', ['bar'])
+        self.assertEqual(store.get('db', 'bar'), None)
+
+    def test0010memory(self):
+        'Test memory store'
+        self._test_store(MemorySessionStore())
+
+    def test0020file(self):
+        'Test file store'
+        store = FileSessionStore(self.path)
+        self._test_store(store)
+        self.assertEqual(store.get('db', '../foo'), None)
+
+        other = FileSessionStore(self.path)
+        store.set('db', 'foo', 1, datetime.datetime.now())
+        self.assertEqual(other.get('db', 'foo')[0], 1)
+
+
+def suite():
+    func = unittest.TestLoader().loadTestsFromTestCase
+    suite = unittest.TestSuite()
+    for testcase in (SessionTestCase, SessionStoreTestCase):
+        suite.addTests(func(testcase))
+    return suite
@@ -8,8 +8,8 @@ import datetime
 import sql
 import sql.operators
 
-from trytond.tools import reduce_ids, safe_eval, datetime_strftime, \
-    reduce_domain, decimal_
+from trytond.tools import reduce_ids, safe_eval, safe_compile, \
+    datetime_strftime, reduce_domain, decimal_
 
 
 class ToolsTestCase(unittest.TestCase):
@@ -77,6 +77,17 @@ class ToolsTestCase(unittest.TestCase):
         self.assertRaises(ValueError, safe_eval,
                 "().__class__.mro()[1].__subclasses__()")
 
+    def test0064safe_compile(self):
+        'Evaluate compiled code'
+        code = safe_compile('a + 1')
+        self.assertTrue(safe_compile('a + 1') is code)
+        self.assertEqual([safe_eval(code, {'a': i}) for i in range(3)],
+            [1, 2, 3])
+        self.assertRaises(ValueError, safe_compile, '().__class__')
+        self.assertRaises(ValueError, safe_compile, 'lambda: 1')
+        self.assertRaises(ValueError, safe_eval,
+            compile('open("test.txt")', '', 'eval'))
+
     def test0070datetime_strftime(self):
         'Test datetime_strftime'
         self.assert_(datetime_strftime(datetime.date(2005, 3, 2),
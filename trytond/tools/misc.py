@@ -7,7 +7,9 @@ Miscelleanous tools used by tryton
 import os
 import sys
 import subprocess
-from threading import local
+from threading import local, Lock
+from types import CodeType
+from weakref import WeakSet
 import smtplib
 import dis
 from decimal import Decimal
@@ -19,6 +21,7 @@ from sql.operators import Or
 from trytond.const import OPERATORS
 from trytond.config import config, parse_uri
 from trytond.transaction import Transaction
+from trytond.cache import LRUDict
 
 
 def find_in_path(name):
@@ -349,7 +352,23 @@ _ALLOWED_CODES = set(dis.opmap[x] for x in [
         ] if x in dis.opmap)
 
 
-@memoize(1000)
+_SAFE_BUILTINS = {
+    'True': True,
+    'False': False,
+    'str': str,
+    'globals': locals,
+    'locals': locals,
+    'bool': bool,
+    'dict': dict,
+    'round': round,
+    'Decimal': Decimal,
+    }
+_compiled = LRUDict(1000)
+_compiled_lock = Lock()
+# The codes validated by safe_compile, even if dropped from _compiled
+_validated = WeakSet()
+
+
 def _compile_source(source):
     comp = compile(source, '', 'eval')
     codes = []
@@ -368,22 +387,36 @@ def _compile_source(source):
     return comp
 
 
-def safe_eval(source, data=None):
+def safe_compile(source):
+    """
+    Return the validated code of source to evaluate with safe_eval
+
+    The codes are cached by source so the validation is done once.
+    """
+    with _compiled_lock:
+        try:
+            comp = _compiled[source] = _compiled.pop(source)
+            return comp
+        except KeyError:
+            pass
     if '__' in source:
         raise ValueError('Double underscores not allowed')
-
     comp = _compile_source(source)
-    return eval(comp, {'__builtins__': {
-        'True': True,
-        'False': False,
-        'str': str,
-        'globals': locals,
-        'locals': locals,
-        'bool': bool,
-        'dict': dict,
-        'round': round,
-        'Decimal': Decimal,
-        }}, data)
+    with _compiled_lock:
+        _compiled[source] = comp
+        _validated.add(comp)
+    return comp
+
+
+def safe_eval(source, data=None):
+    "Evaluate source or the code returned by safe_compile"
+    if isinstance(source, CodeType):
+        with _compiled_lock:
+            if source not in _validated:
+                raise ValueError('Code not compiled by safe_compile')
+    else:
+        source = safe_compile(source)
+    return eval(source, {'__builtins__': _SAFE_BUILTINS.copy()}, data)
 
 
 def reduce_domain(domain):